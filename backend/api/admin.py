@@ -1,7 +1,15 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 
-from .models import Budget, Category, Movement, PasswordResetCode, Role, User
+from .models import Budget, Category, DailyRollup, ExchangeRate, MonthlyRollup, Movement, PasswordResetCode, Role, SystemStat, User
+from .search import fulltext_available, search_movements
+
+
+class CategoryListFilter(admin.RelatedFieldListFilter):
+	"""Filtro por categoría sin una consulta por opción (Category.__str__ lee category.user)."""
+
+	def field_choices(self, field, request, model_admin):
+		return [(category.pk, str(category)) for category in Category.objects.select_related('user').order_by('name')]
 
 
 @admin.register(User)
@@ -10,32 +18,71 @@ class UserAdmin(BaseUserAdmin):
 		('Extra', {'fields': ('preferred_currency', 'role')}),
 	)
 	list_display = ('username', 'email', 'role', 'preferred_currency', 'is_staff', 'is_superuser')
+	list_select_related = ('role',)
 	list_filter = BaseUserAdmin.list_filter + ('role',)
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
 	list_display = ('name', 'color', 'user', 'is_default', 'created_at')
+	list_select_related = ('user',)
 	search_fields = ('name',)
 	list_filter = ('is_default',)
 
 
 @admin.register(Movement)
 class MovementAdmin(admin.ModelAdmin):
-	list_display = ('type', 'amount', 'date', 'category', 'user', 'created_at')
-	list_filter = ('type', 'date', 'category')
+	list_display = ('type', 'amount', 'currency', 'date', 'category', 'user', 'created_at')
+	# La columna de categoría usa Category.__str__, que lee category.user.
+	list_select_related = ('category__user', 'user')
+	list_filter = ('type', 'currency', 'date', ('category', CategoryListFilter))
 	search_fields = ('description',)
 
+	def get_search_results(self, request, queryset, search_term):
+		# En MySQL la búsqueda usa el índice FULLTEXT en vez de LIKE '%...%'.
+		if search_term and fulltext_available(queryset):
+			return search_movements(queryset, search_term), False
+		return super().get_search_results(request, queryset, search_term)
+
 
 @admin.register(Budget)
 class BudgetAdmin(admin.ModelAdmin):
 	list_display = ('category', 'user', 'month', 'max_amount')
-	list_filter = ('month', 'category')
+	list_select_related = ('category__user', 'user')
+	list_filter = ('month', ('category', CategoryListFilter))
+
+
+@admin.register(MonthlyRollup)
+class MonthlyRollupAdmin(admin.ModelAdmin):
+	list_display = ('user', 'month', 'category', 'type', 'currency', 'total', 'count')
+	list_select_related = ('category__user', 'user')
+	list_filter = ('type', 'currency', 'month')
+
+
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+	list_display = ('user', 'day', 'category', 'type', 'currency', 'total', 'count')
+	list_select_related = ('category__user', 'user')
+	list_filter = ('type', 'currency')
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+	list_display = ('currency', 'date', 'rate')
+	list_filter = ('currency',)
+	date_hierarchy = 'date'
+
+
+@admin.register(SystemStat)
+class SystemStatAdmin(admin.ModelAdmin):
+	list_display = ('scope', 'key', 'count', 'total')
+	list_filter = ('scope',)
 
 
 @admin.register(PasswordResetCode)
 class PasswordResetCodeAdmin(admin.ModelAdmin):
 	list_display = ('user', 'code', 'created_at', 'is_used')
+	list_select_related = ('user',)
 
 
 @admin.register(Role)
@@ -0,0 +1,70 @@
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .caching import versioned_user_cache
+from .reports import asummarize_movements, auser_detail, parse_report_date
+from .routers import analytics_reads
+from .views import AdminUserDetailView, ReportsSummaryView
+
+
+User = get_user_model()
+
+
+class AsyncAPIView(APIView):
+	"""
+	APIView con `dispatch` asíncrono para despliegues ASGI. Autenticación,
+	permisos y throttling siguen siendo los de DRF (síncronos) y se ejecutan en
+	un hilo; los handlers `async def` corren en el event loop.
+	"""
+
+	async def dispatch(self, request, *args, **kwargs):
+		self.args = args
+		self.kwargs = kwargs
+		request = self.initialize_request(request, *args, **kwargs)
+		self.request = request
+		self.headers = self.default_response_headers
+
+		try:
+			await sync_to_async(self.initial)(request, *args, **kwargs)
+			handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+			if iscoroutinefunction(handler):
+				response = await handler(request, *args, **kwargs)
+			else:
+				response = await sync_to_async(handler)(request, *args, **kwargs)
+		except Exception as exc:
+			response = self.handle_exception(exc)
+
+		self.response = self.finalize_response(request, response, *args, **kwargs)
+		return self.response
+
+
+class AsyncReportsSummaryView(AsyncAPIView):
+	"""Igual que ReportsSummaryView, con los agregados en paralelo sin bloquear el event loop."""
+	authentication_classes = ReportsSummaryView.authentication_classes
+	permission_classes = ReportsSummaryView.permission_classes
+	query_budget = ReportsSummaryView.query_budget
+
+	@analytics_reads
+	@versioned_user_cache('reports-summary')
+	async def get(self, request):
+		start = parse_report_date(request.query_params, 'start')
+		end = parse_report_date(request.query_params, 'end')
+		return Response(await asummarize_movements(request.user, start, end))
+
+
+class AsyncAdminUserDetailView(AsyncAPIView):
+	"""Igual que AdminUserDetailView, con los agregados en paralelo."""
+	permission_classes = AdminUserDetailView.permission_classes
+	query_budget = AdminUserDetailView.query_budget
+
+	@analytics_reads(user_kwarg='user_id')
+	async def get(self, request, user_id):
+		user = await User.objects.filter(id=user_id).afirst()
+		if user is None:
+			return Response({'detail': 'Usuario no encontrado.'}, status=status.HTTP_404_NOT_FOUND)
+		return Response(await auser_detail(user))
@@ -0,0 +1,92 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from rest_framework import permissions
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import Role, User
+
+
+# Claims que se copian en el token al emitirlo y que el modo sin estado usa
+# en lugar de leer el usuario de la base de datos.
+ROLE_CLAIM = 'role'
+CURRENCY_CLAIM = 'preferred_currency'
+
+
+def add_user_claims(token, user):
+	role = user.cached_role
+	token[ROLE_CLAIM] = role.name if role is not None else None
+	token[CURRENCY_CLAIM] = user.preferred_currency
+	return token
+
+
+def _revoked_key(user_id):
+	return f'jwt-revoked:user:{user_id}'
+
+
+def revoke_user_tokens(user_id):
+	"""
+	Invalida los tokens de acceso emitidos hasta ahora para el usuario. Basta con
+	recordarlo mientras dure un token de acceso: los posteriores ya nacen con
+	los claims al día porque el refresh los vuelve a leer de la base de datos.
+	"""
+	timeout = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()) + 60
+	cache.set(_revoked_key(user_id), int(time.time()), timeout)
+
+
+def is_token_revoked(token):
+	revoked_at = cache.get(_revoked_key(token[api_settings.USER_ID_CLAIM]))
+	return revoked_at is not None and token.get('iat', 0) < revoked_at
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+	"""
+	JWT estándar, pero el usuario sale con su rol resuelto desde el registro en
+	memoria: una consulta por petición y ninguna para el rol.
+	"""
+
+	def get_user(self, validated_token):
+		return super().get_user(validated_token).attach_cached_role()
+
+
+class StatelessReadJWTAuthentication(JWTAuthentication):
+	"""
+	Para lecturas (GET/HEAD/OPTIONS) construye el usuario con los claims del
+	token, sin consultar la base de datos; la revocación se comprueba contra una
+	lista en caché. Se activa con `JWT_STATELESS_READS`; las escrituras y los
+	tokens emitidos sin estos claims siguen cargando el usuario.
+
+	El usuario resultante no está completo (solo id, rol y moneda): sirve para
+	filtrar por dueño y comprobar permisos, no para guardarlo.
+	"""
+
+	def authenticate(self, request):
+		self.stateless = settings.JWT_STATELESS_READS and request.method in permissions.SAFE_METHODS
+		return super().authenticate(request)
+
+	def get_user(self, validated_token):
+		if not self.stateless or ROLE_CLAIM not in validated_token:
+			return super().get_user(validated_token)
+		if is_token_revoked(validated_token):
+			raise AuthenticationFailed('El token fue revocado.', code='token_revoked')
+
+		role = Role.objects.get_cached_by_name(validated_token[ROLE_CLAIM])
+		user = User(
+			pk=validated_token[api_settings.USER_ID_CLAIM],
+			role_id=role.pk if role is not None else None,
+			preferred_currency=validated_token.get(CURRENCY_CLAIM, ''),
+		)
+		user._state.adding = False
+		return user.attach_cached_role()
+
+
+class RoleModelBackend(ModelBackend):
+	"""Backend de sesión (admin de Django) que también adjunta el rol en caché."""
+
+	def get_user(self, user_id):
+		user = super().get_user(user_id)
+		return user.attach_cached_role() if user is not None else None
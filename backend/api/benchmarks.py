@@ -0,0 +1,393 @@
+import contextlib
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from urllib.parse import urlencode
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import close_old_connections, connection, connections, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import Budget, Category, Movement, PasswordResetCode, Role
+from .serializers import ClaimsTokenObtainPairSerializer
+
+
+User = get_user_model()
+
+BENCH_USER_PREFIX = 'bench_idx_'
+
+
+def seed_movements(rows, users, batch_size=5000, seed=42, log=print):
+	"""
+	Siembra movimientos con bulk_create entre usuarios `bench_idx_*` y devuelve
+	esos usuarios; el primero concentra una parte mayor del historial, como un
+	usuario "pesado". Reutiliza lo sembrado en ejecuciones anteriores.
+
+	No pasa por las señales, así que el rollup mensual y los contadores del
+	sistema de estos usuarios deben reconstruirse aparte si se van a medir.
+	"""
+	bench_users = list(User.objects.filter(username__startswith=BENCH_USER_PREFIX).order_by('id'))
+	existing = Movement.objects.filter(user__in=bench_users).count()
+	if existing >= rows:
+		log(f'Reutilizando {existing} movimientos sembrados.')
+		return bench_users
+
+	for i in range(len(bench_users), users):
+		bench_users.append(User.objects.create(username=f'{BENCH_USER_PREFIX}{i}'))
+	categories = list(Category.objects.filter(user__isnull=True)) or [
+		Category.objects.create(name='Benchmark', user=bench_users[0])
+	]
+
+	rnd = random.Random(seed)
+	first_day = date.today() - timedelta(days=5 * 365)
+	weights = [len(bench_users)] + [1] * (len(bench_users) - 1)
+	remaining = rows - existing
+	started = time.perf_counter()
+	while remaining > 0:
+		size = min(batch_size, remaining)
+		batch = [
+			Movement(
+				user=rnd.choices(bench_users, weights)[0],
+				category=rnd.choice(categories),
+				amount=Decimal(rnd.randint(100, 500_000)) / 100,
+				type=rnd.choice(Movement.MovementType.values),
+				date=first_day + timedelta(days=rnd.randint(0, 5 * 365)),
+				description='benchmark',
+			)
+			for _ in range(size)
+		]
+		Movement.objects.bulk_create(batch)
+		remaining -= size
+	log(f'Sembrados {rows - existing} movimientos en {time.perf_counter() - started:.1f}s.')
+	return bench_users
+
+
+def cleanup_bench_users():
+	"""Borra los datos sembrados sin disparar señales fila por fila."""
+	bench_users = User.objects.filter(username__startswith=BENCH_USER_PREFIX)
+	user_ids = list(bench_users.values_list('id', flat=True))
+	if user_ids:
+		placeholders = ', '.join(['%s'] * len(user_ids))
+		with connection.cursor() as cursor:
+			cursor.execute(f'DELETE FROM {Movement._meta.db_table} WHERE user_id IN ({placeholders})', user_ids)
+	bench_users.delete()
+
+
+def run_threaded_requests(send, total, concurrency):
+	"""
+	Carga como la de un servidor WSGI con `concurrency` hilos: llama `total`
+	veces a `send()` (que devuelve una respuesta) y devuelve
+	`(segundos, latencias)`. Antes y después de cada petición se cierran las
+	conexiones caducadas, igual que con request_started/request_finished.
+	"""
+	def one(_):
+		close_old_connections()
+		started = time.perf_counter()
+		response = send()
+		if hasattr(response, 'render'):
+			response.render()
+		latency = time.perf_counter() - started
+		close_old_connections()
+		return latency
+
+	started = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=concurrency) as executor:
+		latencies = list(executor.map(one, range(total)))
+	return time.perf_counter() - started, latencies
+
+
+def throughput_row(elapsed, latencies):
+	"""`(peticiones/s, p50 ms, p95 ms)` de una tanda de peticiones."""
+	cuts = statistics.quantiles(latencies, n=100)
+	return len(latencies) / elapsed, cuts[49] * 1000, cuts[94] * 1000
+
+
+# --- Suite de endpoints -------------------------------------------------------
+
+PERCENTILES = (50, 95, 99)
+
+
+class EndpointCase:
+	"""
+	Una petición a medir contra una ruta de `api/urls.py`. `as_user` elige el
+	cliente ('user', 'admin' o None para anónimo). `data` puede ser un callable
+	que recibe los fixtures: se evalúa fuera del tiempo medido y, en las
+	escrituras, dentro de la transacción que se revierte al terminar.
+	"""
+
+	def __init__(self, url_name, method='get', as_user='user', kwargs=None, params=None, data=None, format='json', label=None):
+		self.url_name = url_name
+		self.method = method
+		self.as_user = as_user
+		self.kwargs = kwargs or {}
+		self.params = params or {}
+		self.data = data
+		self.format = format
+		self.name = label or f'{method.upper()} {url_name}'
+
+	@property
+	def writes(self):
+		return self.method != 'get'
+
+	def url(self):
+		return reverse(self.url_name, kwargs=self.kwargs)
+
+	def payload(self, fixtures):
+		return self.data(fixtures) if callable(self.data) else self.data
+
+
+def benchmark_fixtures(username, admin_username, login_username=None):
+	"""Objetos reales del usuario medido (ids para las rutas de detalle) y su rango de fechas."""
+	user = User.objects.get(username=username)
+	movements = Movement.objects.filter(user=user).order_by('-date', '-id')
+	latest = movements.first()
+	if latest is None:
+		raise ValueError(f'El usuario {username!r} no tiene movimientos; siembra datos con seed_data.')
+	end = latest.date
+	return {
+		'user': user,
+		'admin': User.objects.get(username=admin_username),
+		'login': User.objects.get(username=login_username or username),
+		'movement': latest,
+		'category': Category.objects.filter(user=user).first() or latest.category,
+		'budget': Budget.objects.filter(user=user).order_by('-month').first(),
+		'role': Role.objects.order_by('id').first(),
+		'start': end - timedelta(days=365),
+		'end': end,
+	}
+
+
+def _reset_code(fixtures):
+	reset = PasswordResetCode.objects.create(user=fixtures['login'], code='123456')
+	return {'email': fixtures['login'].email, 'code': reset.code, 'new_password': 'otra-clave-segura-123'}
+
+
+def _statement(fixtures):
+	category = fixtures['category'].name
+	rows = ''.join(f'{fixtures["end"]},Compra {i},-{i + 1}.50,{category}\n' for i in range(50))
+	content = f'fecha,concepto,monto,categoria\n{rows}'.encode()
+	return {'file': SimpleUploadedFile('extracto.csv', content, content_type='text/csv')}
+
+
+def _movement_row(fixtures, **extra):
+	return {
+		'amount': '12.50', 'type': Movement.MovementType.EXPENSE, 'date': str(fixtures['end']),
+		'category': fixtures['category'].id, 'description': 'benchmark', **extra,
+	}
+
+
+def endpoint_cases(fixtures):
+	"""Un caso (o varios) por cada nombre de ruta de `api/urls.py`."""
+	f = fixtures
+	period = {'start': f['start'], 'end': f['end']}
+	movement = {'pk': f['movement'].id}
+	cases = [
+		EndpointCase('api-root'),
+		EndpointCase('auth-register', 'post', as_user=None, data={
+			'username': 'bench_register', 'email': 'bench_register@example.com', 'password': 'clave-segura-123',
+		}),
+		EndpointCase('token_obtain_pair', 'post', as_user=None, data=lambda f: {
+			'username': f['login'].username, 'password': f['password'],
+		}),
+		EndpointCase('token_refresh', 'post', as_user=None, data=lambda f: {'refresh': f['refresh']}),
+		EndpointCase('password-reset-request', 'post', as_user=None, data=lambda f: {'email': f['login'].email}),
+		EndpointCase('password-reset-confirm', 'post', as_user=None, data=_reset_code),
+		EndpointCase('auth-profile'),
+		EndpointCase('auth-profile', 'put', data={'first_name': 'Benchmark'}),
+		EndpointCase('dashboard'),
+		EndpointCase('reports-summary', params=period),
+		EndpointCase('reports-timeseries', params={**period, 'granularity': 'month'}),
+		EndpointCase('reports-timeseries', params={**period, 'granularity': 'day', 'group_by': 'category'}, label='GET reports-timeseries (día, categoría)'),
+		EndpointCase('reports-export', kwargs={'file_format': 'csv'}, params=period),
+		EndpointCase('category-list'),
+		EndpointCase('category-list', 'post', data={'name': 'Benchmark', 'color': '#123456'}),
+		EndpointCase('category-detail', kwargs={'pk': f['category'].id}),
+		EndpointCase('category-detail', 'patch', kwargs={'pk': f['category'].id}, data={'color': '#654321'}),
+		EndpointCase('movement-list'),
+		EndpointCase('movement-list', params={'fields': 'id,amount,type,date,category'}, label='GET movement-list (?fields=)'),
+		EndpointCase('movement-list', params={'q': 'supermercado'}, label='GET movement-list (?q=)'),
+		EndpointCase('movement-list', 'post', data=_movement_row),
+		EndpointCase('movement-detail', kwargs=movement),
+		EndpointCase('movement-detail', 'patch', kwargs=movement, data={'description': 'benchmark'}),
+		EndpointCase('movement-detail', 'delete', kwargs=movement),
+		EndpointCase('movement-export', kwargs={'file_format': 'csv'}, params=period),
+		EndpointCase('movement-bulk', 'post', data=lambda f: [_movement_row(f, description=f'bulk {i}') for i in range(100)]),
+		EndpointCase('movement-import-statement', 'post', data=_statement, format='multipart'),
+		EndpointCase('budget-list'),
+		EndpointCase('budget-list', 'post', data=lambda f: {
+			'category': f['category'].id, 'month': '2000-01', 'max_amount': '100.00',
+		}),
+		EndpointCase('budget-status', params={'start_month': f'{f["start"]:%Y-%m}', 'end_month': f'{f["end"]:%Y-%m}'}),
+		EndpointCase('role-list'),
+		EndpointCase('admin-dashboard', as_user='admin'),
+		EndpointCase('admin-users', as_user='admin'),
+		EndpointCase('admin-users', as_user='admin', params={'search': 'seed_1', 'ordering': '-total_expense'}, label='GET admin-users (búsqueda)'),
+		EndpointCase('admin-user-detail', as_user='admin', kwargs={'user_id': f['user'].id}),
+		EndpointCase('admin-metrics', as_user='admin'),
+	]
+	if f['budget'] is not None:
+		budget = {'pk': f['budget'].id}
+		cases += [
+			EndpointCase('budget-detail', kwargs=budget),
+			EndpointCase('budget-detail', 'patch', kwargs=budget, data={'max_amount': '123.00'}),
+			EndpointCase('budget-detail', 'delete', kwargs=budget),
+		]
+	if f['role'] is not None:
+		cases.append(EndpointCase('role-detail', kwargs={'pk': f['role'].id}))
+	return cases
+
+
+def uncovered_url_names(cases):
+	"""Nombres de ruta de `api/urls.py` sin ningún caso en la suite."""
+	from . import urls
+
+	names = {pattern.name for pattern in urls.urlpatterns if pattern.name}
+	return sorted(names - {case.url_name for case in cases})
+
+
+def _bench_host():
+	# El cliente de pruebas usa 'testserver', que ALLOWED_HOSTS rechaza fuera de los tests.
+	hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+	return hosts[0] if hosts else 'localhost'
+
+
+def _client(user=None):
+	client = APIClient(SERVER_NAME=_bench_host())
+	if user is not None:
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsTokenObtainPairSerializer.get_token(user).access_token}')
+	return client
+
+
+def _body_size(response):
+	if response.streaming:
+		return sum(len(chunk) for chunk in response.streaming_content)
+	return len(response.content)
+
+
+class EndpointBenchmark:
+	"""
+	Mide cada caso con peticiones completas (middleware, autenticación JWT,
+	serialización y render) desde un cliente en proceso:
+
+	- latencia: `iterations` peticiones; las lecturas llevan `?_=<i>` para no
+	  servir la caché de respuestas, salvo con `warm=True`;
+	- consultas: una petición aparte con los agregados en serie
+	  (REPORT_QUERY_WORKERS=1), para contarlas todas en esta conexión;
+	- memoria: pico de tracemalloc en otra petición aparte.
+
+	Las escrituras corren dentro de una transacción que se revierte, así que
+	los datos sembrados no cambian entre ejecuciones.
+	"""
+
+	def __init__(self, fixtures, iterations=20, warm=False, password=None):
+		self.fixtures = {**fixtures, 'password': password}
+		self.fixtures['refresh'] = str(ClaimsTokenObtainPairSerializer.get_token(fixtures['login']))
+		self.iterations = iterations
+		self.warm = warm
+		self.clients = {'user': _client(fixtures['user']), 'admin': _client(fixtures['admin']), None: _client()}
+		self.sequence = 0
+
+	def send(self, case):
+		self.sequence += 1
+		client = self.clients[case.as_user]
+		with transaction.atomic() if case.writes else contextlib.nullcontext():
+			data = case.payload(self.fixtures)
+			params = dict(case.params)
+			if not case.writes and not self.warm:
+				params['_'] = self.sequence
+			started = time.perf_counter()
+			if case.writes:
+				url = case.url() + (f'?{urlencode(params)}' if params else '')
+				response = getattr(client, case.method)(url, data, format=case.format)
+			else:
+				response = client.get(case.url(), params)
+			size = _body_size(response)
+			elapsed = time.perf_counter() - started
+			if case.writes:
+				transaction.set_rollback(True)
+		return response, size, elapsed
+
+	def count_queries(self, case):
+		with override_settings(REPORT_QUERY_WORKERS=1), contextlib.ExitStack() as stack:
+			contexts = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+			self.send(case)
+		return sum(len(context) for context in contexts)
+
+	def peak_memory(self, case):
+		tracemalloc.start()
+		try:
+			self.send(case)
+			return tracemalloc.get_traced_memory()[1]
+		finally:
+			tracemalloc.stop()
+
+	def run_case(self, case):
+		self.send(case)  # calienta cachés de proceso (roles, categorías, plantillas)
+		latencies = []
+		for _ in range(self.iterations):
+			response, size, elapsed = self.send(case)
+			latencies.append(elapsed * 1000)
+		cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+		return {
+			'status': response.status_code,
+			'queries': self.count_queries(case),
+			**{f'p{p}_ms': round(cuts[p - 1], 3) for p in PERCENTILES},
+			'mean_ms': round(statistics.fmean(latencies), 3),
+			'peak_kib': round(self.peak_memory(case) / 1024, 1),
+			'bytes': size,
+		}
+
+	def run(self, cases, on_result=None):
+		results = {}
+		for case in cases:
+			results[case.name] = self.run_case(case)
+			if on_result:
+				on_result(case.name, results[case.name])
+		return results
+
+
+def benchmark_meta(iterations, warm):
+	return {
+		'created_at': timezone.now().isoformat(),
+		'python': platform.python_version(),
+		'django': django.get_version(),
+		'database': connection.vendor,
+		'iterations': iterations,
+		'warm_cache': warm,
+		'users': User.objects.count(),
+		'movements': Movement.objects.count(),
+	}
+
+
+def compare_results(baseline, current, threshold=0.2):
+	"""
+	Diferencias entre dos ejecuciones (`{endpoint: métricas}`): devuelve filas
+	`(endpoint, métrica, antes, ahora, regresión)`. Es regresión una consulta
+	más o una latencia/memoria más de `threshold` (0.2 = 20 %) por encima.
+	"""
+	rows = []
+	for name, metrics in current.items():
+		before = baseline.get(name)
+		if before is None:
+			continue
+		for metric in ('queries', *(f'p{p}_ms' for p in PERCENTILES), 'peak_kib'):
+			old, new = before.get(metric), metrics.get(metric)
+			if old is None or new is None:
+				continue
+			if metric == 'queries':
+				regressed = new > old
+			else:
+				regressed = new > old * (1 + threshold)
+			rows.append((name, metric, old, new, regressed))
+	return rows
@@ -0,0 +1,155 @@
+from functools import partial
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .caching import bump_user_cache_version
+from .categories import visible_category_map
+from .models import Movement
+from .rollups import RollupDeltas
+from .routers import pin_user_to_primary
+from .serializers import MovementBulkItemSerializer
+from .signals import bulk_movement_writes
+
+
+BULK_BATCH_SIZE = 1000
+BULK_UPDATE_FIELDS = ['amount', 'currency', 'type', 'date', 'description', 'category', 'updated_at']
+
+
+def parse_bulk_payload(data):
+	"""
+	Acepta una lista (todas son altas) o un objeto con las claves opcionales
+	`create`, `update` (filas con `id`) y `delete` (lista de ids).
+	"""
+	if isinstance(data, list):
+		return data, [], []
+	if not isinstance(data, dict):
+		raise ValidationError({'detail': 'Se esperaba una lista o un objeto con create/update/delete.'})
+
+	create, update, delete = data.get('create', []), data.get('update', []), data.get('delete', [])
+	for name, value in (('create', create), ('update', update), ('delete', delete)):
+		if not isinstance(value, list):
+			raise ValidationError({name: 'Debe ser una lista.'})
+	return create, update, delete
+
+
+def _as_int(value):
+	try:
+		return int(value)
+	except (TypeError, ValueError):
+		return None
+
+
+class MovementBulkWriter:
+	"""
+	Valida y escribe en bloque los movimientos de un usuario.
+
+	Las categorías se validan contra las visibles del usuario (en caché) y los
+	movimientos a editar o borrar se cargan con una consulta; la escritura usa bulk_create/bulk_update en una sola transacción y
+	el rollup mensual y la caché se actualizan una vez al final.
+	"""
+
+	def __init__(self, user):
+		self.user = user
+		self.errors = []
+
+	def add_error(self, operation, index, errors):
+		self.errors.append({'operation': operation, 'index': index, 'errors': errors})
+
+	def load_context(self, create_rows, update_rows, delete_ids):
+		self.allowed_category_ids = set(visible_category_map(self.user.pk))
+
+		movement_ids = {_as_int(row.get('id')) for row in update_rows if isinstance(row, dict)}
+		movement_ids.update(_as_int(movement_id) for movement_id in delete_ids)
+		movement_ids.discard(None)
+		self.existing = Movement.objects.filter(user=self.user, id__in=movement_ids).in_bulk()
+
+	def validate_row(self, operation, index, row, partial_row=False):
+		serializer = MovementBulkItemSerializer(
+			data=row,
+			partial=partial_row,
+			context={'allowed_category_ids': self.allowed_category_ids, 'preferred_currency': self.user.preferred_currency},
+		)
+		if not serializer.is_valid():
+			self.add_error(operation, index, serializer.errors)
+			return None
+		return serializer.validated_data
+
+	def prepare(self, create_rows, update_rows, delete_ids, deltas):
+		now = timezone.now()
+		new_movements = []
+		for index, row in enumerate(create_rows):
+			data = self.validate_row('create', index, row)
+			if data is None:
+				continue
+			data.pop('id', None)
+			movement = Movement(
+				user=self.user,
+				category_id=data.pop('category'),
+				description=data.pop('description', ''),
+				currency=data.pop('currency', self.user.preferred_currency),
+				**data,
+			)
+			new_movements.append(movement)
+			deltas.add(self.user.id, movement.category_id, movement.type, movement.currency, movement.date, movement.amount, 1)
+
+		updated_movements = []
+		for index, row in enumerate(update_rows):
+			data = self.validate_row('update', index, row, partial_row=True)
+			if data is None:
+				continue
+			movement = self.existing.get(data.pop('id', None))
+			if movement is None:
+				self.add_error('update', index, {'id': ['Movimiento no encontrado.']})
+				continue
+			deltas.add(self.user.id, movement.category_id, movement.type, movement.currency, movement.date, -movement.amount, -1)
+			if 'category' in data:
+				movement.category_id = data.pop('category')
+			for field, value in data.items():
+				setattr(movement, field, value)
+			movement.updated_at = now
+			deltas.add(self.user.id, movement.category_id, movement.type, movement.currency, movement.date, movement.amount, 1)
+			updated_movements.append(movement)
+
+		deleted_ids = []
+		seen_ids = set()
+		for index, movement_id in enumerate(delete_ids):
+			movement = self.existing.get(_as_int(movement_id))
+			if movement is None:
+				self.add_error('delete', index, {'id': ['Movimiento no encontrado.']})
+				continue
+			if movement.id in seen_ids:
+				# Restar dos veces el mismo movimiento descuadraría rollups y contadores.
+				self.add_error('delete', index, {'id': ['Movimiento repetido en el lote.']})
+				continue
+			seen_ids.add(movement.id)
+			deltas.add(self.user.id, movement.category_id, movement.type, movement.currency, movement.date, -movement.amount, -1)
+			deleted_ids.append(movement.id)
+
+		return new_movements, updated_movements, deleted_ids
+
+	def run(self, create_rows, update_rows, delete_ids, allow_partial=False):
+		"""
+		Aplica el lote. Sin `allow_partial`, cualquier fila inválida cancela todo el
+		lote; con `allow_partial`, se escriben las filas válidas y se informan las demás.
+		"""
+		self.load_context(create_rows, update_rows, delete_ids)
+		deltas = RollupDeltas()
+		new_movements, updated_movements, deleted_ids = self.prepare(create_rows, update_rows, delete_ids, deltas)
+
+		result = {'created': 0, 'updated': 0, 'deleted': 0, 'errors': self.errors}
+		if self.errors and not allow_partial:
+			return result
+
+		with transaction.atomic(), bulk_movement_writes():
+			Movement.objects.bulk_create(new_movements, batch_size=BULK_BATCH_SIZE)
+			Movement.objects.bulk_update(updated_movements, BULK_UPDATE_FIELDS, batch_size=BULK_BATCH_SIZE)
+			if deleted_ids:
+				Movement.objects.filter(user=self.user, id__in=deleted_ids).delete()
+			deltas.apply()
+			transaction.on_commit(partial(bump_user_cache_version, self.user.id))
+			transaction.on_commit(partial(pin_user_to_primary, self.user.id))
+
+		result.update(created=len(new_movements), updated=len(updated_movements), deleted=len(deleted_ids))
+		return result
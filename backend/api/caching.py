@@ -0,0 +1,172 @@
+import hashlib
+import time
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.response import Response
+
+
+GLOBAL_VERSION_KEY = 'cache-version:global'
+GLOBAL_CATEGORIES_VERSION_KEY = 'cache-version:categories:global'
+EXCHANGE_RATES_VERSION_KEY = 'cache-version:exchange-rates'
+
+
+def _user_version_key(user_id):
+	return f'cache-version:user:{user_id}'
+
+
+def _user_categories_version_key(user_id):
+	return f'cache-version:categories:{user_id}'
+
+
+def _initial_version():
+	# Si la clave de versión se pierde (expulsión de la caché) no debe volver a
+	# un valor ya usado, o se servirían respuestas viejas.
+	return int(time.time() * 1000)
+
+
+def _get_versions(*keys):
+	versions = cache.get_many(keys)
+	missing = [key for key in keys if key not in versions]
+	for key in missing:
+		cache.add(key, _initial_version(), None)
+	if missing:
+		versions.update(cache.get_many(missing))
+	return tuple(versions.get(key) for key in keys)
+
+
+def _bump(key):
+	try:
+		cache.incr(key)
+	except ValueError:
+		cache.set(key, _initial_version(), None)
+
+
+def bump_user_cache_version(user_id):
+	"""Invalida todas las respuestas en caché del usuario."""
+	_bump(_user_version_key(user_id))
+
+
+def bump_global_cache_version():
+	"""Invalida las respuestas en caché de todos los usuarios (p. ej. al cambiar una categoría global)."""
+	_bump(GLOBAL_VERSION_KEY)
+
+
+def bump_categories_version(user_id=None):
+	"""Invalida las categorías visibles del usuario, o las de todos si `user_id` es None."""
+	_bump(GLOBAL_CATEGORIES_VERSION_KEY if user_id is None else _user_categories_version_key(user_id))
+
+
+def user_cache_version(user_id):
+	"""Versión actual de los datos del usuario; cambia con cada escritura suya."""
+	return _get_versions(_user_version_key(user_id))[0]
+
+
+def exchange_rates_version():
+	return _get_versions(EXCHANGE_RATES_VERSION_KEY)[0]
+
+
+def bump_exchange_rates_version():
+	"""Invalida las tasas de cambio en caché y, con ellas, todas las respuestas convertidas."""
+	_bump(EXCHANGE_RATES_VERSION_KEY)
+	bump_global_cache_version()
+
+
+def categories_cache_key(user_id):
+	"""
+	Clave de las categorías visibles del usuario. Solo cambia con escrituras de
+	categorías, no de movimientos, así que sobrevive a las altas de movimientos.
+	"""
+	user_version, global_version = _get_versions(_user_categories_version_key(user_id), GLOBAL_CATEGORIES_VERSION_KEY)
+	return f'categories:{user_id}:{user_version}:{global_version}'
+
+
+def response_cache_key(endpoint, user_id, query_params, variant=None):
+	"""
+	`variant` son los valores que la vista resuelve en el momento de la
+	petición (p. ej. la fecha de hoy cuando falta `end`): sin ellos, la misma
+	URL serviría ayer y hoy la misma respuesta.
+	"""
+	user_version, global_version = _get_versions(_user_version_key(user_id), GLOBAL_VERSION_KEY)
+	params = '&'.join(f'{key}={value}' for key, value in sorted(query_params.lists()))
+	if variant is not None:
+		params = f'{params}|{variant}'
+	digest = hashlib.sha1(params.encode('utf-8')).hexdigest()
+	return f'response:{endpoint}:{user_id}:{user_version}:{global_version}:{digest}'
+
+
+def _if_none_match(request):
+	header = request.headers.get('If-None-Match', '')
+	return {tag.strip() for tag in header.split(',') if tag.strip()}
+
+
+def _cached_data(request, key):
+	"""`(etag, datos en caché o None, ¿no modificado?)` para la petición y la clave."""
+	etag = f'"{hashlib.sha1(key.encode("utf-8")).hexdigest()}"'
+	if etag in _if_none_match(request):
+		return etag, None, True
+	return etag, cache.get(key), False
+
+
+def _finish(response, etag):
+	response['ETag'] = etag
+	response['Cache-Control'] = 'private, no-cache'
+	patch_vary_headers(response, ('Authorization',))
+	return response
+
+
+def versioned_user_cache(endpoint, timeout=None, vary_on=None):
+	"""
+	Cachea la respuesta de un método GET por usuario, endpoint y parámetros.
+	Si la respuesta depende además de valores por defecto que cambian con el
+	tiempo (el mes en curso, la fecha de hoy), `vary_on(request)` los devuelve
+	ya resueltos para que formen parte de la clave y del ETag.
+
+	La clave incluye la versión de caché del usuario, que las señales de
+	Movement, Category y Budget incrementan en cada escritura, así que nunca hay
+	que borrar entradas a mano. La respuesta lleva un ETag derivado de la clave:
+	si el cliente envía el mismo en If-None-Match se responde 304 sin tocar la
+	base de datos. Sirve igual para métodos síncronos y `async def`.
+	"""
+	def decorator(method):
+		def store(key, response):
+			cache.set(key, response.data, timeout if timeout is not None else settings.RESPONSE_CACHE_TIMEOUT)
+
+		if iscoroutinefunction(method):
+			@wraps(method)
+			async def async_wrapper(self, request, *args, **kwargs):
+				variant = vary_on(request) if vary_on else None
+				key = await sync_to_async(response_cache_key)(endpoint, request.user.pk, request.query_params, variant)
+				etag, data, not_modified = await sync_to_async(_cached_data)(request, key)
+				if not_modified:
+					return _finish(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+				if data is not None:
+					return _finish(Response(data), etag)
+				response = await method(self, request, *args, **kwargs)
+				if response.status_code != status.HTTP_200_OK:
+					return response
+				await sync_to_async(store)(key, response)
+				return _finish(response, etag)
+			return async_wrapper
+
+		@wraps(method)
+		def wrapper(self, request, *args, **kwargs):
+			variant = vary_on(request) if vary_on else None
+			key = response_cache_key(endpoint, request.user.pk, request.query_params, variant)
+			etag, data, not_modified = _cached_data(request, key)
+			if not_modified:
+				return _finish(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+			if data is not None:
+				return _finish(Response(data), etag)
+			response = method(self, request, *args, **kwargs)
+			if response.status_code != status.HTTP_200_OK:
+				return response
+			store(key, response)
+			return _finish(response, etag)
+		return wrapper
+	return decorator
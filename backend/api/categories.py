@@ -0,0 +1,37 @@
+from django.core.cache import cache
+from django.db.models import Q
+
+from .caching import categories_cache_key
+from .models import Category
+
+
+VISIBLE_CATEGORIES_TIMEOUT = 24 * 60 * 60
+
+
+def _load_visible_categories(user_id):
+	by_name = {}
+	categories = Category.objects.filter(Q(user__isnull=True) | Q(user_id=user_id)).order_by('user_id', 'name')
+	for category in categories:  # NULL primero: las del usuario ocultan a las globales
+		by_name[category.name.lower()] = category
+	return sorted(by_name.values(), key=lambda category: category.name)
+
+
+def visible_categories(user_id):
+	"""
+	Categorías que ve el usuario, ordenadas por nombre: las suyas más las
+	globales que no tengan una suya con el mismo nombre.
+
+	Se calculan una vez y se guardan en caché; la clave cambia cuando se escribe
+	una categoría del usuario o una global (ver signals), nunca por movimientos.
+	"""
+	key = categories_cache_key(user_id)
+	categories = cache.get(key)
+	if categories is None:
+		categories = _load_visible_categories(user_id)
+		cache.set(key, categories, VISIBLE_CATEGORIES_TIMEOUT)
+	return categories
+
+
+def visible_category_map(user_id):
+	"""id → categoría visible, para validar referencias sin consultar la base de datos."""
+	return {category.id: category for category in visible_categories(user_id)}
@@ -0,0 +1,74 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+	global _executor
+	if _executor is None:
+		with _executor_lock:
+			if _executor is None:
+				_executor = ThreadPoolExecutor(
+					max_workers=settings.REPORT_QUERY_WORKERS,
+					thread_name_prefix='report-query',
+				)
+	return _executor
+
+
+def _run_in_worker(query):
+	# Los hilos del pool no pasan por request_started/finished: se aplica aquí
+	# CONN_MAX_AGE para no reutilizar conexiones caducadas.
+	close_old_connections()
+	try:
+		return query()
+	finally:
+		close_old_connections()
+
+
+def _in_context(query):
+	# Cada consulta corre con una copia del contexto de quien la lanza, para que
+	# el enrutado a la réplica (api/routers.py) también se aplique en el pool.
+	return partial(contextvars.copy_context().run, _run_in_worker, query)
+
+
+def _can_run_concurrently(queries):
+	# Otra conexión no ve lo escrito dentro de una transacción abierta
+	# (ATOMIC_REQUESTS, tests), así que en ese caso se consulta en serie.
+	return len(queries) > 1 and settings.REPORT_QUERY_WORKERS > 1 and not connection.in_atomic_block
+
+
+def _run_serially(queries):
+	return {name: query() for name, query in queries.items()}
+
+
+def run_concurrently(queries):
+	"""
+	Ejecuta consultas independientes (`nombre → callable`) en un pool de hilos
+	acotado y devuelve `nombre → resultado`. La latencia se acerca a la de la
+	consulta más lenta en lugar de la suma de todas.
+	"""
+	if not _can_run_concurrently(queries):
+		return _run_serially(queries)
+	executor = _get_executor()
+	futures = {name: executor.submit(_in_context(query)) for name, query in queries.items()}
+	return {name: future.result() for name, future in futures.items()}
+
+
+async def arun_concurrently(queries):
+	"""Versión para vistas async de `run_concurrently`; no bloquea el event loop."""
+	if not await sync_to_async(_can_run_concurrently)(queries):
+		return await sync_to_async(_run_serially)(queries)
+	loop = asyncio.get_running_loop()
+	executor = _get_executor()
+	results = await asyncio.gather(*(loop.run_in_executor(executor, _in_context(query)) for query in queries.values()))
+	return dict(zip(queries, results))
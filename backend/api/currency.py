@@ -0,0 +1,188 @@
+import csv
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_date
+
+from .caching import bump_exchange_rates_version, exchange_rates_version, user_cache_version
+from .models import ExchangeRate, MonthlyRollup
+
+
+RATE_IMPORT_BATCH_SIZE = 2000
+RATE_CACHE_TIMEOUT = 24 * 60 * 60
+AMOUNT_FIELD = DecimalField(max_digits=20, decimal_places=2)
+RATE_FIELD = DecimalField(max_digits=20, decimal_places=10)
+
+_MISSING = 'missing'  # marca en caché de "no hay tasa", distinta de None (clave ausente)
+
+
+def normalize_currency(code):
+	return (code or '').strip().upper()
+
+
+def known_currencies():
+	"""Monedas con alguna tasa cargada, más la base. En caché hasta la próxima importación."""
+	key = f'exchange-rates:currencies:{exchange_rates_version()}'
+	currencies = cache.get(key)
+	if currencies is None:
+		currencies = frozenset(ExchangeRate.objects.order_by().values_list('currency', flat=True).distinct()) | {settings.BASE_CURRENCY}
+		cache.set(key, currencies, RATE_CACHE_TIMEOUT)
+	return currencies
+
+
+def currency_allowed(currency, preferred_currency):
+	"""Un movimiento puede ir en la moneda preferida del usuario o en cualquiera con tasas."""
+	return currency == preferred_currency or currency in known_currencies()
+
+
+def rate_on(currency, day):
+	"""
+	Unidades de la moneda base por unidad de `currency` en `day`: la última
+	tasa anterior o igual a esa fecha, o la primera posterior si no hay ninguna.
+	None si la moneda no tiene tasas. Las consultas se guardan en caché por
+	(moneda, día) hasta la próxima importación de tasas.
+	"""
+	if currency == settings.BASE_CURRENCY:
+		return Decimal('1')
+	if isinstance(day, str):
+		day = parse_date(day)
+	key = f'exchange-rates:{exchange_rates_version()}:{currency}:{day.isoformat()}'
+	rate = cache.get(key)
+	if rate is None:
+		rates = ExchangeRate.objects.filter(currency=currency)
+		rate = (
+			rates.filter(date__lte=day).order_by('-date').values_list('rate', flat=True).first()
+			or rates.filter(date__gt=day).order_by('date').values_list('rate', flat=True).first()
+			or _MISSING
+		)
+		cache.set(key, rate, RATE_CACHE_TIMEOUT)
+	return None if rate == _MISSING else rate
+
+
+def to_base_currency(amount, currency, day):
+	"""Importe en la moneda base; sin tasa para `currency` se deja tal cual."""
+	rate = rate_on(currency, day)
+	amount = Decimal(str(amount))
+	return amount if rate is None else (amount * rate).quantize(Decimal('0.01'))
+
+
+def _rate(currency, day):
+	"""
+	Subconsulta con la tasa vigente en `day` (misma regla que `rate_on`). Sin
+	tasas para la moneda vale 1, como en `to_base_currency`: un NULL haría que
+	SUM descartara la fila en silencio.
+	"""
+	rates = ExchangeRate.objects.filter(currency=currency)
+	return Coalesce(
+		Subquery(rates.filter(date__lte=day).order_by('-date').values('rate')[:1]),
+		Subquery(rates.filter(date__gt=day).order_by('date').values('rate')[:1]),
+		Value(Decimal('1')),
+		output_field=RATE_FIELD,
+	)
+
+
+def converted(amount_field, currency_field, date_field, target):
+	"""
+	Expresión SQL con `amount_field` convertido a la moneda `target` con la
+	tasa vigente en la fecha de cada fila, para usar dentro de un SUM. Las
+	filas que ya están en `target` no consultan la tabla de tasas.
+	"""
+	base = settings.BASE_CURRENCY
+	day = OuterRef(date_field)
+	source_rate = Case(
+		When(**{currency_field: base}, then=Value(Decimal('1'))),
+		default=_rate(OuterRef(currency_field), day),
+		output_field=RATE_FIELD,
+	)
+	factor = source_rate if target == base else ExpressionWrapper(source_rate / _rate(target, day), output_field=RATE_FIELD)
+	return Case(
+		When(**{currency_field: target}, then=F(amount_field)),
+		default=ExpressionWrapper(F(amount_field) * factor, output_field=AMOUNT_FIELD),
+		output_field=AMOUNT_FIELD,
+	)
+
+
+def user_currencies(user_id):
+	"""Monedas en las que el usuario tiene movimientos, en caché hasta su próxima escritura."""
+	key = f'currencies:{user_id}:{user_cache_version(user_id)}'
+	currencies = cache.get(key)
+	if currencies is None:
+		currencies = frozenset(
+			MonthlyRollup.objects.filter(user_id=user_id, count__gt=0).values_list('currency', flat=True).distinct()
+		)
+		cache.set(key, currencies, RATE_CACHE_TIMEOUT)
+	return currencies
+
+
+class CurrencyScope:
+	"""
+	Cómo sumar importes en la moneda preferida del usuario.
+
+	Si todos sus movimientos están en esa moneda (el caso habitual), los
+	reportes suman los importes tal cual y pueden usar el rollup mensual. Si no,
+	suman importes convertidos con la tasa de cada día, leyendo del rollup
+	diario, que conserva la fecha.
+	"""
+
+	def __init__(self, user):
+		self.currency = user.preferred_currency
+		self.mixed = bool(user_currencies(user.pk) - {self.currency})
+
+	def total(self, amount_field, date_field, **extra):
+		if not self.mixed:
+			return Sum(amount_field, **extra)
+		return Sum(converted(amount_field, 'currency', date_field, self.currency), **extra)
+
+	def filter(self, queryset):
+		# Con una sola moneda se filtra por ella: si la caché de monedas se quedara
+		# atrás, faltarían filas en vez de sumarse importes de monedas distintas.
+		return queryset if self.mixed else queryset.filter(currency=self.currency)
+
+
+def iter_rate_rows(stream, encoding='utf-8-sig'):
+	"""Genera `(línea, fecha, moneda, tasa)` de un CSV con columnas date, currency, rate."""
+	lines = (line.decode(encoding) if isinstance(line, bytes) else line for line in stream)
+	reader = csv.DictReader(lines)
+	for row in reader:
+		try:
+			day = datetime.strptime((row.get('date') or '').strip(), '%Y-%m-%d').date()
+			rate = Decimal((row.get('rate') or '').strip())
+		except (ValueError, InvalidOperation):
+			raise ValueError(f'Línea {reader.line_num}: fecha o tasa inválida.')
+		currency = normalize_currency(row.get('currency'))
+		if not currency or rate <= 0:
+			raise ValueError(f'Línea {reader.line_num}: moneda o tasa inválida.')
+		yield reader.line_num, day, currency, rate
+
+
+@transaction.atomic
+def import_exchange_rates(rows, batch_size=RATE_IMPORT_BATCH_SIZE):
+	"""
+	Carga o reemplaza tasas `(fecha, moneda, tasa)` en lotes. Las tasas de la
+	moneda base se ignoran (siempre vale 1). Devuelve cuántas se guardaron.
+	"""
+	rates = (
+		ExchangeRate(date=day, currency=currency, rate=rate)
+		for _, day, currency, rate in rows
+		if currency != settings.BASE_CURRENCY
+	)
+	saved = 0
+	while True:
+		batch = list(islice(rates, batch_size))
+		if not batch:
+			break
+		ExchangeRate.objects.bulk_create(
+			batch,
+			update_conflicts=True,
+			unique_fields=['currency', 'date'],
+			update_fields=['rate'],
+		)
+		saved += len(batch)
+	transaction.on_commit(bump_exchange_rates_version)
+	return saved
@@ -0,0 +1,61 @@
+from functools import partial
+
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .categories import visible_categories
+from .concurrency import run_concurrently
+from .models import Movement
+from .reports import budget_status, build_summary, summary_queries
+
+
+DASHBOARD_SECTIONS = ('profile', 'summary', 'categories', 'movements', 'budgets')
+
+
+def parse_dashboard_sections(params):
+	"""Secciones pedidas con `?fields=summary,movements`; por defecto, todas."""
+	raw = params.get('fields', '')
+	sections = [name.strip() for name in raw.split(',') if name.strip()]
+	unknown = [name for name in sections if name not in DASHBOARD_SECTIONS]
+	if unknown:
+		raise ValidationError({'fields': f'Secciones desconocidas: {", ".join(unknown)}. Usa: {", ".join(DASHBOARD_SECTIONS)}.'})
+	return [name for name in DASHBOARD_SECTIONS if not sections or name in sections]
+
+
+def recent_movements(user, limit):
+	# Una fila extra para saber si hay más páginas, igual que MovementCursorPagination.
+	return list(
+		Movement.objects.filter(user=user)
+		.select_related('category')
+		.order_by('-date', '-id')[:limit + 1]
+	)
+
+
+def dashboard_queries(user, sections, limit):
+	"""
+	Consultas de todas las secciones pedidas (`nombre → callable`), en un solo
+	diccionario para lanzarlas juntas con `run_concurrently`. Las del resumen
+	llevan el prefijo `summary.`. El perfil no consulta nada: ya viene con el
+	usuario autenticado.
+	"""
+	queries = {}
+	if 'summary' in sections:
+		queries.update({f'summary.{name}': query for name, query in summary_queries(user).items()})
+	if 'categories' in sections:
+		queries['categories'] = partial(visible_categories, user.pk)
+	if 'movements' in sections:
+		queries['movements'] = partial(recent_movements, user, limit)
+	if 'budgets' in sections:
+		queries['budgets'] = partial(budget_status, user, [timezone.localdate().replace(day=1)])
+	return queries
+
+
+def load_dashboard(user, sections, limit):
+	"""Resultados crudos por sección; el resumen ya combinado con `build_summary`."""
+	results = run_concurrently(dashboard_queries(user, sections, limit))
+	data = {name: value for name, value in results.items() if not name.startswith('summary.')}
+	if 'summary' in sections:
+		data['summary'] = build_summary({
+			name.split('.', 1)[1]: rows for name, rows in results.items() if name.startswith('summary.')
+		})
+	return data
@@ -0,0 +1,323 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import date
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.http import StreamingHttpResponse
+
+from .models import Movement, MonthlyRollup
+from .pagination import movements_after
+from .reports import split_report_range
+
+
+EXPORT_CHUNK_SIZE = 2000
+CENT = Decimal('0.01')
+
+# (nombre de columna, tipo, campo del queryset)
+MOVEMENT_EXPORT_COLUMNS = [
+	('id', 'int', 'id'),
+	('date', 'date', 'date'),
+	('type', 'str', 'type'),
+	('amount', 'decimal', 'amount'),
+	('currency', 'str', 'currency'),
+	('category', 'str', 'category__name'),
+	('description', 'str', 'description'),
+]
+
+REPORT_EXPORT_COLUMNS = [
+	('month', 'date', 'month'),
+	('type', 'str', 'type'),
+	('category', 'str', 'category__name'),
+	('currency', 'str', 'currency'),
+	('total', 'decimal', 'total'),
+	('count', 'int', 'count'),
+]
+
+EXPORT_FORMATS = {
+	'csv': ('text/csv; charset=utf-8', 'csv'),
+	'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+	'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def iter_movement_chunks(queryset, fields=None, chunk_size=EXPORT_CHUNK_SIZE):
+	"""
+	Recorre los movimientos en bloques por rangos de (-date, -id).
+
+	Con `fields` cada bloque es una lista de tuplas con esos campos; sin ellos,
+	una lista de instancias. No se usa `.iterator()`: el backend de MySQL carga
+	el resultado completo en el cliente, mientras que cada bloque por rango es
+	una consulta acotada.
+	"""
+	base = queryset.order_by('-date', '-id')
+	if fields is not None:
+		base = base.values_list('date', 'id', *fields)
+	position = None
+	while True:
+		page = movements_after(base, *position) if position else base
+		rows = list(page[:chunk_size])
+		if not rows:
+			return
+		if fields is None:
+			yield rows
+			position = (rows[-1].date, rows[-1].id)
+		else:
+			yield [row[2:] for row in rows]
+			position = rows[-1][:2]
+		if len(rows) < chunk_size:
+			return
+
+
+def report_rows(user, start=None, end=None):
+	"""
+	Totales por mes, tipo, categoría y moneda, sin convertir; del rollup si el
+	rango cubre meses completos.
+	"""
+	months, partial_ranges = split_report_range(start, end)
+	if months and not partial_ranges:
+		qs = MonthlyRollup.objects.filter(user=user, count__gt=0)
+		months_from, months_to = months
+		if months_from:
+			qs = qs.filter(month__gte=months_from)
+		if months_to:
+			qs = qs.filter(month__lt=months_to)
+		qs = qs.values_list('month', 'type', 'category__name', 'currency').annotate(Sum('total'), Sum('count'))
+	else:
+		qs = Movement.objects.filter(user=user)
+		if start:
+			qs = qs.filter(date__gte=start)
+		if end:
+			qs = qs.filter(date__lte=end)
+		qs = (
+			qs.annotate(month=TruncMonth('date'))
+			.values_list('month', 'type', 'category__name', 'currency')
+			.annotate(Sum('amount'), Count('id'))
+		)
+	return [list(qs.order_by('month', 'type', 'category__name', 'currency'))]
+
+
+class _StreamSink(io.RawIOBase):
+	"""Destino de escritura que acumula bytes hasta que el generador los entrega."""
+
+	def __init__(self):
+		self.parts = []
+		self.position = 0
+
+	def writable(self):
+		return True
+
+	def write(self, data):
+		self.parts.append(bytes(data))
+		self.position += len(data)
+		return len(data)
+
+	def tell(self):
+		return self.position
+
+	def drain(self):
+		data = b''.join(self.parts)
+		self.parts = []
+		return data
+
+
+# Una celda de texto que empiece así se evalúa como fórmula al abrir el CSV
+# en una hoja de cálculo (inyección de fórmulas con descripciones o nombres de
+# categoría). Solo se neutralizan las columnas de texto: los importes negativos
+# siguen siendo números.
+_CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value, kind):
+	if kind == 'str' and isinstance(value, str) and value.startswith(_CSV_FORMULA_PREFIXES):
+		return "'" + value
+	return value
+
+
+def stream_csv(columns, chunks):
+	yield '\ufeff'.encode('utf-8')  # BOM para que Excel reconozca UTF-8
+	buffer = io.StringIO()
+	writer = csv.writer(buffer)
+	kinds = [kind for _, kind, _ in columns]
+	writer.writerow([name for name, _, _ in columns])
+	for chunk in chunks:
+		writer.writerows([_csv_cell(value, kind) for value, kind in zip(row, kinds)] for row in chunk)
+		yield buffer.getvalue().encode('utf-8')
+		buffer.seek(0)
+		buffer.truncate()
+	yield buffer.getvalue().encode('utf-8')
+
+
+XLSX_MAX_ROWS = 1_048_576
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_EXCEL_EPOCH = date(1899, 12, 30)
+
+_XLSX_CONTENT_TYPES = (
+	'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+	'<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+	'<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+	'<Default Extension="xml" ContentType="application/xml"/>'
+	'<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+	'<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+	'{sheets}'
+	'</Types>'
+)
+_XLSX_ROOT_RELS = (
+	'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+	'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+	'<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+	'</Relationships>'
+)
+_XLSX_STYLES = (
+	'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+	'<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+	'<fonts count="1"><font/></fonts><fills count="1"><fill/></fills><borders count="1"><border/></borders>'
+	'<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+	'<cellXfs count="2"><xf/><xf numFmtId="14" applyNumberFormat="1"/></cellXfs>'
+	'</styleSheet>'
+)
+_XLSX_SHEET_START = (
+	'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+	'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_XLSX_SHEET_END = '</sheetData></worksheet>'
+
+
+def _xlsx_cell(value, kind):
+	if value is None:
+		return '<c/>'
+	if kind == 'date':
+		return f'<c s="1"><v>{(value - _EXCEL_EPOCH).days}</v></c>'
+	if kind in ('int', 'decimal'):
+		return f'<c><v>{value}</v></c>'
+	text = escape(_XML_ILLEGAL.sub('', str(value)))
+	return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values, kinds):
+	return '<row>' + ''.join(_xlsx_cell(value, kind) for value, kind in zip(values, kinds)) + '</row>'
+
+
+def stream_xlsx(columns, chunks):
+	"""
+	Escribe un XLSX mínimo (hojas con cadenas en línea) directamente en un ZIP
+	en streaming, sin construir el libro en memoria. Al llegar al límite de
+	filas de Excel se continúa en una hoja nueva.
+	"""
+	sink = _StreamSink()
+	kinds = [kind for _, kind, _ in columns]
+	header = '<row>' + ''.join(_xlsx_cell(name, 'str') for name, _, _ in columns) + '</row>'
+
+	with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+		sheet_count = 0
+		sheet = None
+		rows_in_sheet = XLSX_MAX_ROWS
+		for chunk in chunks:
+			for values in chunk:
+				if rows_in_sheet >= XLSX_MAX_ROWS:
+					if sheet is not None:
+						sheet.write(_XLSX_SHEET_END.encode('utf-8'))
+						sheet.close()
+					sheet_count += 1
+					sheet = archive.open(f'xl/worksheets/sheet{sheet_count}.xml', 'w', force_zip64=True)
+					sheet.write((_XLSX_SHEET_START + header).encode('utf-8'))
+					rows_in_sheet = 1
+				sheet.write(_xlsx_row(values, kinds).encode('utf-8'))
+				rows_in_sheet += 1
+			yield sink.drain()
+
+		if sheet is None:
+			sheet_count = 1
+			sheet = archive.open('xl/worksheets/sheet1.xml', 'w')
+			sheet.write((_XLSX_SHEET_START + header).encode('utf-8'))
+		sheet.write(_XLSX_SHEET_END.encode('utf-8'))
+		sheet.close()
+
+		sheet_numbers = range(1, sheet_count + 1)
+		archive.writestr('[Content_Types].xml', _XLSX_CONTENT_TYPES.format(sheets=''.join(
+			f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+			'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+			for n in sheet_numbers
+		)))
+		archive.writestr('_rels/.rels', _XLSX_ROOT_RELS)
+		archive.writestr('xl/styles.xml', _XLSX_STYLES)
+		archive.writestr('xl/workbook.xml', (
+			'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+			'<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+			'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+			+ ''.join(f'<sheet name="Hoja{n}" sheetId="{n}" r:id="rId{n}"/>' for n in sheet_numbers)
+			+ '</sheets></workbook>'
+		))
+		archive.writestr('xl/_rels/workbook.xml.rels', (
+			'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+			'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+			+ ''.join(
+				f'<Relationship Id="rId{n}" '
+				'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+				f'Target="worksheets/sheet{n}.xml"/>'
+				for n in sheet_numbers
+			)
+			+ f'<Relationship Id="rId{sheet_count + 1}" '
+			'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+			'</Relationships>'
+		))
+	yield sink.drain()
+
+
+def _quantize(values):
+	# Las sumas pueden traer más decimales (p. ej. en SQLite); Parquet exige la escala fija.
+	return [value.quantize(CENT) if value is not None else None for value in values]
+
+
+def parquet_available():
+	try:
+		import pyarrow  # noqa: F401
+	except ImportError:
+		return False
+	return True
+
+
+def stream_parquet(columns, chunks):
+	"""Escribe Parquet con un row group por bloque. Requiere la dependencia opcional pyarrow."""
+	import pyarrow as pa
+	import pyarrow.parquet as pq
+
+	arrow_types = {
+		'int': pa.int64(),
+		'date': pa.date32(),
+		'str': pa.string(),
+		'decimal': pa.decimal128(14, 2),
+	}
+	schema = pa.schema([(name, arrow_types[kind]) for name, kind, _ in columns])
+	sink = _StreamSink()
+	writer = pq.ParquetWriter(sink, schema, compression='snappy')
+	try:
+		for chunk in chunks:
+			columns_data = list(zip(*chunk)) if chunk else [()] * len(schema)
+			arrays = [
+				pa.array(_quantize(values) if kind == 'decimal' else values, type=field.type)
+				for values, field, (_, kind, _) in zip(columns_data, schema, columns)
+			]
+			writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+			yield sink.drain()
+	finally:
+		writer.close()
+	yield sink.drain()
+
+
+EXPORT_WRITERS = {
+	'csv': stream_csv,
+	'xlsx': stream_xlsx,
+	'parquet': stream_parquet,
+}
+
+
+def export_response(file_format, columns, chunks, filename):
+	content_type, extension = EXPORT_FORMATS[file_format]
+	response = StreamingHttpResponse(EXPORT_WRITERS[file_format](columns, chunks), content_type=content_type)
+	response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+	return response
@@ -0,0 +1,275 @@
+import codecs
+import csv
+import io
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from functools import partial
+from itertools import islice
+
+from django.db import transaction
+
+from .caching import bump_user_cache_version
+from .categories import visible_categories
+from .currency import known_currencies, normalize_currency
+from .models import Movement
+from .rollups import RollupDeltas
+from .routers import pin_user_to_primary
+from .signals import bulk_movement_writes
+
+
+IMPORT_BATCH_SIZE = 2000
+MAX_REPORTED_REJECTS = 100
+MAX_AMOUNT = Decimal('9999999999.99')  # max_digits=12, decimal_places=2
+
+# Nombres de columna reconocidos (en minúsculas) para cada campo de Movement.
+DEFAULT_COLUMNS = {
+	'amount': ('amount', 'monto', 'importe', 'valor'),
+	'type': ('type', 'tipo'),
+	'date': ('date', 'fecha'),
+	'description': ('description', 'descripcion', 'descripción', 'concepto', 'detalle'),
+	'category': ('category', 'categoria', 'categoría'),
+	'currency': ('currency', 'moneda', 'divisa'),
+}
+
+TYPE_ALIASES = {
+	'income': Movement.MovementType.INCOME,
+	'ingreso': Movement.MovementType.INCOME,
+	'credit': Movement.MovementType.INCOME,
+	'expense': Movement.MovementType.EXPENSE,
+	'gasto': Movement.MovementType.EXPENSE,
+	'debit': Movement.MovementType.EXPENSE,
+}
+
+
+class RowRejected(Exception):
+	pass
+
+
+def _text_stream(stream, encoding):
+	"""Envuelve un archivo binario para leerlo como texto sin cargarlo entero."""
+	if isinstance(stream, io.TextIOBase):
+		return stream
+	return codecs.getreader(encoding)(stream, errors='replace')
+
+
+def iter_csv_rows(stream, encoding='utf-8-sig', delimiter=None):
+	"""Genera `(número de línea, fila)` de un CSV, detectando el separador si no se indica."""
+	text = _text_stream(stream, encoding)
+	if delimiter is None:
+		sample = text.readline()
+		delimiter = ';' if sample.count(';') > sample.count(',') else ','
+		lines = _prepend(sample, text)
+	else:
+		lines = text
+	reader = csv.DictReader(lines, delimiter=delimiter)
+	for row in reader:
+		yield reader.line_num, row
+
+
+def _prepend(first, rest):
+	yield first
+	yield from rest
+
+
+OFX_TRANSACTION = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.IGNORECASE | re.DOTALL)
+OFX_FIELD = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+def iter_ofx_rows(stream, encoding='latin-1', chunk_size=64 * 1024):
+	"""
+	Genera `(número de transacción, fila)` de un extracto OFX (SGML o XML).
+
+	Se lee por bloques y solo se conserva en memoria la transacción en curso.
+	"""
+	text = _text_stream(stream, encoding)
+	buffer = ''
+	number = 0
+	while True:
+		chunk = text.read(chunk_size)
+		buffer += chunk
+		last_end = 0
+		for match in OFX_TRANSACTION.finditer(buffer):
+			number += 1
+			fields = {key.upper(): value.strip() for key, value in OFX_FIELD.findall(match.group(1))}
+			yield number, {
+				'date': fields.get('DTPOSTED', '')[:8],
+				'amount': fields.get('TRNAMT', ''),
+				'description': ' - '.join(v for v in (fields.get('NAME'), fields.get('MEMO')) if v),
+			}
+			last_end = match.end()
+		buffer = buffer[last_end:]
+		if not chunk:
+			return
+		# Sin cierre de transacción a la vista solo hace falta conservar desde la última apertura.
+		start = buffer.upper().rfind('<STMTTRN>')
+		buffer = buffer[start:] if start >= 0 else buffer[-len('<STMTTRN>'):]
+
+
+class MovementImporter:
+	"""
+	Importa movimientos desde un flujo de filas hacia la tabla de un usuario.
+
+	Las filas se consumen de un generador y se escriben en lotes con
+	bulk_create, así la memoria depende del tamaño del lote y no del archivo.
+	Las categorías se resuelven con un diccionario nombre→id construido una vez.
+	"""
+
+	def __init__(
+		self, user, columns=None, date_format=None, decimal_comma=False,
+		default_category=None, batch_size=IMPORT_BATCH_SIZE, on_progress=None, on_reject=None,
+	):
+		self.user = user
+		self.columns = columns or {}
+		self.date_format = date_format
+		self.decimal_comma = decimal_comma
+		self.batch_size = batch_size
+		self.on_progress = on_progress
+		self.on_reject = on_reject
+		self.category_ids = self.build_category_map()
+		self.currencies = known_currencies() | {user.preferred_currency}
+		self.default_category_id = None
+		if default_category:
+			self.default_category_id = self.category_ids.get(default_category.strip().lower())
+			if self.default_category_id is None:
+				raise ValueError(f'La categoría por defecto "{default_category}" no existe.')
+		self.read = self.imported = self.rejected = 0
+		self.rejects = []
+
+	def build_category_map(self):
+		"""Nombre en minúsculas → id de las categorías visibles del usuario."""
+		return {category.name.strip().lower(): category.id for category in visible_categories(self.user.pk)}
+
+	def resolve_columns(self, row):
+		"""Asocia cada campo con la columna del archivo la primera vez que se ve una fila."""
+		headers = {key.strip().lower(): key for key in row if key}
+		resolved = {}
+		for field, aliases in DEFAULT_COLUMNS.items():
+			if field in self.columns:
+				resolved[field] = self.columns[field]
+				continue
+			resolved[field] = next((headers[alias] for alias in aliases if alias in headers), None)
+		if not resolved['amount'] or not resolved['date']:
+			raise ValueError('El archivo debe tener columnas de monto y fecha.')
+		return resolved
+
+	def parse_amount(self, value):
+		value = (value or '').strip().replace(' ', '').replace('$', '').replace('€', '')
+		if self.decimal_comma:
+			value = value.replace('.', '').replace(',', '.')
+		else:
+			value = value.replace(',', '')
+		try:
+			amount = Decimal(value).quantize(Decimal('0.01'))
+			# `nan` pasa el quantize y no se puede comparar con MAX_AMOUNT.
+			if not amount.is_finite():
+				raise RowRejected(f'Monto inválido: {value!r}')
+			if abs(amount) > MAX_AMOUNT:
+				raise RowRejected(f'Monto fuera de rango: {value!r}')
+		except InvalidOperation:
+			raise RowRejected(f'Monto inválido: {value!r}')
+		return amount
+
+	def parse_date(self, value):
+		value = (value or '').strip()
+		formats = [self.date_format] if self.date_format else ['%Y-%m-%d', '%Y%m%d', '%d/%m/%Y']
+		for fmt in formats:
+			try:
+				return datetime.strptime(value, fmt).date()
+			except ValueError:
+				continue
+		raise RowRejected(f'Fecha inválida: {value!r}')
+
+	def build_movement(self, row, columns):
+		amount = self.parse_amount(row.get(columns['amount']))
+		raw_type = (row.get(columns['type']) or '').strip().lower() if columns['type'] else ''
+		if raw_type:
+			movement_type = TYPE_ALIASES.get(raw_type)
+			if movement_type is None:
+				raise RowRejected(f'Tipo inválido: {raw_type!r}')
+		else:
+			movement_type = Movement.MovementType.EXPENSE if amount < 0 else Movement.MovementType.INCOME
+
+		category_name = (row.get(columns['category']) or '').strip().lower() if columns['category'] else ''
+		category_id = self.category_ids.get(category_name, self.default_category_id) if category_name else self.default_category_id
+		if category_id is None:
+			raise RowRejected(f'Categoría desconocida: {category_name!r}' if category_name else 'Sin categoría.')
+
+		currency = normalize_currency(row.get(columns['currency'])) if columns['currency'] else ''
+		if currency and currency not in self.currencies:
+			raise RowRejected(f'Moneda sin tasas de cambio: {currency!r}')
+
+		return Movement(
+			user=self.user,
+			amount=abs(amount),
+			currency=currency or self.user.preferred_currency,
+			type=movement_type,
+			date=self.parse_date(row.get(columns['date'])),
+			description=(row.get(columns['description']) or '').strip() if columns['description'] else '',
+			category_id=category_id,
+		)
+
+	def reject(self, line, reason):
+		self.rejected += 1
+		if len(self.rejects) < MAX_REPORTED_REJECTS:
+			self.rejects.append({'line': line, 'reason': reason})
+		if self.on_reject:
+			self.on_reject(line, reason)
+
+	def movements(self, rows):
+		columns = None
+		for line, row in rows:
+			self.read += 1
+			if columns is None:
+				columns = self.resolve_columns(row)
+			try:
+				yield self.build_movement(row, columns)
+			except RowRejected as exc:
+				self.reject(line, str(exc))
+
+	def write_batch(self, batch):
+		deltas = RollupDeltas()
+		for movement in batch:
+			deltas.add(self.user.id, movement.category_id, movement.type, movement.currency, movement.date, movement.amount, 1)
+		with transaction.atomic(), bulk_movement_writes():
+			Movement.objects.bulk_create(batch)
+			deltas.apply()
+		self.imported += len(batch)
+
+	def run(self, rows):
+		"""Consume `rows` (pares `(línea, dict)`) e importa en lotes. Devuelve el resumen."""
+		movements = self.movements(rows)
+		try:
+			while True:
+				batch = list(islice(movements, self.batch_size))
+				if not batch:
+					break
+				self.write_batch(batch)
+				if self.on_progress:
+					self.on_progress(self.read, self.imported, self.rejected)
+		finally:
+			if self.imported:
+				transaction.on_commit(partial(bump_user_cache_version, self.user.id))
+				transaction.on_commit(partial(pin_user_to_primary, self.user.id))
+		return self.summary()
+
+	def summary(self):
+		return {
+			'read': self.read,
+			'imported': self.imported,
+			'rejected': self.rejected,
+			'rejects': self.rejects,
+		}
+
+
+def import_rows_for_format(stream, file_format, **options):
+	"""Devuelve el generador de filas adecuado para `csv` u `ofx`."""
+	if file_format == 'ofx':
+		return iter_ofx_rows(stream)
+	if file_format == 'csv':
+		return iter_csv_rows(stream, delimiter=options.get('delimiter'))
+	raise ValueError(f'Formato no soportado: {file_format}')
+
+
+def guess_format(filename):
+	return 'ofx' if filename.lower().endswith(('.ofx', '.qfx')) else 'csv'
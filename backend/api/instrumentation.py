@@ -0,0 +1,451 @@
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework import serializers
+
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores de los buckets de los histogramas por vista.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024)
+
+# Los savepoints no cuentan: dependen de si la petición ya corre dentro de
+# otra transacción (tests, ATOMIC_REQUESTS), no de lo que hace la vista.
+_SAVEPOINT_STATEMENTS = ('SAVEPOINT ', 'RELEASE SAVEPOINT ', 'ROLLBACK TO SAVEPOINT ')
+
+_current_recorders = contextvars.ContextVar('query_recorders', default=())
+_this_file = os.path.abspath(__file__)
+
+
+def _call_site():
+	"""
+	Primer frame de las apps del proyecto (fuera de las librerías y de
+	manage.py) que lanzó la consulta.
+	"""
+	root = str(settings.BASE_DIR)
+	frame = sys._getframe(2)
+	while frame is not None:
+		filename = frame.f_code.co_filename
+		if filename.startswith(root) and filename != _this_file and 'site-packages' not in filename:
+			path = os.path.relpath(filename, root)
+			if os.sep in path:
+				return f'{path}:{frame.f_lineno} en {frame.f_code.co_name}'
+		frame = frame.f_back
+	return None
+
+
+class QueryRecorder:
+	"""
+	Cuenta y cronometra las consultas SQL de una petición y guarda las más
+	lentas con el punto del código que las lanzó. El call site solo se calcula
+	para las consultas que entran en el top, así que el coste por consulta es
+	un par de sumas. Con `keep_all` guarda además todas con su call site (para
+	los presupuestos de consultas, en desarrollo y tests).
+	"""
+
+	def __init__(self, slow_limit=5, keep_all=False):
+		self.count = 0
+		self.duration = 0.0
+		self.slow_limit = slow_limit
+		self.queries = [] if keep_all else None  # (sql, call site) de todas, en orden
+		self._slowest = []  # montículo de (segundos, orden, sql, call site)
+		self._sequence = itertools.count()
+		self._lock = threading.Lock()
+
+	def add(self, sql, elapsed):
+		if sql.startswith(_SAVEPOINT_STATEMENTS):
+			return
+		if self.queries is not None:
+			site = _call_site()
+			with self._lock:
+				self.queries.append((sql, site))
+		with self._lock:
+			self.count += 1
+			self.duration += elapsed
+			if not self.slow_limit:
+				return
+			if len(self._slowest) >= self.slow_limit and elapsed <= self._slowest[0][0]:
+				return
+		entry = (elapsed, next(self._sequence), sql, _call_site())
+		with self._lock:
+			if len(self._slowest) < self.slow_limit:
+				heapq.heappush(self._slowest, entry)
+			elif elapsed > self._slowest[0][0]:
+				heapq.heapreplace(self._slowest, entry)
+
+	def slowest(self):
+		return [
+			{'ms': round(elapsed * 1000, 2), 'sql': sql, 'call_site': site}
+			for elapsed, _, sql, site in sorted(self._slowest, reverse=True)
+		]
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+	recorders = _current_recorders.get()
+	if not recorders:
+		return execute(sql, params, many, context)
+	started = time.perf_counter()
+	try:
+		return execute(sql, params, many, context)
+	finally:
+		elapsed = time.perf_counter() - started
+		for recorder in recorders:
+			recorder.add(sql, elapsed)
+
+
+def _install(connection):
+	if _execute_wrapper not in connection.execute_wrappers:
+		connection.execute_wrappers.append(_execute_wrapper)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+	_install(connection)
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install_query_recorder():
+	"""
+	Instala (una vez por proceso) el wrapper que atribuye cada consulta a los
+	QueryRecorder activos. Se engancha a cada conexión nueva de cualquier hilo,
+	incluidos los del pool de reportes: `concurrency._in_context` les copia el
+	contexto y con él el recorder de la petición.
+	"""
+	global _installed
+	if _installed:
+		return
+	with _install_lock:
+		if _installed:
+			return
+		connection_created.connect(_on_connection_created, dispatch_uid='api.instrumentation')
+		for connection in connections.all(initialized_only=True):
+			_install(connection)
+		_installed = True
+
+
+@contextmanager
+def recording_queries(slow_limit=5, keep_all=False):
+	"""
+	Registra en un QueryRecorder las consultas ejecutadas dentro del bloque.
+	Se puede anidar: cada consulta cuenta en todos los recorders activos.
+	"""
+	install_query_recorder()
+	recorder = QueryRecorder(slow_limit, keep_all)
+	token = _current_recorders.set(_current_recorders.get() + (recorder,))
+	try:
+		yield recorder
+	finally:
+		_current_recorders.reset(token)
+
+
+_current_serialization = contextvars.ContextVar('serialization_timer', default=None)
+
+
+class SerializationTimer:
+	"""
+	Tiempo dentro de `serializer.data` durante una petición, sin el SQL que se
+	lance ahí (p. ej. relaciones sin precargar), que ya cuenta en `db`. Solo se
+	mide el serializador más externo y en el hilo de la petición: lo que corre
+	en el pool de consultas se solapa con ella y no suma al tiempo de pared.
+	"""
+
+	def __init__(self, recorder):
+		self.recorder = recorder
+		self.duration = 0.0
+		self.depth = 0
+		self.thread = threading.get_ident()
+
+	def measure(self, func, *args, **kwargs):
+		if self.depth or threading.get_ident() != self.thread:
+			return func(*args, **kwargs)
+		self.depth += 1
+		sql_before = self.recorder.duration
+		started = time.perf_counter()
+		try:
+			return func(*args, **kwargs)
+		finally:
+			self.depth -= 1
+			self.duration += time.perf_counter() - started - (self.recorder.duration - sql_before)
+
+
+def timed_serialization(func):
+	"""
+	Cuenta el tiempo de `func` como serialización en las métricas de la
+	petición. Para rutas que arman la respuesta sin `serializer.data`.
+	"""
+	@wraps(func)
+	def wrapper(*args, **kwargs):
+		timer = _current_serialization.get()
+		if timer is None:
+			return func(*args, **kwargs)
+		return timer.measure(func, *args, **kwargs)
+
+	return wrapper
+
+
+_serialization_installed = False
+
+
+def install_serialization_timer():
+	"""
+	Envuelve (una vez por proceso) la propiedad `data` de los serializadores de
+	DRF para que el tiempo de serialización se mida aparte de la vista. Fuera de
+	`timing_serialization` solo añade una lectura de la variable de contexto.
+	"""
+	global _serialization_installed
+	with _install_lock:
+		if _serialization_installed:
+			return
+		for cls in (serializers.Serializer, serializers.ListSerializer):
+			cls.data = property(timed_serialization(cls.data.fget))
+		_serialization_installed = True
+
+
+@contextmanager
+def timing_serialization(recorder):
+	timer = SerializationTimer(recorder)
+	token = _current_serialization.set(timer)
+	try:
+		yield timer
+	finally:
+		_current_serialization.reset(token)
+
+
+class Histogram:
+	def __init__(self, bounds):
+		self.bounds = bounds
+		self.counts = [0] * (len(bounds) + 1)
+		self.count = 0
+		self.sum = 0
+		self.max = 0
+
+	def observe(self, value):
+		index = next((i for i, bound in enumerate(self.bounds) if value <= bound), len(self.bounds))
+		self.counts[index] += 1
+		self.count += 1
+		self.sum += value
+		self.max = max(self.max, value)
+
+	def quantile(self, q):
+		"""Estimación por el límite superior del bucket (como histogram_quantile)."""
+		if not self.count:
+			return None
+		target = q * self.count
+		for bound, cumulative in zip(self.bounds, itertools.accumulate(self.counts)):
+			if cumulative >= target:
+				return bound
+		return self.max
+
+	def as_dict(self):
+		labels = [str(bound) for bound in self.bounds] + ['+Inf']
+		return {
+			'buckets': dict(zip(labels, itertools.accumulate(self.counts))),
+			'count': self.count,
+			'sum': round(self.sum, 3),
+			'max': round(self.max, 3),
+			'p50': self.quantile(0.5),
+			'p95': self.quantile(0.95),
+		}
+
+
+class ViewMetrics:
+	def __init__(self):
+		self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+		self.sql_ms = Histogram(LATENCY_BUCKETS_MS)
+		self.serialize_ms = Histogram(LATENCY_BUCKETS_MS)
+		self.queries = Histogram(QUERY_BUCKETS)
+		self.response_bytes = Histogram(SIZE_BUCKETS)
+		self.statuses = {}
+		self.slowest_queries = []
+
+	def observe(self, sample, slow_limit):
+		self.latency_ms.observe(sample['total_ms'])
+		self.sql_ms.observe(sample['sql_ms'])
+		self.serialize_ms.observe(sample['serialize_ms'])
+		self.queries.observe(sample['queries'])
+		if sample['bytes'] is not None:
+			self.response_bytes.observe(sample['bytes'])
+		self.statuses[sample['status']] = self.statuses.get(sample['status'], 0) + 1
+		merged = self.slowest_queries + sample['slowest']
+		self.slowest_queries = sorted(merged, key=lambda query: query['ms'], reverse=True)[:slow_limit]
+
+	def as_dict(self):
+		return {
+			'requests': self.latency_ms.count,
+			'statuses': {str(code): count for code, count in sorted(self.statuses.items())},
+			'latency_ms': self.latency_ms.as_dict(),
+			'sql_ms': self.sql_ms.as_dict(),
+			'serialize_ms': self.serialize_ms.as_dict(),
+			'queries': self.queries.as_dict(),
+			'response_bytes': self.response_bytes.as_dict(),
+			'slowest_queries': self.slowest_queries,
+		}
+
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def record_request(view_name, sample, slow_limit=5):
+	with _metrics_lock:
+		_metrics.setdefault(view_name, ViewMetrics()).observe(sample, slow_limit)
+
+
+def metrics_snapshot():
+	"""Métricas acumuladas por vista desde el arranque de este proceso."""
+	with _metrics_lock:
+		return {name: metrics.as_dict() for name, metrics in sorted(_metrics.items())}
+
+
+def reset_metrics():
+	with _metrics_lock:
+		_metrics.clear()
+
+
+def _view_name(request):
+	match = getattr(request, 'resolver_match', None)
+	return (match.view_name or match.route) if match else 'sin-ruta'
+
+
+def server_timing(sample):
+	parts = [
+		f'db;dur={sample["sql_ms"]:.2f};desc="{sample["queries"]} consultas"',
+		f'serialize;dur={sample["serialize_ms"]:.2f}',
+		f'app;dur={sample["app_ms"]:.2f}',
+		f'render;dur={sample["render_ms"]:.2f}',
+		f'total;dur={sample["total_ms"]:.2f}',
+	]
+	return ', '.join(parts)
+
+
+class RequestMetricsMiddleware:
+	"""
+	Instrumentación opcional por petición (`REQUEST_METRICS=True`): número y
+	tiempo de las consultas SQL, las más lentas con su call site, tiempo de
+	serialización (`serializer.data`, sin su SQL), tiempo del resto de la vista
+	(`app`), tiempo de render de la respuesta y su tamaño. Lo expone en la cabecera `Server-Timing` y lo
+	acumula en histogramas por vista (`/api/admin/metrics/`).
+
+	Desactivada, Django la retira de la cadena al arrancar (MiddlewareNotUsed)
+	y no se instala ningún wrapper en las conexiones: coste cero.
+	"""
+
+	def __init__(self, get_response):
+		if not settings.REQUEST_METRICS:
+			raise MiddlewareNotUsed
+		install_query_recorder()
+		install_serialization_timer()
+		self.get_response = get_response
+		self.slow_limit = settings.REQUEST_METRICS_SLOW_QUERIES
+
+	def __call__(self, request):
+		started = time.perf_counter()
+		request._metrics_render = 0.0
+		with recording_queries(self.slow_limit) as recorder, timing_serialization(recorder) as serialization:
+			response = self.get_response(request)
+		total = time.perf_counter() - started
+
+		sample = {
+			'status': response.status_code,
+			'queries': recorder.count,
+			'sql_ms': recorder.duration * 1000,
+			'serialize_ms': serialization.duration * 1000,
+			'render_ms': request._metrics_render * 1000,
+			'total_ms': total * 1000,
+			'bytes': None if response.streaming else len(response.content),
+			'slowest': recorder.slowest(),
+		}
+		sample['app_ms'] = max(sample['total_ms'] - sample['sql_ms'] - sample['serialize_ms'] - sample['render_ms'], 0)
+		view_name = _view_name(request)
+		record_request(view_name, sample, self.slow_limit)
+
+		response['Server-Timing'] = server_timing(sample)
+		if sample['total_ms'] >= settings.REQUEST_METRICS_SLOW_MS:
+			logger.warning(
+				'Petición lenta %s %s (%s): %.0f ms, %d consultas en %.0f ms. Más lentas: %s',
+				request.method, request.path, view_name, sample['total_ms'],
+				sample['queries'], sample['sql_ms'], sample['slowest'],
+			)
+		return response
+
+	def process_template_response(self, request, response):
+		# Las respuestas de DRF se renderizan justo después de este hook.
+		started = time.perf_counter()
+
+		def rendered(response):
+			request._metrics_render += time.perf_counter() - started
+
+		response.add_post_render_callback(rendered)
+		return response
+
+
+class QueryBudgetExceeded(Exception):
+	pass
+
+
+def query_budget_for(view_func, method):
+	"""
+	Presupuesto de consultas SQL declarado por la vista en `query_budget`: un
+	entero, o un diccionario por acción del ViewSet o por método HTTP ('list',
+	'create', 'bulk', 'get', 'put'...). None si no declara ninguno.
+	"""
+	budget = getattr(getattr(view_func, 'cls', None), 'query_budget', None)
+	if isinstance(budget, dict):
+		method = method.lower()
+		actions = getattr(view_func, 'actions', None) or {}
+		return budget.get(actions.get(method, method))
+	return budget
+
+
+class QueryBudgetMiddleware:
+	"""
+	Comprueba que cada petición no supere el `query_budget` de su vista. Con
+	`QUERY_BUDGETS='log'` (por defecto con DEBUG) lo avisa en el logger; con
+	'raise' (los tests) lanza QueryBudgetExceeded con cada consulta y su call
+	site. Con 'off' Django la retira de la cadena.
+
+	Cuenta toda la petición, incluida la carga del usuario autenticado. En las
+	respuestas en streaming solo cuenta hasta que la vista devuelve la respuesta.
+	"""
+
+	def __init__(self, get_response):
+		if settings.QUERY_BUDGETS not in ('log', 'raise'):
+			raise MiddlewareNotUsed
+		install_query_recorder()
+		self.get_response = get_response
+		self.mode = settings.QUERY_BUDGETS
+
+	def __call__(self, request):
+		request._query_budget = None
+		with recording_queries(slow_limit=0, keep_all=True) as recorder:
+			response = self.get_response(request)
+		budget = request._query_budget
+		if budget is not None and recorder.count > budget:
+			self.exceeded(request, budget, recorder)
+		return response
+
+	def process_view(self, request, view_func, view_args, view_kwargs):
+		request._query_budget = query_budget_for(view_func, request.method)
+
+	def exceeded(self, request, budget, recorder):
+		queries = '\n'.join(f'  {i}. {sql} [{site}]' for i, (sql, site) in enumerate(recorder.queries, start=1))
+		message = f'{request.method} {request.path} hizo {recorder.count} consultas SQL; su presupuesto es {budget}:\n{queries}'
+		if self.mode == 'raise':
+			raise QueryBudgetExceeded(message)
+		logger.warning(message)
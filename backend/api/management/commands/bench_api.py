@@ -0,0 +1,92 @@
+import json
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from api.benchmarks import (
+	EndpointBenchmark,
+	benchmark_fixtures,
+	benchmark_meta,
+	compare_results,
+	endpoint_cases,
+	uncovered_url_names,
+)
+from api.models import Movement, User
+from api.seeding import SEED_ADMIN, SEED_PASSWORD, SEED_USER_PREFIX
+
+
+class Command(BaseCommand):
+	help = (
+		'Mide todas las rutas de api/urls.py (latencia p50/p95/p99, consultas SQL y pico '
+		'de memoria) sobre los datos de seed_data y guarda una línea base en JSON para '
+		'comparar entre ejecuciones. Las escrituras se revierten.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--iterations', type=int, default=20, help='Peticiones medidas por endpoint.')
+		parser.add_argument('--user', help='Usuario medido (por defecto, el sembrado con más movimientos).')
+		parser.add_argument('--only', nargs='+', default=[], help='Solo los endpoints cuyo nombre contenga alguno de estos textos.')
+		parser.add_argument('--warm', action='store_true', help='Permite servir las lecturas desde la caché de respuestas.')
+		parser.add_argument('--output', help='Archivo JSON donde guardar los resultados.')
+		parser.add_argument('--compare', help='Línea base JSON contra la que comparar.')
+		parser.add_argument('--threshold', type=float, default=0.2, help='Margen de regresión de latencia y memoria (0.2 = 20%%).')
+		parser.add_argument('--fail-on-regression', action='store_true', help='Termina con error si hay regresiones.')
+
+	def handle(self, *args, **options):
+		if options['iterations'] < 2:
+			raise CommandError('--iterations debe ser al menos 2 para calcular percentiles.')
+		try:
+			fixtures = benchmark_fixtures(options['user'] or self.heaviest_user(), SEED_ADMIN, f'{SEED_USER_PREFIX}0')
+		except (User.DoesNotExist, ValueError) as exc:
+			raise CommandError(f'{exc} Ejecuta antes: python manage.py seed_data')
+
+		cases = endpoint_cases(fixtures)
+		missing = uncovered_url_names(cases)
+		if missing:
+			self.stderr.write(f'Rutas sin caso en la suite: {", ".join(missing)}')
+		if options['only']:
+			cases = [case for case in cases if any(text in case.name for text in options['only'])]
+
+		self.stdout.write(
+			f'Usuario {fixtures["user"].username}, {options["iterations"]} peticiones por endpoint.\n'
+			f"{'endpoint':<48} {'status':>6} {'SQL':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'KiB':>9}"
+		)
+		# Los 4xx esperados (p. ej. sin permisos) no deben llenar la salida de avisos.
+		logging.getLogger('django.request').setLevel(logging.ERROR)
+		benchmark = EndpointBenchmark(fixtures, options['iterations'], warm=options['warm'], password=SEED_PASSWORD)
+		results = benchmark.run(cases, on_result=self.report)
+
+		report = {'meta': benchmark_meta(options['iterations'], options['warm']), 'results': results}
+		if options['output']:
+			with open(options['output'], 'w', encoding='utf-8') as handle:
+				json.dump(report, handle, indent=2, ensure_ascii=False)
+			self.stdout.write(self.style.SUCCESS(f'Resultados guardados en {options["output"]}.'))
+		if options['compare']:
+			self.compare(options['compare'], results, options['threshold'], options['fail_on_regression'])
+
+	def heaviest_user(self):
+		row = (
+			Movement.objects.filter(user__username__startswith=SEED_USER_PREFIX)
+			.values('user__username').annotate(total=Count('id')).order_by('-total').first()
+		)
+		if row is None:
+			raise CommandError('No hay datos sembrados. Ejecuta antes: python manage.py seed_data')
+		return row['user__username']
+
+	def report(self, name, result):
+		self.stdout.write(
+			f"{name:<48} {result['status']:>6} {result['queries']:>4} {result['p50_ms']:>9.2f} "
+			f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['peak_kib']:>9.1f}"
+		)
+
+	def compare(self, path, results, threshold, fail):
+		with open(path, encoding='utf-8') as handle:
+			baseline = json.load(handle)['results']
+		regressions = [row for row in compare_results(baseline, results, threshold) if row[4]]
+		for name, metric, old, new, _ in regressions:
+			self.stdout.write(self.style.WARNING(f'{name}: {metric} {old} → {new}'))
+		if not regressions:
+			self.stdout.write(self.style.SUCCESS(f'Sin regresiones frente a {path}.'))
+		elif fail:
+			raise CommandError(f'{len(regressions)} regresiones frente a {path}.')
@@ -0,0 +1,114 @@
+import asyncio
+import itertools
+import time
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.async_views import AsyncAdminUserDetailView, AsyncReportsSummaryView
+from api.benchmarks import cleanup_bench_users, run_threaded_requests, seed_movements, throughput_row
+from api.models import Role, User
+from api.rollups import rebuild_monthly_rollups
+from api.views import AdminUserDetailView, ReportsSummaryView
+
+
+BENCH_ADMIN = 'bench_admin'
+
+
+class Command(BaseCommand):
+	help = (
+		'Prueba de carga en proceso de los reportes: compara las vistas síncronas (como '
+		'bajo WSGI, con un hilo por petición) con las async (como bajo ASGI, con un event '
+		'loop), con los agregados en serie y en paralelo. Siembra datos: usar una base de '
+		'datos de pruebas.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--rows', type=int, default=200_000, help='Movimientos a sembrar (por defecto 200k).')
+		parser.add_argument('--users', type=int, default=20)
+		parser.add_argument('--requests', type=int, default=200, help='Peticiones por escenario.')
+		parser.add_argument(
+			'--concurrency',
+			type=int,
+			nargs='+',
+			default=[1, 8],
+			help='Peticiones simultáneas (hilos WSGI o tareas ASGI). Acepta varios valores.',
+		)
+		parser.add_argument('--seed', type=int, default=42)
+		parser.add_argument('--cleanup', action='store_true', help='Elimina los datos sembrados al terminar.')
+
+	def handle(self, *args, **options):
+		bench_users = seed_movements(options['rows'], options['users'], seed=options['seed'], log=self.stdout.write)
+		rebuild_monthly_rollups([user.id for user in bench_users])
+		target = bench_users[0]
+		admin, _ = User.objects.get_or_create(username=BENCH_ADMIN, defaults={'role': Role.objects.get_cached_by_name('admin')})
+
+		# Rango con días sueltos al inicio y al final: el resumen combina rollup y movimientos.
+		end = date.today() - timedelta(days=3)
+		start = end - timedelta(days=400)
+		endpoints = {
+			'reports/summary': (
+				ReportsSummaryView.as_view(), AsyncReportsSummaryView.as_view(), target, {},
+				lambda i: f'/api/reports/summary/?start={start}&end={end}&_={i}',  # `_` evita la caché de respuestas
+			),
+			'admin/users/<id>': (
+				AdminUserDetailView.as_view(), AsyncAdminUserDetailView.as_view(), admin, {'user_id': target.id},
+				lambda i: f'/api/admin/users/{target.id}/',
+			),
+		}
+
+		self.factory = APIRequestFactory()
+		self.sequence = itertools.count()
+		self.stdout.write(f"{'endpoint':<18} {'modo':<26} {'conc.':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+		try:
+			for name, (sync_view, async_view, user, kwargs, url) in endpoints.items():
+				for concurrency in options['concurrency']:
+					for label, runner, view, workers in (
+						('WSGI, consultas en serie', self.run_wsgi, sync_view, 1),
+						('WSGI, consultas en pool', self.run_wsgi, sync_view, None),
+						('ASGI, consultas en pool', self.run_asgi, async_view, None),
+					):
+						overrides = {'REPORT_QUERY_WORKERS': workers} if workers else {}
+						with override_settings(**overrides):
+							elapsed, latencies = runner(view, user, kwargs, url, options['requests'], concurrency)
+						self.report(name, label, concurrency, elapsed, latencies)
+		finally:
+			if options['cleanup']:
+				User.objects.filter(username=BENCH_ADMIN).delete()
+				cleanup_bench_users()
+
+	def build_request(self, user, url):
+		request = self.factory.get(url(next(self.sequence)))
+		force_authenticate(request, user)
+		return request
+
+	def run_wsgi(self, view, user, kwargs, url, total, concurrency):
+		return run_threaded_requests(lambda: view(self.build_request(user, url), **kwargs), total, concurrency)
+
+	def run_asgi(self, view, user, kwargs, url, total, concurrency):
+		async def main():
+			semaphore = asyncio.Semaphore(concurrency)
+
+			async def one(_):
+				async with semaphore:
+					await sync_to_async(close_old_connections)()
+					started = time.perf_counter()
+					response = await view(self.build_request(user, url), **kwargs)
+					await sync_to_async(response.render)()
+					latency = time.perf_counter() - started
+					await sync_to_async(close_old_connections)()
+					return latency
+
+			started = time.perf_counter()
+			latencies = await asyncio.gather(*(one(i) for i in range(total)))
+			return time.perf_counter() - started, latencies
+
+		return asyncio.run(main())
+
+	def report(self, name, label, concurrency, elapsed, latencies):
+		rate, p50, p95 = throughput_row(elapsed, latencies)
+		self.stdout.write(f'{name:<18} {label:<26} {concurrency:>5} {rate:>9.1f} {p50:>9.2f} {p95:>9.2f}')
@@ -0,0 +1,82 @@
+import itertools
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.benchmarks import cleanup_bench_users, run_threaded_requests, seed_movements, throughput_row
+from api.rollups import rebuild_monthly_rollups
+from api.views import ProfileView, ReportsSummaryView
+
+
+POOL_ENGINE = 'dj_db_conn_pool.backends.mysql'
+
+
+class Command(BaseCommand):
+	help = (
+		'Prueba de carga en proceso con hilos (como bajo WSGI) que compara abrir una '
+		'conexión por petición (CONN_MAX_AGE=0) con conexiones persistentes. Con '
+		'DB_POOL_SIZE > 0 mide el pool configurado. Usar contra un MySQL local de pruebas.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--rows', type=int, default=20_000, help='Movimientos a sembrar (por defecto 20k).')
+		parser.add_argument('--users', type=int, default=5)
+		parser.add_argument('--requests', type=int, default=500, help='Peticiones por escenario.')
+		parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+		parser.add_argument('--max-age', type=int, default=60, help='CONN_MAX_AGE del escenario persistente.')
+		parser.add_argument('--cleanup', action='store_true', help='Elimina los datos sembrados al terminar.')
+
+	def handle(self, *args, **options):
+		bench_users = seed_movements(options['rows'], options['users'], log=self.stdout.write)
+		rebuild_monthly_rollups([user.id for user in bench_users])
+		target = bench_users[0]
+		token = str(AccessToken.for_user(target))
+
+		if connections.settings['default']['ENGINE'] == POOL_ENGINE:
+			pool = connections.settings['default']['POOL_OPTIONS']
+			scenarios = [(f"pool de {pool['POOL_SIZE']}+{pool['MAX_OVERFLOW']}", None)]
+		else:
+			scenarios = [
+				('sin persistencia', 0),
+				(f"persistentes ({options['max_age']}s)", options['max_age']),
+			]
+
+		self.factory = APIRequestFactory()
+		self.sequence = itertools.count()
+		profile_url = reverse('auth-profile')
+		summary_url = reverse('reports-summary')
+		endpoints = {
+			'profile': (ProfileView.as_view(), lambda i: profile_url),
+			# `_` evita la caché de respuestas.
+			'reports/summary': (ReportsSummaryView.as_view(), lambda i: f'{summary_url}?_={i}'),
+		}
+
+		self.stdout.write(f"{'endpoint':<16} {'conexiones':<22} {'conc.':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+		original = {alias: connections.settings[alias]['CONN_MAX_AGE'] for alias in connections}
+		try:
+			for name, (view, url) in endpoints.items():
+				for concurrency in options['concurrency']:
+					for label, max_age in scenarios:
+						self.set_max_age(original if max_age is None else dict.fromkeys(original, max_age))
+						elapsed, latencies = run_threaded_requests(
+							lambda: view(self.build_request(token, url)), options['requests'], concurrency,
+						)
+						rate, p50, p95 = throughput_row(elapsed, latencies)
+						self.stdout.write(f'{name:<16} {label:<22} {concurrency:>5} {rate:>9.1f} {p50:>9.2f} {p95:>9.2f}')
+		finally:
+			self.set_max_age(original)
+			if options['cleanup']:
+				cleanup_bench_users()
+
+	def set_max_age(self, values):
+		# Cada hilo crea su conexión a partir de este diccionario, así que el
+		# cambio aplica a los hilos del siguiente escenario.
+		connections.close_all()
+		for alias, max_age in values.items():
+			connections.settings[alias]['CONN_MAX_AGE'] = max_age
+
+	def build_request(self, token, url):
+		return self.factory.get(url(next(self.sequence)), HTTP_AUTHORIZATION=f'Bearer {token}')
@@ -0,0 +1,123 @@
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+
+from api.benchmarks import cleanup_bench_users, seed_movements
+from api.models import Movement
+
+
+class Command(BaseCommand):
+	help = (
+		'Compara planes de ejecución y tiempos de las consultas de listado y reportes '
+		'de Movement sin y con los índices compuestos. Elimina y vuelve a crear esos '
+		'índices, así que debe ejecutarse sobre una base de datos de pruebas.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--rows', type=int, default=1_000_000, help='Movimientos a sembrar (por defecto 1M).')
+		parser.add_argument('--users', type=int, default=50, help='Usuarios entre los que se reparten los movimientos.')
+		parser.add_argument('--repeat', type=int, default=5, help='Repeticiones de cada consulta.')
+		parser.add_argument('--batch-size', type=int, default=5000)
+		parser.add_argument('--seed', type=int, default=42)
+		parser.add_argument('--no-explain', action='store_true', help='No imprime los planes de ejecución.')
+		parser.add_argument('--cleanup', action='store_true', help='Elimina los datos sembrados al terminar.')
+
+	def handle(self, *args, **options):
+		self.options = options
+		target = seed_movements(
+			options['rows'], options['users'], options['batch_size'], options['seed'], log=self.stdout.write,
+		)[0]
+		queries = self.build_queries(target)
+		indexes = Movement._meta.indexes
+
+		try:
+			with connection.schema_editor() as editor:
+				for index in indexes:
+					editor.remove_index(Movement, index)
+			before = self.run_queries('SIN índices compuestos', queries)
+		finally:
+			with connection.schema_editor() as editor:
+				for index in indexes:
+					editor.add_index(Movement, index)
+		after = self.run_queries('CON índices compuestos', queries)
+
+		self.stdout.write('\nResumen (mediana en ms):')
+		for name in queries:
+			speedup = before[name] / after[name] if after[name] else float('inf')
+			self.stdout.write(f'  {name:<28} {before[name]:>10.2f} -> {after[name]:>10.2f}  (x{speedup:.1f})')
+
+		if options['cleanup']:
+			cleanup_bench_users()
+
+	def build_queries(self, user):
+		"""Consultas equivalentes a las de MovementViewSet, ReportsSummaryView y las vistas de admin."""
+		user_qs = Movement.objects.filter(user=user)
+		# Posición del cursor tras unas cuantas páginas, y la categoría más reciente.
+		cursor_date, cursor_id = list(user_qs.order_by('-date', '-id').values_list('date', 'id')[:501])[-1]
+		category_id = user_qs.values_list('category_id', flat=True).first()
+		end = date.today()
+		start = end - timedelta(days=365)
+		range_qs = user_qs.filter(date__gte=start, date__lte=end)
+		return {
+			'list_first_page': lambda: list(user_qs.order_by('-date', '-id')[:50]),
+			'list_cursor_page': lambda: list(
+				user_qs.filter(Q(date__lt=cursor_date) | Q(date=cursor_date, id__lt=cursor_id), date__lte=cursor_date)
+				.order_by('-date', '-id')[:50]
+			),
+			'list_category_filter': lambda: list(
+				user_qs.filter(category_id=category_id).order_by('-date', '-id')[:50]
+			),
+			'report_totals_by_type': lambda: list(range_qs.values('type').annotate(total=Sum('amount')).order_by()),
+			'report_expense_by_category': lambda: list(
+				range_qs.filter(type=Movement.MovementType.EXPENSE)
+				.values('category__name', 'category__color')
+				.annotate(total=Sum('amount'))
+				.order_by('-total')
+			),
+			'report_monthly': lambda: list(
+				range_qs.annotate(month=TruncMonth('date')).values('month', 'type').annotate(total=Sum('amount')).order_by('month')
+			),
+			'admin_user_income': lambda: user_qs.filter(type=Movement.MovementType.INCOME).aggregate(Sum('amount')),
+		}
+
+	def run_queries(self, label, queries):
+		self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {label} =='))
+		results = {}
+		for name, run in queries.items():
+			run()  # calentamiento
+			timings = []
+			for _ in range(self.options['repeat']):
+				started = time.perf_counter()
+				run()
+				timings.append((time.perf_counter() - started) * 1000)
+			results[name] = statistics.median(timings)
+			self.stdout.write(f'{name}: {results[name]:.2f} ms')
+			if not self.options['no_explain']:
+				self.stdout.write(self.explain(run))
+		return results
+
+	def explain(self, run):
+		wrapper = _CaptureLastQuery()
+		with connection.execute_wrapper(wrapper):
+			run()
+		sql, params = wrapper.last
+		with connection.cursor() as cursor:
+			prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+			cursor.execute(f'{prefix} {sql}', params)
+			return '\n'.join('    ' + ' | '.join(str(col) for col in row) for row in cursor.fetchall())
+
+
+class _CaptureLastQuery:
+	"""Wrapper de ejecución que recuerda la última consulta SQL ejecutada."""
+
+	def __init__(self):
+		self.last = None
+
+	def __call__(self, execute, sql, params, many, context):
+		self.last = (sql, params)
+		return execute(sql, params, many, context)
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import cleanup_bench_users, seed_movements
+from api.models import Movement
+from api.serializers import MovementSerializer, MovementValuesSerializer
+
+
+LEAN_FIELDS = ['id', 'amount', 'type', 'date', 'category']
+
+
+class Command(BaseCommand):
+	help = (
+		'Mide filas/s al leer y serializar movimientos: MovementSerializer sobre '
+		'instancias frente a la ruta rápida desde .values_list(), con todos los '
+		'campos y con un subconjunto (?fields=).'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000], help='Filas por medición.')
+		parser.add_argument('--users', type=int, default=5)
+		parser.add_argument('--repeat', type=int, default=3, help='Repeticiones; se informa la mejor.')
+		parser.add_argument('--cleanup', action='store_true', help='Elimina los datos sembrados al terminar.')
+
+	def handle(self, *args, **options):
+		bench_users = seed_movements(max(options['sizes']), options['users'], log=self.stdout.write)
+		queryset = Movement.objects.filter(user__in=bench_users).order_by('-date', '-id')
+
+		scenarios = {
+			'MovementSerializer': lambda n: self.serialize_instances(queryset, n, None),
+			f'MovementSerializer ({len(LEAN_FIELDS)} campos)': lambda n: self.serialize_instances(queryset, n, LEAN_FIELDS),
+			'values_list': lambda n: self.serialize_values(queryset, n, None),
+			f'values_list ({len(LEAN_FIELDS)} campos)': lambda n: self.serialize_values(queryset, n, LEAN_FIELDS),
+		}
+
+		self.stdout.write(f"{'ruta':<34} {'filas':>8} {'segundos':>9} {'filas/s':>11}")
+		try:
+			for size in options['sizes']:
+				for name, run in scenarios.items():
+					elapsed = min(self.timed(run, size) for _ in range(options['repeat']))
+					self.stdout.write(f'{name:<34} {size:>8} {elapsed:>9.3f} {size / elapsed:>11.0f}')
+		finally:
+			if options['cleanup']:
+				cleanup_bench_users()
+
+	def timed(self, run, size):
+		started = time.perf_counter()
+		rows = run(size)
+		elapsed = time.perf_counter() - started
+		if len(rows) != size:
+			self.stderr.write(f'Solo hay {len(rows)} movimientos sembrados; usa tamaños menores.')
+		return elapsed
+
+	def serialize_instances(self, queryset, size, fields):
+		movements = list(queryset.select_related('category')[:size])
+		return MovementSerializer(movements, many=True, fields=fields).data
+
+	def serialize_values(self, queryset, size, fields):
+		serializer = MovementValuesSerializer(fields)
+		return serializer.many(queryset.values_list(*serializer.columns)[:size])
@@ -0,0 +1,46 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.provisioning import UserBulkCreator
+
+
+class Command(BaseCommand):
+	help = (
+		'Mide el alta en bloque de usuarios sin contraseña y con contraseña (un hilo y '
+		'varios para el hash) y proyecta el tiempo para --target usuarios. Todo se revierte.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--users', type=int, default=2000, help='Usuarios del escenario sin contraseña.')
+		parser.add_argument('--password-users', type=int, default=50, help='Usuarios de los escenarios con contraseña.')
+		parser.add_argument('--hash-workers', type=int, default=os.cpu_count() or 1)
+		parser.add_argument('--target', type=int, default=10_000, help='Usuarios para la proyección.')
+
+	def handle(self, *args, **options):
+		scenarios = [
+			('sin contraseña', options['users'], False, 1),
+			('contraseña, 1 hilo', options['password_users'], True, 1),
+			(f"contraseña, {options['hash_workers']} hilos", options['password_users'], True, options['hash_workers']),
+		]
+		self.stdout.write(f"{'escenario':<24} {'usuarios':>8} {'usuarios/s':>11} {'proyección':>12}")
+		for label, count, with_password, workers in scenarios:
+			elapsed = self.measure(count, with_password, workers)
+			rate = count / elapsed
+			self.stdout.write(f"{label:<24} {count:>8} {rate:>11.1f} {options['target'] / rate:>11.1f}s")
+		self.stdout.write(f'CPUs disponibles: {os.cpu_count()}. El hash en paralelo escala con los núcleos.')
+
+	def measure(self, count, with_password, workers):
+		rows = (
+			(i, {'username': f'bench_provision_{i}', 'email': f'bench_provision_{i}@example.com', 'password': 'bench-password-123'})
+			for i in range(count)
+		)
+		creator = UserBulkCreator(hash_workers=workers, keep_passwords=with_password)
+		started = time.perf_counter()
+		with transaction.atomic():
+			creator.run(rows)
+			elapsed = time.perf_counter() - started
+			transaction.set_rollback(True)
+		return elapsed
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Role
+from api.provisioning import USER_BATCH_SIZE, UserBulkCreator
+
+
+class Command(BaseCommand):
+	help = (
+		'Crea usuarios en bloque desde un CSV con columnas username, email y, opcionalmente, '
+		'first_name, last_name, preferred_currency y password.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help='Ruta del CSV.')
+		parser.add_argument('--role', default='user', help="Rol asignado a todos los usuarios (por defecto 'user').")
+		parser.add_argument('--batch-size', type=int, default=USER_BATCH_SIZE)
+		parser.add_argument('--hash-workers', type=int, help='Hilos para calcular los hashes de contraseña (por defecto, uno por CPU).')
+		parser.add_argument(
+			'--without-passwords', action='store_true',
+			help='Ignora la columna password: contraseñas inutilizables, que cada usuario define al recuperar la cuenta.',
+		)
+
+	def handle(self, *args, path, role, batch_size, hash_workers, without_passwords, **options):
+		role_obj = Role.objects.get_cached_by_name(role)
+		if role_obj is None:
+			raise CommandError(f'El rol "{role}" no existe.')
+
+		def progress(read, created, skipped):
+			self.stdout.write(f'{read} leídos, {created} creados, {skipped} omitidos')
+
+		try:
+			creator = UserBulkCreator(
+				role=role_obj,
+				batch_size=batch_size,
+				on_progress=progress,
+				hash_workers=hash_workers,
+				keep_passwords=not without_passwords,
+			)
+			summary = creator.run_csv(path)
+		except OSError as exc:
+			raise CommandError(str(exc))
+
+		for reject in summary['rejects']:
+			self.stdout.write(self.style.WARNING(f"Línea {reject['line']}: {reject['reason']}"))
+		self.stdout.write(self.style.SUCCESS(
+			f"Usuarios creados: {summary['created']} de {summary['read']} ({summary['skipped']} omitidos)."
+		))
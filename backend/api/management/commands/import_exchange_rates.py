@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.currency import import_exchange_rates, iter_rate_rows
+from api.stats import rebuild_system_stats
+
+
+class Command(BaseCommand):
+	help = (
+		'Carga tasas de cambio desde un CSV con columnas date (YYYY-MM-DD), currency y '
+		'rate (unidades de BASE_CURRENCY por unidad de la moneda). Las tasas existentes '
+		'para la misma moneda y fecha se reemplazan.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help='Ruta del CSV de tasas.')
+		parser.add_argument('--batch-size', type=int, default=2000)
+
+	def handle(self, *args, **options):
+		try:
+			with transaction.atomic(), open(options['path'], 'rb') as stream:
+				saved = import_exchange_rates(iter_rate_rows(stream), batch_size=options['batch_size'])
+				# Los totales del panel de administración están en la moneda base.
+				rebuild_system_stats()
+		except (OSError, ValueError) as exc:
+			raise CommandError(str(exc))
+		self.stdout.write(self.style.SUCCESS(f'{saved} tasas importadas.'))
@@ -0,0 +1,83 @@
+import csv
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import MovementImporter, guess_format, import_rows_for_format
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+	help = 'Importa movimientos de un extracto bancario CSV u OFX, leyéndolo en streaming.'
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help='Ruta del archivo a importar.')
+		parser.add_argument('--user', required=True, help='Nombre de usuario o id del dueño de los movimientos.')
+		parser.add_argument('--format', choices=['csv', 'ofx'], help='Formato del archivo (por defecto según la extensión).')
+		parser.add_argument('--delimiter', help='Separador del CSV (por defecto se detecta).')
+		parser.add_argument(
+			'--map',
+			action='append',
+			default=[],
+			metavar='CAMPO=COLUMNA',
+			help='Columna del CSV para un campo (amount, type, date, description, category, currency). Se puede repetir.',
+		)
+		parser.add_argument('--date-format', help='Formato strptime de las fechas, p. ej. %%d/%%m/%%Y.')
+		parser.add_argument('--decimal-comma', action='store_true', help='Los montos usan coma decimal (1.234,56).')
+		parser.add_argument('--default-category', help='Categoría para filas sin categoría o con una desconocida.')
+		parser.add_argument('--batch-size', type=int, default=2000)
+		parser.add_argument('--rejects', help='Escribe las filas rechazadas en este CSV.')
+
+	def handle(self, *args, **options):
+		user = self.get_user(options['user'])
+		columns = {}
+		for item in options['map']:
+			field, _, column = item.partition('=')
+			if not column:
+				raise CommandError(f'--map espera CAMPO=COLUMNA, se recibió {item!r}.')
+			columns[field.strip()] = column.strip()
+
+		rejects_file = open(options['rejects'], 'w', newline='', encoding='utf-8') if options['rejects'] else None
+		rejects_writer = csv.writer(rejects_file) if rejects_file else None
+		if rejects_writer:
+			rejects_writer.writerow(['line', 'reason'])
+
+		try:
+			importer = MovementImporter(
+				user,
+				columns=columns,
+				date_format=options['date_format'],
+				decimal_comma=options['decimal_comma'],
+				default_category=options['default_category'],
+				batch_size=options['batch_size'],
+				on_progress=self.report_progress,
+				on_reject=(lambda line, reason: rejects_writer.writerow([line, reason])) if rejects_writer else None,
+			)
+			file_format = options['format'] or guess_format(options['path'])
+			with open(options['path'], 'rb') as stream:
+				summary = importer.run(import_rows_for_format(stream, file_format, delimiter=options['delimiter']))
+		except ValueError as exc:
+			raise CommandError(str(exc))
+		finally:
+			if rejects_file:
+				rejects_file.close()
+
+		self.stdout.write(self.style.SUCCESS(
+			f'Leídas {summary["read"]} filas: {summary["imported"]} importadas, {summary["rejected"]} rechazadas.'
+		))
+		if not rejects_writer:
+			for reject in summary['rejects']:
+				self.stdout.write(f'  línea {reject["line"]}: {reject["reason"]}')
+
+	def get_user(self, value):
+		lookup = {'id': value} if value.isdigit() else {'username': value}
+		try:
+			return User.objects.get(**lookup)
+		except User.DoesNotExist:
+			raise CommandError(f'No existe el usuario {value!r}.')
+
+	def report_progress(self, read, imported, rejected):
+		self.stdout.write(f'{read} leídas, {imported} importadas, {rejected} rechazadas', ending='\r')
+		self.stdout.flush()
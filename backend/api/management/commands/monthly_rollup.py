@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.rollups import ROLLUP_PERIODS, diff_rollups, rebuild_rollups
+
+
+class Command(BaseCommand):
+	help = 'Reconstruye o verifica las tablas de totales mensuales y diarios (MonthlyRollup, DailyRollup).'
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--check',
+			action='store_true',
+			help='Solo compara los rollups con los movimientos, sin modificarlos.',
+		)
+		parser.add_argument(
+			'--user',
+			type=int,
+			action='append',
+			dest='user_ids',
+			help='Limita la operación a este id de usuario (se puede repetir).',
+		)
+
+	def handle(self, *args, check=False, user_ids=None, **options):
+		if not check:
+			created = rebuild_rollups(user_ids)
+			for model, count in created.items():
+				self.stdout.write(self.style.SUCCESS(f'{model.__name__} reconstruido: {count} filas.'))
+			return
+
+		total = 0
+		for model, (period_field, _) in ROLLUP_PERIODS.items():
+			differences = diff_rollups(model, user_ids)
+			for (user_id, period, category_id, mtype, currency), expected, stored in differences:
+				self.stdout.write(
+					f'{model.__name__}: usuario={user_id} {period_field}={period} categoría={category_id} tipo={mtype} '
+					f'moneda={currency}: '
+					f'esperado={expected[0]} ({expected[1]}) guardado={stored[0]} ({stored[1]})'
+				)
+			total += len(differences)
+		if total:
+			raise CommandError(f'{total} diferencias encontradas. Ejecuta el comando sin --check para reconstruir.')
+		self.stdout.write(self.style.SUCCESS('Los rollups coinciden con los movimientos.'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.seeding import SEED_ADMIN, SEED_PASSWORD, SEED_USER_PREFIX, DatasetSeeder, delete_seeded_data
+
+
+class Command(BaseCommand):
+	help = (
+		'Genera datos sintéticos reproducibles (usuarios, categorías, movimientos, '
+		'presupuestos y tasas de cambio) con bulk_create, de 1k a 10M movimientos. '
+		'Usar una base de datos de pruebas.'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument('--movements', type=int, default=100_000, help='Movimientos a generar (por defecto 100k).')
+		parser.add_argument('--users', type=int, help='Usuarios (por defecto, uno por cada 200 movimientos).')
+		parser.add_argument('--months', type=int, default=36, help='Meses de historial.')
+		parser.add_argument('--seed', type=int, default=42)
+		parser.add_argument('--batch-size', type=int, default=5000)
+		parser.add_argument('--reset', action='store_true', help='Borra antes los datos sembrados.')
+
+	def handle(self, *args, **options):
+		if options['reset']:
+			delete_seeded_data(log=self.stdout.write)
+		if options['movements'] <= 0:
+			return
+
+		seeder = DatasetSeeder(
+			options['movements'],
+			users=options['users'],
+			months=options['months'],
+			seed=options['seed'],
+			batch_size=options['batch_size'],
+			log=self.stdout.write,
+		)
+		try:
+			seeder.run()
+		except ValueError as exc:
+			raise CommandError(str(exc))
+		self.stdout.write(self.style.SUCCESS(
+			f'Credenciales: {SEED_USER_PREFIX}0 y {SEED_ADMIN} con la contraseña {SEED_PASSWORD!r}.'
+		))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.stats import diff_system_stats, rebuild_system_stats
+
+
+class Command(BaseCommand):
+	help = (
+		'Reconcilia los contadores del sistema (SystemStat) con las tablas de origen. '
+		'Pensado para ejecutarse periódicamente (cron).'
+	)
+
+	def add_arguments(self, parser):
+		parser.add_argument(
+			'--check',
+			action='store_true',
+			help='Solo informa las diferencias, sin corregirlas.',
+		)
+
+	def handle(self, *args, check=False, **options):
+		differences = diff_system_stats()
+		for (scope, key), expected, stored in differences:
+			self.stdout.write(
+				f'{scope}:{key or "-"}: esperado={expected[1]} ({expected[0]}) guardado={stored[1]} ({stored[0]})'
+			)
+
+		if check:
+			if differences:
+				raise CommandError(f'{len(differences)} contadores no coinciden. Ejecuta el comando sin --check para corregirlos.')
+			self.stdout.write(self.style.SUCCESS('Los contadores coinciden con los datos.'))
+			return
+
+		if differences:
+			created = rebuild_system_stats()
+			self.stdout.write(self.style.SUCCESS(f'Contadores reconstruidos: {created} filas.'))
+		else:
+			self.stdout.write(self.style.SUCCESS('Los contadores ya estaban al día.'))
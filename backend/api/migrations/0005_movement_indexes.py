@@ -0,0 +1,25 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_monthly_rollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movement',
+            index=models.Index(fields=['user', '-date', '-id'], name='movement_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movement',
+            index=models.Index(fields=['user', 'type', 'date', 'amount'], name='movement_user_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='movement',
+            index=models.Index(fields=['user', 'category', 'date'], name='movement_user_cat_date_idx'),
+        ),
+    ]
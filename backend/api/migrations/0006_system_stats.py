@@ -0,0 +1,48 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:19
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def build_system_stats(apps, schema_editor):
+    """Calcula los contadores del sistema a partir de los datos existentes."""
+    User = apps.get_model('api', 'User')
+    Movement = apps.get_model('api', 'Movement')
+    SystemStat = apps.get_model('api', 'SystemStat')
+
+    stats = []
+    for role_id, count in User.objects.values_list('role_id').annotate(Count('id')).order_by():
+        stats.append(SystemStat(scope='role', key='' if role_id is None else str(role_id), count=count))
+    for movement_type, count, total in Movement.objects.values_list('type').annotate(Count('id'), Sum('amount')).order_by():
+        stats.append(SystemStat(scope='movement_type', key=movement_type, count=count, total=total))
+    for user_id, count in Movement.objects.values_list('user_id').annotate(Count('id')).order_by():
+        stats.append(SystemStat(scope='user', key=str(user_id), count=count))
+    expenses = Movement.objects.filter(type='EXPENSE')
+    for category_id, count, total in expenses.values_list('category_id').annotate(Count('id'), Sum('amount')).order_by():
+        stats.append(SystemStat(scope='category', key=str(category_id), count=count, total=total))
+    SystemStat.objects.bulk_create(stats, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_movement_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SystemStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('role', 'Usuarios por rol'), ('movement_type', 'Movimientos por tipo'), ('user', 'Movimientos por usuario'), ('category', 'Gastos por categoría')], max_length=20)),
+                ('key', models.CharField(blank=True, max_length=32)),
+                ('count', models.BigIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', '-count'], name='systemstat_scope_count_idx'), models.Index(fields=['scope', '-total'], name='systemstat_scope_total_idx')],
+                'unique_together': {('scope', 'key')},
+            },
+        ),
+        migrations.RunPython(build_system_stats, migrations.RunPython.noop),
+    ]
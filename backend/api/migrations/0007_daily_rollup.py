@@ -0,0 +1,55 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def build_daily_rollups(apps, schema_editor):
+    """Calcula los totales diarios de los movimientos existentes."""
+    Movement = apps.get_model('api', 'Movement')
+    DailyRollup = apps.get_model('api', 'DailyRollup')
+
+    rows = (
+        Movement.objects.values('user_id', 'date', 'category_id', 'type')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    DailyRollup.objects.bulk_create(
+        (
+            DailyRollup(
+                user_id=row['user_id'], day=row['date'], category_id=row['category_id'],
+                type=row['type'], total=row['total'], count=row['count'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_system_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('type', models.CharField(choices=[('INCOME', 'Ingreso'), ('EXPENSE', 'Gasto')], max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='api.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['day'],
+                'unique_together': {('user', 'day', 'category', 'type')},
+            },
+        ),
+        migrations.RunPython(build_daily_rollups, migrations.RunPython.noop),
+    ]
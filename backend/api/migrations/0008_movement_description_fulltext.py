@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+INDEX_NAME = 'movement_description_ft'
+
+
+def add_fulltext_index(apps, schema_editor):
+    """Índice FULLTEXT sobre la descripción. Solo MySQL; en otras bases la búsqueda usa un índice en memoria."""
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    quote = schema_editor.quote_name
+    table = apps.get_model('api', 'Movement')._meta.db_table
+    schema_editor.execute(f'CREATE FULLTEXT INDEX {quote(INDEX_NAME)} ON {quote(table)} ({quote("description")})')
+
+
+def remove_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    quote = schema_editor.quote_name
+    table = apps.get_model('api', 'Movement')._meta.db_table
+    schema_editor.execute(f'DROP INDEX {quote(INDEX_NAME)} ON {quote(table)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_fulltext_index, remove_fulltext_index),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:54
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+
+def use_preferred_currency(apps, schema_editor):
+    """Los movimientos y rollups existentes quedan en la moneda preferida de su dueño."""
+    User = apps.get_model('api', 'User')
+    preferred = Subquery(User.objects.filter(pk=OuterRef('user_id')).values('preferred_currency')[:1])
+    for model_name in ('Movement', 'MonthlyRollup', 'DailyRollup'):
+        apps.get_model('api', model_name).objects.update(currency=preferred)
+
+
+def rebuild_system_stats(apps, schema_editor):
+    """
+    Recalcula los contadores del sistema como `compute_system_stats` ahora que
+    cada movimiento tiene moneda. La tabla de tasas se acaba de crear y está
+    vacía, así que los importes cuentan 1:1, igual que en `to_base_currency`;
+    al importar tasas, `import_exchange_rates` vuelve a reconstruirlos.
+    """
+    User = apps.get_model('api', 'User')
+    Movement = apps.get_model('api', 'Movement')
+    SystemStat = apps.get_model('api', 'SystemStat')
+
+    stats = []
+    for role_id, count in User.objects.values_list('role_id').annotate(Count('id')).order_by():
+        stats.append(SystemStat(scope='role', key='' if role_id is None else str(role_id), count=count))
+    for movement_type, count, total in Movement.objects.values_list('type').annotate(Count('id'), Sum('amount')).order_by():
+        stats.append(SystemStat(scope='movement_type', key=movement_type, count=count, total=total))
+    for user_id, count in Movement.objects.values_list('user_id').annotate(Count('id')).order_by():
+        stats.append(SystemStat(scope='user', key=str(user_id), count=count))
+    expenses = Movement.objects.filter(type='EXPENSE')
+    for category_id, count, total in expenses.values_list('category_id').annotate(Count('id'), Sum('amount')).order_by():
+        stats.append(SystemStat(scope='category', key=str(category_id), count=count, total=total))
+    SystemStat.objects.all().delete()
+    SystemStat.objects.bulk_create(stats, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_movement_description_fulltext'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='dailyrollup',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlyrollup',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='dailyrollup',
+            name='currency',
+            field=models.CharField(default='USD', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='monthlyrollup',
+            name='currency',
+            field=models.CharField(default='USD', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='movement',
+            name='currency',
+            field=models.CharField(default='USD', max_length=10),
+        ),
+        migrations.RunPython(use_preferred_currency, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='dailyrollup',
+            unique_together={('user', 'day', 'category', 'type', 'currency')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlyrollup',
+            unique_together={('user', 'month', 'category', 'type', 'currency')},
+        ),
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=10)),
+                ('date', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=10, max_digits=20)),
+            ],
+            options={
+                'ordering': ['currency', '-date'],
+                'unique_together': {('currency', 'date')},
+            },
+        ),
+        migrations.RunPython(rebuild_system_stats, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,50 @@
+import time
+
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 
+class RoleManager(models.Manager):
+	"""
+	Los roles son pocos y casi nunca cambian, así que se guardan en memoria del
+	proceso. El registro se vacía al guardar o borrar un rol (ver signals) y
+	caduca tras `registry_timeout` segundos para que los demás procesos también
+	vean el cambio.
+	"""
+	registry_timeout = 300
+
+	def __init__(self):
+		super().__init__()
+		self._registry = None
+		self._loaded_at = 0
+
+	def registry(self, reload=False):
+		if reload or self._registry is None or time.monotonic() - self._loaded_at > self.registry_timeout:
+			self._registry = {role.pk: role for role in self.get_queryset()}
+			self._loaded_at = time.monotonic()
+		return self._registry
+
+	def get_cached(self, role_id):
+		"""Rol con ese id desde el registro; recarga una vez si no lo encuentra."""
+		if role_id is None:
+			return None
+		role = self.registry().get(role_id)
+		if role is None:
+			role = self.registry(reload=True).get(role_id)
+		return role
+
+	def get_cached_by_name(self, name):
+		for reload in (False, True):
+			role = next((role for role in self.registry(reload).values() if role.name == name), None)
+			if role is not None:
+				return role
+		return None
+
+	def clear_registry(self):
+		self._registry = None
+
+
 class Role(models.Model):
 	"""Sistema de roles para el control de gastos"""
 	ROLE_CHOICES = [
@@ -14,6 +56,8 @@ class Role(models.Model):
 	description = models.TextField()
 	created_at = models.DateTimeField(auto_now_add=True)
 
+	objects = RoleManager()
+
 	class Meta:
 		ordering = ['name']
 
@@ -27,9 +71,28 @@ class User(AbstractUser):
 	# Rol asignado; puede ser null al crear migraciones, se asegura en señales
 	role = models.ForeignKey(Role, on_delete=models.PROTECT, related_name="users", null=True, blank=True)
 
+	def save(self, *args, **kwargs):
+		# El rol por defecto se asigna antes del INSERT, sin un UPDATE posterior.
+		if self._state.adding and self.role_id is None:
+			self.role = Role.objects.get_cached_by_name('user')
+		super().save(*args, **kwargs)
+
+	@property
+	def cached_role(self):
+		"""Rol del usuario leído del registro en memoria, sin consultar la base de datos."""
+		return Role.objects.get_cached(self.role_id)
+
 	@property
 	def is_admin(self):
-		return self.role.name == 'admin'
+		role = self.cached_role
+		return role is not None and role.name == 'admin'
+
+	def attach_cached_role(self):
+		"""Deja `user.role` resuelto desde el registro para que acceder a él no consulte."""
+		role = self.cached_role
+		if role is not None:
+			User.role.field.set_cached_value(self, role)
+		return self
 
 	def __str__(self):
 		return self.username
@@ -60,6 +123,7 @@ class Movement(models.Model):
 	type = models.CharField(max_length=10, choices=MovementType.choices)
 	date = models.DateField()
 	description = models.TextField(blank=True)
+	currency = models.CharField(max_length=10, default="USD")
 	category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name="movements")
 	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="movements")
 	created_at = models.DateTimeField(auto_now_add=True)
@@ -67,6 +131,14 @@ class Movement(models.Model):
 
 	class Meta:
 		ordering = ["-date", "-id"]
+		indexes = [
+			# Listado paginado por cursor y filtros por rango de fechas.
+			models.Index(fields=["user", "-date", "-id"], name="movement_user_date_idx"),
+			# Reportes por tipo; `amount` al final deja el índice cubriendo los SUM.
+			models.Index(fields=["user", "type", "date", "amount"], name="movement_user_type_date_idx"),
+			# Filtro por categoría del listado y gastos por categoría.
+			models.Index(fields=["user", "category", "date"], name="movement_user_cat_date_idx"),
+		]
 
 	def __str__(self):
 		return f"{self.get_type_display()} {self.amount} - {self.category.name}"
@@ -87,6 +159,86 @@ class Budget(models.Model):
 		return f"{self.category.name} {self.month}: {self.max_amount}"
 
 
+class MonthlyRollup(models.Model):
+	"""Totales precalculados por usuario, mes, categoría, tipo de movimiento y moneda."""
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="monthly_rollups")
+	month = models.DateField()  # primer día del mes
+	category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="monthly_rollups")
+	type = models.CharField(max_length=10, choices=Movement.MovementType.choices)
+	currency = models.CharField(max_length=10, default="USD")
+	total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+	count = models.IntegerField(default=0)
+
+	class Meta:
+		unique_together = ("user", "month", "category", "type", "currency")
+		ordering = ["month"]
+
+	def __str__(self):
+		return f"{self.user_id} {self.month:%Y-%m} {self.type}: {self.total}"
+
+
+class DailyRollup(models.Model):
+	"""Totales precalculados por usuario, día, categoría, tipo y moneda, para las series temporales y la conversión de monedas."""
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="daily_rollups")
+	day = models.DateField()
+	category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="daily_rollups")
+	type = models.CharField(max_length=10, choices=Movement.MovementType.choices)
+	currency = models.CharField(max_length=10, default="USD")
+	total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+	count = models.IntegerField(default=0)
+
+	class Meta:
+		unique_together = ("user", "day", "category", "type", "currency")
+		ordering = ["day"]
+
+	def __str__(self):
+		return f"{self.user_id} {self.day} {self.type}: {self.total}"
+
+
+class ExchangeRate(models.Model):
+	"""Unidades de la moneda base (settings.BASE_CURRENCY) que vale una unidad de `currency` en `date`."""
+	currency = models.CharField(max_length=10)
+	date = models.DateField()
+	rate = models.DecimalField(max_digits=20, decimal_places=10)
+
+	class Meta:
+		# También sirve la búsqueda de la última tasa anterior a una fecha.
+		unique_together = ("currency", "date")
+		ordering = ["currency", "-date"]
+
+	def __str__(self):
+		return f"{self.currency} {self.date}: {self.rate}"
+
+
+class SystemStat(models.Model):
+	"""
+	Contadores globales del sistema mantenidos en cada escritura, para que el
+	dashboard de administración no recorra las tablas completas.
+	"""
+	SCOPE_CHOICES = [
+		('role', 'Usuarios por rol'),
+		('movement_type', 'Movimientos por tipo'),
+		('user', 'Movimientos por usuario'),
+		('category', 'Gastos por categoría'),
+	]
+
+	scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+	# Id del rol, usuario o categoría, o el tipo de movimiento; '' = usuarios sin rol.
+	key = models.CharField(max_length=32, blank=True)
+	count = models.BigIntegerField(default=0)
+	total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+	class Meta:
+		unique_together = ("scope", "key")
+		indexes = [
+			models.Index(fields=["scope", "-count"], name="systemstat_scope_count_idx"),
+			models.Index(fields=["scope", "-total"], name="systemstat_scope_total_idx"),
+		]
+
+	def __str__(self):
+		return f"{self.scope}:{self.key} = {self.count} / {self.total}"
+
+
 class PasswordResetCode(models.Model):
 	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="reset_codes")
 	code = models.CharField(max_length=6)
@@ -0,0 +1,94 @@
+import base64
+from datetime import date
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def movements_after(queryset, last_date, last_id):
+	"""Filtra los movimientos que van después de (last_date, last_id) en el orden (-date, -id)."""
+	return queryset.filter(
+		Q(date__lt=last_date) | Q(date=last_date, id__lt=last_id),
+		date__lte=last_date,
+	)
+
+
+def _row_position(row):
+	# Instancias de Movement o tuplas `(date, id, ...)` de la ruta rápida con `.values_list()`.
+	return (row[0], row[1]) if isinstance(row, tuple) else (row.date, row.id)
+
+
+class MovementCursorPagination(BasePagination):
+	"""
+	Paginación por cursor (keyset) sobre el orden (-date, -id) de Movement.
+
+	El cursor codifica la fecha y el id de la última fila entregada; la página
+	siguiente se obtiene con un rango sobre esas columnas en vez de un OFFSET,
+	así el costo de cada página no crece con el historial del usuario.
+	"""
+	page_size = 50
+	page_size_query_param = 'limit'
+	max_page_size = 500
+	cursor_query_param = 'cursor'
+	invalid_cursor_message = 'Cursor inválido.'
+
+	def paginate_queryset(self, queryset, request, view=None):
+		self.request = request
+		self.page_size = self.get_page_size(request)
+		position = self.decode_cursor(request)
+		if position is not None:
+			queryset = movements_after(queryset, *position)
+
+		# Se pide una fila extra solo para saber si existe una página siguiente.
+		rows = list(queryset.order_by('-date', '-id')[:self.page_size + 1])
+		self.has_next = len(rows) > self.page_size
+		rows = rows[:self.page_size]
+		self.last_position = _row_position(rows[-1]) if rows else None
+		return rows
+
+	def get_paginated_response(self, data):
+		return Response({
+			'next': self.get_next_link(),
+			'results': data,
+		})
+
+	def get_page_size(self, request):
+		try:
+			size = int(request.query_params[self.page_size_query_param])
+		except (KeyError, ValueError):
+			return self.page_size
+		if size <= 0:
+			return self.page_size
+		return min(size, self.max_page_size)
+
+	def get_next_link(self):
+		if not self.has_next or self.last_position is None:
+			return None
+		url = self.request.build_absolute_uri()
+		cursor = self.encode_cursor(*self.last_position)
+		return replace_query_param(url, self.cursor_query_param, cursor)
+
+	def encode_cursor(self, last_date, last_id):
+		raw = f'{last_date.isoformat()}:{last_id}'.encode('ascii')
+		return base64.urlsafe_b64encode(raw).decode('ascii')
+
+	def decode_cursor(self, request):
+		encoded = request.query_params.get(self.cursor_query_param)
+		if not encoded:
+			return None
+		try:
+			raw = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+			last_date, last_id = raw.split(':', 1)
+			return date.fromisoformat(last_date), int(last_id)
+		except (TypeError, ValueError, UnicodeError):
+			raise NotFound(self.invalid_cursor_message)
+
+
+class AdminUsersPagination(PageNumberPagination):
+	"""Paginación por número de página para el listado de usuarios del administrador."""
+	page_size = 50
+	page_size_query_param = 'page_size'
+	max_page_size = 500
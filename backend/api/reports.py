@@ -0,0 +1,544 @@
+from calendar import monthrange
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.db.models import DateField, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, Trunc, TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .categories import visible_category_map
+from .concurrency import arun_concurrently, run_concurrently
+from .currency import CurrencyScope
+from .models import Budget, Category, DailyRollup, Movement, MonthlyRollup
+
+
+def parse_report_date(params, name):
+	"""Lee una fecha YYYY-MM-DD opcional de los parámetros de la petición."""
+	value = params.get(name)
+	if not value:
+		return None
+	try:
+		parsed = parse_date(value)
+	except ValueError:
+		parsed = None
+	if parsed is None:
+		raise ValidationError({name: 'Fecha inválida. Usa el formato YYYY-MM-DD.'})
+	return parsed
+
+
+def parse_budget_months(params, limit=36):
+	"""
+	Meses `YYYY-MM` pedidos: `?month=` (repetible o separado por comas) o el
+	rango `?start_month=&end_month=`. Por defecto, el mes actual.
+	"""
+	values = [v for raw in params.getlist('month') for v in raw.split(',') if v.strip()]
+	start, end = params.get('start_month'), params.get('end_month')
+	try:
+		months = [datetime.strptime(v.strip(), '%Y-%m').date() for v in values]
+		if start or end:
+			first = datetime.strptime(start or end, '%Y-%m').date()
+			last = datetime.strptime(end or start, '%Y-%m').date()
+			current = first
+			while current <= last and len(months) <= limit:
+				months.append(current)
+				current = _first_of_next_month(current)
+	except ValueError:
+		raise ValidationError({'month': 'Mes inválido. Usa el formato YYYY-MM.'})
+
+	if not months:
+		months = [timezone.localdate().replace(day=1)]
+	months = sorted(set(months))
+	if len(months) > limit:
+		raise ValidationError({'month': f'Máximo {limit} meses por consulta.'})
+	return months
+
+
+def budget_status(user, months):
+	"""
+	Gasto, restante y porcentaje usado de cada presupuesto de los meses dados.
+
+	El gasto sale del rollup mensual con una sola consulta agrupada por
+	(mes, categoría), sin importar cuántos meses o categorías se pidan. Si el
+	usuario tiene movimientos en otras monedas, del rollup diario convertido.
+	"""
+	budgets = list(
+		Budget.objects.filter(user=user, month__in=[m.strftime('%Y-%m') for m in months])
+		.select_related('category')
+		.order_by('month', 'category__name')
+	)
+	scope = CurrencyScope(user)
+	filters = {'user': user, 'type': Movement.MovementType.EXPENSE, 'category_id__in': {budget.category_id for budget in budgets}}
+	if scope.mixed:
+		rollup = (
+			DailyRollup.objects.filter(day__gte=months[0], day__lt=_first_of_next_month(months[-1]), **filters)
+			.annotate(month=TruncMonth('day'))
+			.filter(month__in=months)
+		)
+		total = scope.total('total', 'day')
+	else:
+		rollup = scope.filter(MonthlyRollup.objects.filter(month__in=months, **filters))
+		total = Sum('total')
+	spent = {
+		(month.strftime('%Y-%m'), category_id): amount
+		for month, category_id, amount in rollup.values_list('month', 'category_id').annotate(spent=total).order_by()
+	}
+
+	rows = []
+	for budget in budgets:
+		used = spent.get((budget.month, budget.category_id)) or Decimal('0')
+		rows.append({
+			'id': budget.id,
+			'month': budget.month,
+			'category': budget.category_id,
+			'category_name': budget.category.name,
+			'category_color': budget.category.color,
+			'max_amount': budget.max_amount,
+			'spent': used,
+			'remaining': budget.max_amount - used,
+			'percent_used': round(float(used / budget.max_amount * 100), 2) if budget.max_amount else None,
+			'exceeded': used > budget.max_amount,
+		})
+	return rows
+
+
+def _first_of_next_month(day):
+	return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def _is_last_day_of_month(day):
+	return day.day == monthrange(day.year, day.month)[1]
+
+
+def split_report_range(start, end):
+	"""
+	Divide el rango [start, end] en meses completos y tramos parciales.
+
+	Devuelve `(months, partial_ranges)`: `months` es `None` si no hay meses
+	completos, o `(desde, hasta)` con el primer día del primer mes incluido y el
+	primer día del mes siguiente al último (cualquiera puede ser `None` si el
+	rango está abierto). `partial_ranges` es una lista de `(desde, hasta)`
+	inclusivos que deben leerse de la tabla de movimientos.
+	"""
+	months_from = start
+	months_to = None
+	head = tail = None
+
+	if start and start.day != 1:
+		months_from = _first_of_next_month(start)
+		head = (start, months_from - timedelta(days=1))
+	if end:
+		if _is_last_day_of_month(end):
+			months_to = _first_of_next_month(end)
+		else:
+			months_to = end.replace(day=1)
+			tail = (months_to, end)
+
+	if months_from and months_to and months_from >= months_to:
+		return None, [(start, end)]
+
+	partial_ranges = [r for r in (head, tail) if r]
+	return (months_from, months_to), partial_ranges
+
+
+def _merge_rows(target, rows, key_fields):
+	for row in rows:
+		target[tuple(row[f] for f in key_fields)] += row['total'] or 0
+
+
+def summary_queries(user, start=None, end=None):
+	"""
+	Consultas independientes del resumen (`nombre → callable`), para poder
+	ejecutarlas en paralelo. Los meses completos se leen de `MonthlyRollup`;
+	solo los días sueltos al inicio o al final del rango, de `Movement`. Si el
+	usuario tiene movimientos en otras monedas, todo el rango sale de
+	`DailyRollup` con cada día convertido a su moneda preferida.
+	"""
+	scope = CurrencyScope(user)
+	if scope.mixed:
+		return _converted_summary_queries(user, scope, start, end)
+
+	months, partial_ranges = split_report_range(start, end)
+	queries = {}
+
+	if months:
+		rollup = scope.filter(MonthlyRollup.objects.filter(user=user, count__gt=0))
+		months_from, months_to = months
+		if months_from:
+			rollup = rollup.filter(month__gte=months_from)
+		if months_to:
+			rollup = rollup.filter(month__lt=months_to)
+		monthly = rollup.values('month', 'type').annotate(total=Sum('total')).order_by()
+		by_category = (
+			rollup.filter(type=Movement.MovementType.EXPENSE)
+			.values('category__name', 'category__color')
+			.annotate(total=Sum('total'))
+			.order_by()
+		)
+		queries['rollup_monthly'] = partial(list, monthly)
+		queries['rollup_categories'] = partial(list, by_category)
+
+	if partial_ranges:
+		date_filter = Q()
+		for range_start, range_end in partial_ranges:
+			bounds = Q()
+			if range_start:
+				bounds &= Q(date__gte=range_start)
+			if range_end:
+				bounds &= Q(date__lte=range_end)
+			date_filter |= bounds
+		qs = scope.filter(Movement.objects.filter(date_filter, user=user))
+		monthly = qs.annotate(month=TruncMonth('date')).values('month', 'type').annotate(total=Sum('amount')).order_by()
+		by_category = (
+			qs.filter(type=Movement.MovementType.EXPENSE)
+			.values('category__name', 'category__color')
+			.annotate(total=Sum('amount'))
+			.order_by()
+		)
+		queries['raw_monthly'] = partial(list, monthly)
+		queries['raw_categories'] = partial(list, by_category)
+
+	return queries
+
+
+def _converted_summary_queries(user, scope, start, end):
+	rollup = DailyRollup.objects.filter(user=user, count__gt=0)
+	if start:
+		rollup = rollup.filter(day__gte=start)
+	if end:
+		rollup = rollup.filter(day__lte=end)
+	total = scope.total('total', 'day')
+	monthly = rollup.annotate(month=TruncMonth('day')).values('month', 'type').annotate(total=total).order_by()
+	by_category = (
+		rollup.filter(type=Movement.MovementType.EXPENSE)
+		.values('category__name', 'category__color')
+		.annotate(total=total)
+		.order_by()
+	)
+	return {
+		'rollup_monthly': partial(list, monthly),
+		'rollup_categories': partial(list, by_category),
+	}
+
+
+def build_summary(results):
+	"""Combina los resultados de `summary_queries` en la respuesta del resumen."""
+	by_category = defaultdict(Decimal)
+	by_month = defaultdict(Decimal)
+	for name, rows in results.items():
+		if name.endswith('_monthly'):
+			_merge_rows(by_month, rows, ('month', 'type'))
+		else:
+			_merge_rows(by_category, rows, ('category__name', 'category__color'))
+
+	income = sum(
+		(total for (_, mtype), total in by_month.items() if mtype == Movement.MovementType.INCOME),
+		Decimal('0'),
+	)
+	expense = sum(
+		(total for (_, mtype), total in by_month.items() if mtype == Movement.MovementType.EXPENSE),
+		Decimal('0'),
+	)
+	category_breakdown = sorted(
+		(
+			{'category__name': name, 'category__color': color, 'total': total}
+			for (name, color), total in by_category.items()
+		),
+		key=lambda row: row['total'],
+		reverse=True,
+	)
+	monthly = [
+		{'month': month, 'type': mtype, 'total': total}
+		for (month, mtype), total in sorted(by_month.items())
+	]
+
+	return {
+		'income': income,
+		'expense': expense,
+		'balance': income - expense,
+		'category_breakdown': category_breakdown,
+		'monthly': monthly,
+	}
+
+
+def summarize_movements(user, start=None, end=None):
+	"""Resumen de ingresos, gastos, gastos por categoría y totales mensuales."""
+	return build_summary(run_concurrently(summary_queries(user, start, end)))
+
+
+async def asummarize_movements(user, start=None, end=None):
+	# Armar las consultas ya lee la base (monedas del usuario): se hace en un hilo.
+	queries = await sync_to_async(summary_queries)(user, start, end)
+	return build_summary(await arun_concurrently(queries))
+
+
+def user_detail_queries(user):
+	"""
+	Agregados independientes del detalle de usuario del panel de administración,
+	en la moneda preferida del usuario.
+	"""
+	scope = CurrencyScope(user)
+	movements = Movement.objects.filter(user=user)
+	zero = Value(Decimal('0'), output_field=DecimalField(max_digits=14, decimal_places=2))
+	totals = scope.filter(movements)
+	return {
+		'totals': partial(
+			totals.aggregate,
+			income=Coalesce(scope.total('amount', 'date', filter=Q(type=Movement.MovementType.INCOME)), zero),
+			expense=Coalesce(scope.total('amount', 'date', filter=Q(type=Movement.MovementType.EXPENSE)), zero),
+		),
+		'total_movements': movements.count,
+		'category_breakdown': partial(list, (
+			totals.filter(type=Movement.MovementType.EXPENSE)
+			.values('category__name', 'category__color')
+			.annotate(total=scope.total('amount', 'date'))
+			.order_by('-total')
+		)),
+		'monthly': partial(list, (
+			totals.annotate(month=TruncMonth('date'))
+			.values('month', 'type')
+			.annotate(total=scope.total('amount', 'date'))
+			.order_by('month')
+		)),
+		'total_categories': Category.objects.filter(user=user).count,
+		'total_budgets': Budget.objects.filter(user=user).count,
+	}
+
+
+def build_user_detail(user, results):
+	totals = results['totals']
+	return {
+		'id': user.id,
+		'username': user.username,
+		'email': user.email,
+		'first_name': user.first_name,
+		'last_name': user.last_name,
+		'preferred_currency': user.preferred_currency,
+		'role': user.cached_role.get_name_display() if user.role_id else None,
+		'registered_at': user.registered_at,
+		'statistics': {
+			'total_movements': results['total_movements'],
+			'total_income': float(totals['income']),
+			'total_expense': float(totals['expense']),
+			'balance': float(totals['income'] - totals['expense']),
+			'total_categories': results['total_categories'],
+			'total_budgets': results['total_budgets'],
+		},
+		'category_breakdown': results['category_breakdown'],
+		'monthly': results['monthly'],
+	}
+
+
+def user_detail(user):
+	"""Detalle y estadísticas de un usuario, con los agregados en paralelo."""
+	return build_user_detail(user, run_concurrently(user_detail_queries(user)))
+
+
+async def auser_detail(user):
+	queries = await sync_to_async(user_detail_queries)(user)
+	return build_user_detail(user, await arun_concurrently(queries))
+
+
+# Granularidad → ventana por defecto (hasta hoy) cuando no se indica `start`.
+TIME_SERIES_WINDOWS = {
+	'day': timedelta(days=90),
+	'week': timedelta(weeks=52),
+	'month': timedelta(days=365),
+	'year': timedelta(days=5 * 365),
+}
+TIME_SERIES_GROUPS = ('type', 'category')
+MAX_TIME_SERIES_BUCKETS = 2000  # más de 5 años de puntos diarios
+
+
+def bucket_start(day, granularity):
+	"""Primer día del período (día, semana ISO, mes o año) que contiene `day`."""
+	if granularity == 'week':
+		return day - timedelta(days=day.weekday())
+	if granularity == 'month':
+		return day.replace(day=1)
+	if granularity == 'year':
+		return day.replace(month=1, day=1)
+	return day
+
+
+def next_bucket(start, granularity):
+	if granularity == 'week':
+		return start + timedelta(weeks=1)
+	if granularity == 'month':
+		return _first_of_next_month(start)
+	if granularity == 'year':
+		return start.replace(year=start.year + 1)
+	return start + timedelta(days=1)
+
+
+def time_series_periods(start, end, granularity):
+	"""Inicio de cada período entre `start` y `end`, ambos incluidos."""
+	periods = []
+	current = bucket_start(start, granularity)
+	while current <= end:
+		if len(periods) >= MAX_TIME_SERIES_BUCKETS:
+			raise ValidationError({'start': f'Máximo {MAX_TIME_SERIES_BUCKETS} períodos por consulta.'})
+		periods.append(current)
+		current = next_bucket(current, granularity)
+	return periods
+
+
+def parse_time_series_params(params):
+	"""Lee `granularity`, `start`, `end`, `group_by` y `type` de la petición."""
+	granularity = params.get('granularity', 'month')
+	if granularity not in TIME_SERIES_WINDOWS:
+		raise ValidationError({'granularity': f'Usa uno de: {", ".join(TIME_SERIES_WINDOWS)}.'})
+	group_by = params.get('group_by', 'type')
+	if group_by not in TIME_SERIES_GROUPS:
+		raise ValidationError({'group_by': f'Usa uno de: {", ".join(TIME_SERIES_GROUPS)}.'})
+	movement_type = params.get('type', Movement.MovementType.EXPENSE)
+	if movement_type not in Movement.MovementType.values:
+		raise ValidationError({'type': f'Usa uno de: {", ".join(Movement.MovementType.values)}.'})
+
+	end = parse_report_date(params, 'end') or timezone.localdate()
+	start = parse_report_date(params, 'start') or end - TIME_SERIES_WINDOWS[granularity]
+	if start > end:
+		raise ValidationError({'start': 'La fecha inicial debe ser anterior a la final.'})
+	return granularity, start, end, group_by, movement_type
+
+
+def _period(field, granularity):
+	if granularity == 'day':
+		return F(field)
+	return Trunc(field, granularity, output_field=DateField())
+
+
+def _grouped_totals(qs, date_field, total, granularity):
+	return partial(list, (
+		qs.annotate(period=_period(date_field, granularity))
+		.values('period', 'category_id', 'type')
+		.annotate(total=total)
+		.order_by()
+	))
+
+
+def time_series_queries(user, granularity, start, end, today=None):
+	"""
+	Consultas independientes de la serie temporal (`nombre → callable`).
+
+	Los períodos cerrados se leen del rollup diario (o del mensual, si los
+	períodos son meses o años completos); solo el período en curso se calcula
+	desde `Movement`. Así el coste depende del número de períodos y categorías,
+	no del número de movimientos. El saldo inicial sale de los rollups. Con
+	movimientos en otras monedas se usa siempre el rollup diario, que conserva
+	la fecha para convertir cada día con su tasa.
+	"""
+	scope = CurrencyScope(user)
+	today = today or timezone.localdate()
+	open_start = bucket_start(today, granularity)
+	queries = {}
+
+	closed_end = min(end, open_start - timedelta(days=1))
+	if start <= closed_end:
+		full_months = granularity in ('month', 'year') and start.day == 1 and _is_last_day_of_month(closed_end)
+		if full_months and not scope.mixed:
+			rollup = scope.filter(MonthlyRollup.objects.filter(user=user, month__gte=start, month__lte=closed_end))
+			queries['closed'] = _grouped_totals(rollup, 'month', Sum('total'), granularity)
+		else:
+			rollup = scope.filter(DailyRollup.objects.filter(user=user, day__gte=start, day__lte=closed_end))
+			queries['closed'] = _grouped_totals(rollup, 'day', scope.total('total', 'day'), granularity)
+
+	open_from = max(start, open_start)
+	if open_from <= end:
+		movements = scope.filter(Movement.objects.filter(user=user, date__gte=open_from, date__lte=end))
+		queries['open'] = _grouped_totals(movements, 'date', scope.total('amount', 'date'), granularity)
+
+	if scope.mixed:
+		queries['opening_days'] = partial(list, (
+			DailyRollup.objects.filter(user=user, day__lt=start)
+			.values('type').annotate(total=scope.total('total', 'day')).order_by()
+		))
+		return queries
+
+	first_month = start.replace(day=1)
+	queries['opening_months'] = partial(list, (
+		scope.filter(MonthlyRollup.objects.filter(user=user, month__lt=first_month))
+		.values('type').annotate(total=Sum('total')).order_by()
+	))
+	if start > first_month:
+		queries['opening_days'] = partial(list, (
+			scope.filter(DailyRollup.objects.filter(user=user, day__gte=first_month, day__lt=start))
+			.values('type').annotate(total=Sum('total')).order_by()
+		))
+	return queries
+
+
+def _net(by_type):
+	return by_type[Movement.MovementType.INCOME] - by_type[Movement.MovementType.EXPENSE]
+
+
+def build_time_series(user, results, periods, granularity, start, end, group_by='type', movement_type=None):
+	"""Combina los resultados de `time_series_queries` en series alineadas con `periods`."""
+	position = {period: i for i, period in enumerate(periods)}
+
+	by_type = {mtype: [Decimal('0')] * len(periods) for mtype in Movement.MovementType.values}
+	by_category = defaultdict(lambda: [Decimal('0')] * len(periods))
+	for row in results.get('closed', []) + results.get('open', []):
+		i = position[bucket_start(row['period'], granularity)]
+		by_type[row['type']][i] += row['total'] or 0
+		if row['type'] == movement_type:
+			by_category[row['category_id']][i] += row['total'] or 0
+
+	opening = defaultdict(Decimal)
+	for row in results.get('opening_months', []) + results.get('opening_days', []):
+		opening[row['type']] += row['total'] or 0
+	balance = _net(opening)
+
+	net = [_net({mtype: values[i] for mtype, values in by_type.items()}) for i in range(len(periods))]
+	running = []
+	for value in net:
+		balance += value
+		running.append(balance)
+
+	if group_by == 'category':
+		categories = visible_category_map(user.pk)
+		missing = [category_id for category_id in by_category if category_id not in categories]
+		if missing:
+			categories.update(Category.objects.in_bulk(missing))
+		series = sorted(
+			(
+				{
+					'key': category_id,
+					'label': categories[category_id].name if category_id in categories else None,
+					'color': categories[category_id].color if category_id in categories else None,
+					'type': movement_type,
+					'values': values,
+				}
+				for category_id, values in by_category.items()
+			),
+			key=lambda item: sum(item['values']),
+			reverse=True,
+		)
+	else:
+		series = [
+			{'key': mtype, 'label': label, 'values': by_type[mtype]}
+			for mtype, label in Movement.MovementType.choices
+		]
+
+	return {
+		'granularity': granularity,
+		'start': start,
+		'end': end,
+		'group_by': group_by,
+		'periods': periods,
+		'series': series,
+		'net': net,
+		'opening_balance': _net(opening),
+		'balance': running,
+	}
+
+
+def movement_time_series(user, granularity, start, end, group_by='type', movement_type=None):
+	"""Serie temporal de movimientos con saldo acumulado, con las consultas en paralelo."""
+	periods = time_series_periods(start, end, granularity)  # valida el número de períodos antes de consultar
+	results = run_concurrently(time_series_queries(user, granularity, start, end))
+	return build_time_series(user, results, periods, granularity, start, end, group_by, movement_type)
@@ -0,0 +1,171 @@
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils.dateparse import parse_date
+
+from .models import DailyRollup, Movement, MonthlyRollup
+from .stats import StatDeltas
+
+
+ROLLUP_BATCH_SIZE = 1000
+
+
+def _as_date(value):
+	return parse_date(value) if isinstance(value, str) else value
+
+
+def _apply_rollup_delta(model, lookup, amount, count):
+	updated = model.objects.filter(**lookup).update(
+		total=F('total') + amount,
+		count=F('count') + count,
+	)
+	if updated or count < 0:
+		return
+	try:
+		with transaction.atomic():
+			model.objects.create(total=amount, count=count, **lookup)
+	except IntegrityError:
+		# Otra petición creó la fila entre el UPDATE y el INSERT.
+		model.objects.filter(**lookup).update(
+			total=F('total') + amount,
+			count=F('count') + count,
+		)
+
+
+def apply_movement_delta(user_id, category_id, movement_type, currency, day, amount, count):
+	"""
+	Suma `amount` y `count` a las filas del rollup mensual y diario que
+	corresponden al movimiento.
+
+	Las restas (ediciones y borrados) nunca crean filas: si la fila ya no existe,
+	por ejemplo porque el usuario se está eliminando en cascada, no hay nada que
+	descontar.
+	"""
+	day = _as_date(day)
+	amount = Decimal(str(amount))
+	lookup = {
+		'user_id': user_id,
+		'category_id': category_id,
+		'type': movement_type,
+		'currency': currency,
+	}
+	_apply_rollup_delta(MonthlyRollup, {'month': day.replace(day=1), **lookup}, amount, count)
+	_apply_rollup_delta(DailyRollup, {'day': day, **lookup}, amount, count)
+
+
+class RollupDeltas:
+	"""
+	Acumula los cambios de varias escrituras en bloque para aplicar un solo
+	UPDATE por fila de los rollups y por contador del sistema, en vez de
+	uno por movimiento.
+	"""
+
+	def __init__(self):
+		self._deltas = defaultdict(lambda: [Decimal('0'), 0])
+		self.stats = StatDeltas()
+
+	def add(self, user_id, category_id, movement_type, currency, day, amount, count):
+		day = _as_date(day)
+		key = (user_id, category_id, movement_type, currency, day)
+		delta = self._deltas[key]
+		delta[0] += Decimal(str(amount))
+		delta[1] += count
+		self.stats.add_movement(user_id, category_id, movement_type, currency, day, amount, count)
+
+	def apply(self):
+		monthly = defaultdict(lambda: [Decimal('0'), 0])
+		for (user_id, category_id, movement_type, currency, day), (amount, count) in self._deltas.items():
+			if amount or count:
+				lookup = {'user_id': user_id, 'category_id': category_id, 'type': movement_type, 'currency': currency}
+				_apply_rollup_delta(DailyRollup, {'day': day, **lookup}, amount, count)
+				delta = monthly[(user_id, category_id, movement_type, currency, day.replace(day=1))]
+				delta[0] += amount
+				delta[1] += count
+		for (user_id, category_id, movement_type, currency, month), (amount, count) in monthly.items():
+			if amount or count:
+				lookup = {'user_id': user_id, 'category_id': category_id, 'type': movement_type, 'currency': currency}
+				_apply_rollup_delta(MonthlyRollup, {'month': month, **lookup}, amount, count)
+		self._deltas.clear()
+		self.stats.apply()
+
+
+# Tabla de rollup → (campo del período, truncado de la fecha del movimiento).
+ROLLUP_PERIODS = {
+	MonthlyRollup: ('month', TruncMonth('date')),
+	DailyRollup: ('day', F('date')),
+}
+
+
+def _aggregated_movements(model, user_ids=None):
+	period_field, period = ROLLUP_PERIODS[model]
+	qs = Movement.objects.all()
+	if user_ids is not None:
+		qs = qs.filter(user_id__in=user_ids)
+	return (
+		qs.annotate(**{period_field: period})
+		.values('user_id', period_field, 'category_id', 'type', 'currency')
+		.annotate(total=Sum('amount'), count=Count('id'))
+		.order_by()
+	)
+
+
+def _rollup_key(period_field, row):
+	return (row['user_id'], row[period_field], row['category_id'], row['type'], row['currency'])
+
+
+def _rebuild(model, user_ids):
+	existing = model.objects.all()
+	if user_ids is not None:
+		existing = existing.filter(user_id__in=user_ids)
+	existing.delete()
+
+	created = 0
+	rows = (model(**row) for row in _aggregated_movements(model, user_ids).iterator())
+	while True:
+		batch = list(islice(rows, ROLLUP_BATCH_SIZE))
+		if not batch:
+			return created
+		model.objects.bulk_create(batch)
+		created += len(batch)
+
+
+@transaction.atomic
+def rebuild_monthly_rollups(user_ids=None):
+	"""Reconstruye el rollup mensual desde la tabla de movimientos. Devuelve las filas creadas."""
+	return _rebuild(MonthlyRollup, user_ids)
+
+
+@transaction.atomic
+def rebuild_rollups(user_ids=None):
+	"""Reconstruye los rollups mensual y diario. Devuelve las filas creadas en cada uno."""
+	return {model: _rebuild(model, user_ids) for model in ROLLUP_PERIODS}
+
+
+def diff_rollups(model, user_ids=None):
+	"""
+	Compara el rollup con los movimientos y devuelve las diferencias como
+	tuplas (clave, esperado, guardado), donde cada valor es (total, count).
+	"""
+	period_field, _ = ROLLUP_PERIODS[model]
+	expected = {
+		_rollup_key(period_field, row): (row['total'], row['count'])
+		for row in _aggregated_movements(model, user_ids).iterator()
+	}
+	stored_qs = model.objects.exclude(count=0, total=0)
+	if user_ids is not None:
+		stored_qs = stored_qs.filter(user_id__in=user_ids)
+	stored = {
+		_rollup_key(period_field, row): (row['total'], row['count'])
+		for row in stored_qs.values('user_id', period_field, 'category_id', 'type', 'currency', 'total', 'count').iterator()
+	}
+
+	zero = (Decimal('0'), 0)
+	return [
+		(key, expected.get(key, zero), stored.get(key, zero))
+		for key in sorted(expected.keys() | stored.keys())
+		if expected.get(key, zero) != stored.get(key, zero)
+	]
@@ -0,0 +1,114 @@
+import inspect
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA_ALIAS = 'replica'
+
+_analytics_reads = ContextVar('analytics_reads', default=False)
+
+
+def replica_configured():
+	return REPLICA_ALIAS in connections.settings
+
+
+def _pin_key(user_id):
+	return f'replica-pin:user:{user_id}'
+
+
+def pin_user_to_primary(user_id):
+	"""
+	Tras una escritura confirmada del usuario, sus lecturas analíticas van a la
+	base principal durante REPLICA_LAG_WINDOW segundos, mientras la réplica se
+	pone al día. Así el usuario ve enseguida sus propios movimientos.
+	"""
+	if replica_configured() and settings.REPLICA_LAG_WINDOW > 0:
+		cache.set(_pin_key(user_id), True, settings.REPLICA_LAG_WINDOW)
+
+
+def _pin_keys(user_ids):
+	return [_pin_key(user_id) for user_id in user_ids if user_id is not None]
+
+
+def use_replica_for(*user_ids):
+	"""Indica si las lecturas sobre esos usuarios pueden ir a la réplica."""
+	if not replica_configured():
+		return False
+	keys = _pin_keys(user_ids)
+	return not (keys and cache.get_many(keys))
+
+
+async def ause_replica_for(*user_ids):
+	if not replica_configured():
+		return False
+	keys = _pin_keys(user_ids)
+	return not (keys and await cache.aget_many(keys))
+
+
+@contextmanager
+def replica_reads(enabled=True):
+	"""Dentro del bloque, las lecturas del ORM van a la réplica si está configurada."""
+	token = _analytics_reads.set(enabled)
+	try:
+		yield
+	finally:
+		_analytics_reads.reset(token)
+
+
+def analytics_reads(method=None, *, user_kwarg=None):
+	"""
+	Marca un método de vista (síncrono o async) como lectura analítica: sus
+	consultas se envían a la réplica, salvo que el usuario autenticado (o el
+	indicado por `user_kwarg` en la URL) haya escrito hace poco. Las escrituras
+	siguen yendo a 'default'.
+	"""
+	if method is None:
+		return partial(analytics_reads, user_kwarg=user_kwarg)
+
+	def user_ids(request, kwargs):
+		return request.user.pk, kwargs.get(user_kwarg) if user_kwarg else None
+
+	if inspect.iscoroutinefunction(method):
+		@wraps(method)
+		async def async_wrapper(self, request, *args, **kwargs):
+			with replica_reads(await ause_replica_for(*user_ids(request, kwargs))):
+				return await method(self, request, *args, **kwargs)
+		return async_wrapper
+
+	@wraps(method)
+	def wrapper(self, request, *args, **kwargs):
+		with replica_reads(use_replica_for(*user_ids(request, kwargs))):
+			return method(self, request, *args, **kwargs)
+	return wrapper
+
+
+class ReplicaRouter:
+	"""
+	Envía a la réplica las lecturas hechas dentro de `replica_reads()`; todo
+	lo demás (escrituras, migraciones y el resto de lecturas) usa 'default'.
+	Dentro de una transacción se lee de 'default' para ver lo ya escrito en ella.
+	"""
+
+	def db_for_read(self, model, **hints):
+		if (
+			_analytics_reads.get()
+			and replica_configured()
+			and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+		):
+			return REPLICA_ALIAS
+		return None
+
+	def db_for_write(self, model, **hints):
+		return DEFAULT_DB_ALIAS
+
+	def allow_relation(self, obj1, obj2, **hints):
+		# Ambos alias apuntan a los mismos datos.
+		return True
+
+	def allow_migrate(self, db, app_label, model_name=None, **hints):
+		return db != REPLICA_ALIAS
@@ -0,0 +1,142 @@
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .caching import user_cache_version
+from .models import Movement
+
+
+MAX_SEARCH_TERMS = 8
+SEARCH_INDEX_USERS = 64  # índices en memoria que se conservan por proceso
+
+_TOKEN = re.compile(r'\w+')
+
+
+def _fold(text):
+	# Sin tildes ni mayúsculas, como la colación de MySQL: "canción" encuentra "cancion".
+	decomposed = unicodedata.normalize('NFKD', text.lower())
+	return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text):
+	return _TOKEN.findall(_fold(text or ''))
+
+
+def search_terms(query):
+	"""Términos de búsqueda normalizados; cada uno se busca también como prefijo."""
+	return tokenize(query)[:MAX_SEARCH_TERMS]
+
+
+def fulltext_available(queryset):
+	return connections[queryset.db].vendor == 'mysql'
+
+
+def _match(queryset, terms, output_field):
+	"""MATCH ... AGAINST en modo booleano: todos los términos obligatorios (+) y con prefijo (*)."""
+	quote = connections[queryset.db].ops.quote_name
+	column = f'{quote(Movement._meta.db_table)}.{quote("description")}'
+	query = ' '.join(f'+{term}*' for term in terms)
+	return RawSQL(f'MATCH ({column}) AGAINST (%s IN BOOLEAN MODE)', [query], output_field=output_field)
+
+
+class DescriptionIndex:
+	"""
+	Índice invertido en memoria de las descripciones de un usuario: token →
+	{id: apariciones}. Los tokens se guardan ordenados para resolver los
+	prefijos con una búsqueda binaria en vez de recorrer todo el vocabulario.
+	"""
+
+	def __init__(self, rows):
+		self.postings = defaultdict(dict)
+		for movement_id, description in rows:
+			for token in tokenize(description):
+				postings = self.postings[token]
+				postings[movement_id] = postings.get(movement_id, 0) + 1
+		self.tokens = sorted(self.postings)
+
+	def expand(self, term):
+		"""Tokens del índice que empiezan por `term`."""
+		position = bisect_left(self.tokens, term)
+		while position < len(self.tokens) and self.tokens[position].startswith(term):
+			yield self.tokens[position]
+			position += 1
+
+	def search(self, terms):
+		"""`id → puntuación` de los movimientos que contienen todos los términos."""
+		scores = None
+		for term in terms:
+			term_scores = defaultdict(float)
+			for token in self.expand(term):
+				weight = 2.0 if token == term else 1.0  # la palabra exacta pesa más que el prefijo
+				for movement_id, count in self.postings[token].items():
+					term_scores[movement_id] += weight * count
+			if scores is None:
+				scores = term_scores
+			else:
+				scores = {movement_id: score + term_scores[movement_id] for movement_id, score in scores.items() if movement_id in term_scores}
+			if not scores:
+				return {}
+		return dict(scores or {})
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def description_index(user_id):
+	"""
+	Índice del usuario para bases sin FULLTEXT (SQLite en desarrollo y tests).
+	Se reconstruye cuando cambia la versión de sus datos (ver caching).
+	"""
+	version = user_cache_version(user_id)
+	with _indexes_lock:
+		cached = _indexes.get(user_id)
+		if cached and cached[0] == version:
+			_indexes.move_to_end(user_id)
+			return cached[1]
+	index = DescriptionIndex(Movement.objects.filter(user_id=user_id).values_list('id', 'description').iterator())
+	with _indexes_lock:
+		_indexes[user_id] = (version, index)
+		_indexes.move_to_end(user_id)
+		while len(_indexes) > SEARCH_INDEX_USERS:
+			_indexes.popitem(last=False)
+	return index
+
+
+def search_movements(queryset, query, user_id=None):
+	"""
+	Filtra los movimientos cuya descripción contiene todos los términos (o
+	palabras que empiezan por ellos). En MySQL usa el índice FULLTEXT; en otras
+	bases, el índice en memoria del usuario o, sin usuario, LIKE por término.
+	"""
+	terms = search_terms(query)
+	if not terms:
+		return queryset
+	if fulltext_available(queryset):
+		return queryset.filter(_match(queryset, terms, BooleanField()))
+	if user_id is not None:
+		return queryset.filter(id__in=list(description_index(user_id).search(terms)))
+	condition = Q()
+	for term in terms:
+		condition &= Q(description__icontains=term)
+	return queryset.filter(condition)
+
+
+def rank_movements(queryset, query, user_id, limit):
+	"""Los `limit` movimientos más relevantes de `queryset` (ya filtrado con `search_movements`)."""
+	terms = search_terms(query)
+	if not terms:
+		return list(queryset.order_by('-date', '-id')[:limit])
+	if fulltext_available(queryset):
+		ranked = queryset.annotate(search_rank=_match(queryset, terms, FloatField()))
+		return list(ranked.order_by('-search_rank', '-date', '-id')[:limit])
+	scores = description_index(user_id).search(terms)
+	rows = list(queryset)
+	rows.sort(key=lambda movement: (-scores.get(movement.id, 0), -movement.date.toordinal(), -movement.id))
+	return rows[:limit]
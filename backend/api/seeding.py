@@ -0,0 +1,206 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .caching import bump_exchange_rates_version, bump_global_cache_version
+from .models import Budget, Category, ExchangeRate, Movement, Role, User
+from .provisioning import UserBulkCreator, ensure_default_categories
+from .rollups import rebuild_rollups
+from .stats import rebuild_system_stats
+
+
+SEED_USER_PREFIX = 'seed_'
+SEED_ADMIN = 'seed_admin'
+SEED_PASSWORD = 'seed-password-123'  # solo del primer usuario y del admin sembrados
+SEED_BATCH_SIZE = 5000
+
+# Moneda preferida → peso. Una parte pequeña de los movimientos va en otra moneda.
+SEED_CURRENCIES = {'USD': 6, 'EUR': 2, 'COP': 2}
+SEED_RATES = {'EUR': (Decimal('1.08'), Decimal('0.02')), 'COP': (Decimal('0.00025'), Decimal('0.00001'))}
+FOREIGN_SHARE = 0.03
+INCOME_SHARE = 0.15
+
+CUSTOM_CATEGORIES = [
+	('Mascotas', '#f97316'),
+	('Viajes', '#0ea5e9'),
+	('Suscripciones', '#a855f7'),
+	('Regalos', '#ec4899'),
+	('Gimnasio', '#22c55e'),
+]
+EXPENSE_DESCRIPTIONS = [
+	'Supermercado', 'Restaurante', 'Gasolina', 'Taxi', 'Arriendo', 'Luz', 'Agua', 'Internet',
+	'Netflix', 'Spotify', 'Cine', 'Farmacia', 'Consulta médica', 'Matrícula', 'Libros', 'Café',
+	'Panadería', 'Mercado de la semana', 'Peaje', 'Parqueadero', 'Cena con amigos', 'Regalo de cumpleaños',
+]
+INCOME_DESCRIPTIONS = ['Salario', 'Honorarios', 'Venta', 'Reembolso', 'Intereses']
+
+
+def _weighted(rnd, weights):
+	return rnd.choices(list(weights), list(weights.values()))[0]
+
+
+class DatasetSeeder:
+	"""
+	Genera un conjunto de datos sintético y reproducible (usuarios, categorías,
+	movimientos, presupuestos y tasas de cambio) con bulk_create por lotes.
+
+	Los movimientos se generan de forma perezosa, así que la memoria no
+	depende del volumen (de 1k a 10M). Unos pocos usuarios concentran la mayor
+	parte del historial (distribución de Pareto), como en datos reales. Al
+	final se reconstruyen los rollups y los contadores, porque bulk_create no
+	dispara señales.
+	"""
+
+	def __init__(self, movements, users=None, months=36, seed=42, batch_size=SEED_BATCH_SIZE, log=print):
+		self.movements = movements
+		self.users = users or max(1, min(movements // 200, 50_000))
+		self.months = months
+		self.rnd = random.Random(seed)
+		self.batch_size = batch_size
+		self.log = log
+		self.today = timezone.localdate()
+		self.first_day = self.today - timedelta(days=months * 30)
+
+	def run(self):
+		if User.objects.filter(username__startswith=SEED_USER_PREFIX).exists():
+			raise ValueError('Ya hay datos sembrados; usa --reset para reemplazarlos.')
+		ensure_default_categories()
+		started = time.perf_counter()
+		self.create_users()
+		self.create_categories()
+		self.create_exchange_rates()
+		self.create_movements()
+		self.create_budgets()
+		self.log('Reconstruyendo rollups y contadores...')
+		with transaction.atomic():
+			rebuild_rollups()
+			rebuild_system_stats()
+		bump_exchange_rates_version()
+		bump_global_cache_version()
+		self.log(f'Listo en {time.perf_counter() - started:.1f}s.')
+
+	def create_users(self):
+		rows = (
+			(i, {
+				'username': f'{SEED_USER_PREFIX}{i}',
+				'email': f'{SEED_USER_PREFIX}{i}@example.com',
+				'first_name': f'Usuario {i}',
+				'preferred_currency': _weighted(self.rnd, SEED_CURRENCIES),
+			})
+			for i in range(self.users)
+		)
+		UserBulkCreator(batch_size=self.batch_size).run(rows)
+		User.objects.filter(username=f'{SEED_USER_PREFIX}0').update(password=make_password(SEED_PASSWORD))
+		User.objects.create(
+			username=SEED_ADMIN, email=f'{SEED_ADMIN}@example.com',
+			role=Role.objects.get_cached_by_name('admin'), password=make_password(SEED_PASSWORD),
+		)
+
+		# MySQL no devuelve los ids de bulk_create: se leen de nuevo.
+		seeded = User.objects.filter(username__startswith=SEED_USER_PREFIX).exclude(username=SEED_ADMIN)
+		self.user_currency = dict(seeded.values_list('id', 'preferred_currency'))
+		self.user_ids = sorted(self.user_currency)
+		activity = [self.rnd.paretovariate(1.2) for _ in self.user_ids]
+		self.cum_weights = list(accumulate(activity))
+		self.log(f'{len(self.user_ids)} usuarios creados.')
+
+	def create_categories(self):
+		categories = (
+			Category(name=name, color=color, user_id=user_id)
+			for user_id in self.user_ids
+			for name, color in self.rnd.sample(CUSTOM_CATEGORIES, self.rnd.randint(0, 3))
+		)
+		self.bulk_create(Category, categories)
+		global_ids = list(Category.objects.filter(user__isnull=True).values_list('id', flat=True))
+		self.user_categories = {user_id: list(global_ids) for user_id in self.user_ids}
+		for category_id, user_id in Category.objects.filter(user_id__in=self.user_ids).values_list('id', 'user_id').iterator():
+			self.user_categories[user_id].append(category_id)
+
+	def create_exchange_rates(self):
+		rates = []
+		for currency, (rate, spread) in SEED_RATES.items():
+			day = self.first_day
+			while day <= self.today:
+				rates.append(ExchangeRate(currency=currency, date=day, rate=rate + spread * Decimal(self.rnd.uniform(-1, 1))))
+				day += timedelta(days=1)
+		ExchangeRate.objects.bulk_create(rates, batch_size=self.batch_size, ignore_conflicts=True)
+
+	def generate_movements(self):
+		rnd = self.rnd
+		days = (self.today - self.first_day).days
+		currencies = list(SEED_CURRENCIES)
+		for _ in range(self.movements):
+			user_id = rnd.choices(self.user_ids, cum_weights=self.cum_weights)[0]
+			currency = self.user_currency[user_id]
+			if rnd.random() < FOREIGN_SHARE:
+				currency = rnd.choice(currencies)
+			if rnd.random() < INCOME_SHARE:
+				movement_type = Movement.MovementType.INCOME
+				amount = rnd.lognormvariate(7, 0.5)
+				description = rnd.choice(INCOME_DESCRIPTIONS)
+			else:
+				movement_type = Movement.MovementType.EXPENSE
+				amount = rnd.lognormvariate(3.5, 1.0)
+				description = rnd.choice(EXPENSE_DESCRIPTIONS)
+			yield Movement(
+				user_id=user_id,
+				category_id=rnd.choice(self.user_categories[user_id]),
+				amount=Decimal(f'{min(amount, 999_999):.2f}'),
+				currency=currency,
+				type=movement_type,
+				date=self.first_day + timedelta(days=rnd.randint(0, days)),
+				description=description,
+			)
+
+	def create_movements(self):
+		self.bulk_create(Movement, self.generate_movements(), progress=True)
+
+	def create_budgets(self):
+		months = sorted({(self.today - timedelta(days=30 * i)).strftime('%Y-%m') for i in range(min(self.months, 12))})
+		budgets = (
+			Budget(user_id=user_id, category_id=category_id, month=month, max_amount=Decimal(self.rnd.randint(50, 2000)))
+			for user_id in self.user_ids
+			for category_id in self.rnd.sample(self.user_categories[user_id], min(3, len(self.user_categories[user_id])))
+			for month in months
+		)
+		self.bulk_create(Budget, budgets)
+
+	def bulk_create(self, model, objects, progress=False):
+		created = 0
+		started = time.perf_counter()
+		while True:
+			batch = list(islice(objects, self.batch_size))
+			if not batch:
+				break
+			model.objects.bulk_create(batch)
+			created += len(batch)
+			if progress and created % (self.batch_size * 20) < self.batch_size:
+				rate = created / (time.perf_counter() - started)
+				self.log(f'{model.__name__}: {created} filas ({rate:.0f}/s)')
+		self.log(f'{model.__name__}: {created} filas creadas.')
+		return created
+
+
+def delete_seeded_data(log=print):
+	"""
+	Borra los usuarios sembrados y sus datos. Los movimientos se borran con SQL
+	directo para no disparar las señales fila por fila; después se reconstruyen
+	los contadores del sistema.
+	"""
+	seeded = User.objects.filter(username__startswith=SEED_USER_PREFIX)
+	user_ids = list(seeded.values_list('id', flat=True))
+	for start in range(0, len(user_ids), 1000):
+		chunk = user_ids[start:start + 1000]
+		placeholders = ', '.join(['%s'] * len(chunk))
+		with connection.cursor() as cursor:
+			cursor.execute(f'DELETE FROM {Movement._meta.db_table} WHERE user_id IN ({placeholders})', chunk)
+	seeded.delete()
+	rebuild_system_stats()
+	bump_global_cache_version()
+	log(f'{len(user_ids)} usuarios sembrados eliminados.')
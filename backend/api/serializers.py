@@ -1,8 +1,18 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
-from rest_framework import serializers
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 
+from .authentication import add_user_claims
+from .categories import visible_category_map
+from .currency import currency_allowed, normalize_currency
+from .instrumentation import timed_serialization
 from .models import Budget, Category, Movement, Role
+from .provisioning import ensure_default_categories
 
 
 User = get_user_model()
@@ -15,8 +25,33 @@ class RoleSerializer(serializers.ModelSerializer):
 		read_only_fields = ['id', 'created_at']
 
 
+class VisibleCategoryField(serializers.PrimaryKeyRelatedField):
+	"""Categoría por id, validada contra las categorías visibles del usuario (en caché)."""
+
+	def __init__(self, **kwargs):
+		kwargs.setdefault('queryset', Category.objects.all())
+		super().__init__(**kwargs)
+
+	def to_internal_value(self, data):
+		try:
+			category_id = int(data)
+		except (TypeError, ValueError):
+			self.fail('incorrect_type', data_type=type(data).__name__)
+		category = visible_category_map(self.context['request'].user.pk).get(category_id)
+		if category is None:
+			raise serializers.ValidationError('No puedes usar esta categoría.')
+		return category
+
+
+def validate_movement_currency(value, preferred_currency):
+	currency = normalize_currency(value)
+	if not currency_allowed(currency, preferred_currency):
+		raise serializers.ValidationError('No hay tasas de cambio cargadas para esta moneda.')
+	return currency
+
+
 class UserSerializer(serializers.ModelSerializer):
-	role_name = serializers.CharField(source='role.get_name_display', read_only=True)
+	role_name = serializers.CharField(source='cached_role.get_name_display', read_only=True)
 	is_admin = serializers.BooleanField(read_only=True)
 
 	class Meta:
@@ -41,6 +76,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         user = User(**validated_data)
         user.set_password(password)
         user.save()
+        ensure_default_categories()
         return user
 
 
@@ -56,34 +92,141 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
 class MovementSerializer(serializers.ModelSerializer):
+    """Con `fields` (lista de nombres) solo se representan esos campos."""
+    category = VisibleCategoryField()
     category_name = serializers.CharField(source='category.name', read_only=True)
     category_color = serializers.CharField(source='category.color', read_only=True)
 
     class Meta:
         model = Movement
         fields = [
-            'id', 'amount', 'type', 'date', 'description', 'category', 'category_name', 'category_color',
+            'id', 'amount', 'currency', 'type', 'date', 'description', 'category', 'category_name', 'category_color',
             'created_at', 'updated_at',
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'category_name', 'category_color']
+        extra_kwargs = {'currency': {'required': False}}
 
-    def validate_category(self, category):
-        user = self.context['request'].user
-        if category.user not in (None, user):
-            raise serializers.ValidationError('No puedes usar esta categoría.')
-        return category
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def validate_currency(self, value):
+        return validate_movement_currency(value, self.context['request'].user.preferred_currency)
 
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
+        # Sin moneda explícita, el movimiento va en la moneda preferida del usuario.
+        validated_data.setdefault('currency', validated_data['user'].preferred_currency)
         return super().create(validated_data)
 
     def update(self, instance, validated_data):
-        # Ensure user cannot change owner
-        validated_data['user'] = instance.user
+        # El dueño no cambia; se descarta sin cargar instance.user (una consulta más).
+        validated_data.pop('user', None)
         return super().update(instance, validated_data)
 
 
+# Campo de MovementSerializer → columna de `.values()` para la ruta rápida de lectura.
+MOVEMENT_VALUE_COLUMNS = {
+    'id': 'id',
+    'amount': 'amount',
+    'currency': 'currency',
+    'type': 'type',
+    'date': 'date',
+    'description': 'description',
+    'category': 'category_id',
+    'category_name': 'category__name',
+    'category_color': 'category__color',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+
+def parse_movement_fields(params):
+    """Campos pedidos con `?fields=id,amount,date`, o None si se piden todos."""
+    names = [name.strip() for name in params.get('fields', '').split(',') if name.strip()]
+    if not names:
+        return None
+    unknown = [name for name in names if name not in MOVEMENT_VALUE_COLUMNS]
+    if unknown:
+        raise serializers.ValidationError({'fields': f'Campos desconocidos: {", ".join(unknown)}.'})
+    return list(dict.fromkeys(names))
+
+
+def _datetime_representation(field):
+    """
+    `DateTimeField.to_representation` con la zona horaria resuelta una vez y no
+    en cada fila (consultarla pasa por un contextvar). Otros formatos o valores
+    sin zona siguen por el camino de DRF.
+    """
+    output_format = getattr(field, 'format', drf_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if field_timezone is None or not isinstance(output_format, str) or output_format.lower() != ISO_8601:
+        return field.to_representation
+
+    def to_representation(value):
+        if timezone.is_naive(value):
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return to_representation
+
+
+class MovementValuesSerializer:
+    """
+    Ruta rápida de lectura de MovementSerializer: arma cada fila a partir de
+    las tuplas de `.values_list()` en lugar de instanciar modelos y recorrer
+    los campos de DRF. Solo se convierten los valores que DRF no entrega tal
+    cual (importe, fechas), con los mismos campos del serializador, así que
+    la salida es idéntica.
+    """
+
+    converted_fields = (serializers.DecimalField, serializers.DateField, serializers.DateTimeField)
+
+    def __init__(self, fields=None):
+        self.fields = fields or list(MOVEMENT_VALUE_COLUMNS)
+        self.columns = [MOVEMENT_VALUE_COLUMNS[name] for name in self.fields]
+        declared = MovementSerializer(fields=self.fields).fields
+        self.converters = [self.converter(declared[name]) for name in self.fields]
+
+    def converter(self, field):
+        if isinstance(field, serializers.DateTimeField):
+            return _datetime_representation(field)
+        return field.to_representation if isinstance(field, self.converted_fields) else None
+
+    def to_representation(self, row):
+        return {
+            name: value if convert is None or value is None else convert(value)
+            for name, convert, value in zip(self.fields, self.converters, row)
+        }
+
+    @timed_serialization
+    def many(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
+class MovementBulkItemSerializer(serializers.Serializer):
+    """Fila de /movements/bulk/. La categoría es un id plano: su propiedad se valida en bloque."""
+    id = serializers.IntegerField(required=False)
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    currency = serializers.CharField(max_length=10, required=False)
+    type = serializers.ChoiceField(choices=Movement.MovementType.choices)
+    date = serializers.DateField()
+    description = serializers.CharField(required=False, allow_blank=True)
+    category = serializers.IntegerField()
+
+    def validate_category(self, category_id):
+        if category_id not in self.context['allowed_category_ids']:
+            raise serializers.ValidationError('No puedes usar esta categoría.')
+        return category_id
+
+    def validate_currency(self, value):
+        return validate_movement_currency(value, self.context['preferred_currency'])
+
+
 class BudgetSerializer(serializers.ModelSerializer):
+    category = VisibleCategoryField()
     category_name = serializers.CharField(source='category.name', read_only=True)
 
     class Meta:
@@ -91,12 +234,42 @@ class BudgetSerializer(serializers.ModelSerializer):
         fields = ['id', 'month', 'max_amount', 'category', 'category_name', 'created_at']
         read_only_fields = ['id', 'created_at', 'category_name']
 
-    def validate_category(self, category):
-        user = self.context['request'].user
-        if category.user not in (None, user):
-            raise serializers.ValidationError('No puedes usar esta categoría.')
-        return category
-
     def create(self, validated_data):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Incluye en el token el rol y la moneda del usuario (ver StatelessReadJWTAuthentication)."""
+
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Al refrescar vuelve a leer los claims del usuario, por si cambiaron desde el
+    login. simplejwt ya carga el usuario en `validate` pero no lo expone, así
+    que se reescribe para leerlo una sola vez y firmar el acceso con él. La
+    rotación replica la de simplejwt 5.5 (`outstand()`), la versión mínima
+    de requirements.txt.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first() if user_id else None
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        data = {'access': str(add_user_claims(refresh.access_token, user))}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION and hasattr(refresh, 'blacklist'):
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+        return data
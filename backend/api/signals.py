@@ -1,37 +1,210 @@
-from django.db.models.signals import post_save
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
 from django.dispatch import receiver
 
-from .models import Category, Role, User
+from .authentication import revoke_user_tokens
+from .caching import bump_categories_version, bump_exchange_rates_version, bump_global_cache_version, bump_user_cache_version
+from .models import Budget, Category, ExchangeRate, Movement, Role, SystemStat, User
+from .provisioning import ensure_default_categories
+from .rollups import apply_movement_delta
+from .routers import pin_user_to_primary
+from .stats import CATEGORY, ROLE, USER, increment_stat, movement_stat_deltas
+
+_bulk_movement_writes = ContextVar('bulk_movement_writes', default=False)
+
+
+@contextmanager
+def bulk_movement_writes():
+    """
+    Desactiva los receptores por fila de Movement. Quien escribe en bloque
+    actualiza el rollup y la caché una sola vez al final.
+    """
+    token = _bulk_movement_writes.set(True)
+    try:
+        yield
+    finally:
+        _bulk_movement_writes.reset(token)
+
+
+# Campos copiados como claims en los tokens JWT (ver authentication.py).
+TOKEN_CLAIM_FIELDS = ('role_id', 'preferred_currency', 'is_active', 'password')
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_user_values(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Guarda el rol anterior (para el conteo de usuarios por rol) y los valores
+    que viajan en los tokens (para revocarlos si cambian).
+    """
+    instance._previous_values = None
+    fields = [
+        field for field in TOKEN_CLAIM_FIELDS
+        if update_fields is None or User._meta.get_field(field).name in update_fields
+    ]
+    if instance.pk and not raw and fields:
+        instance._previous_values = User.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+@receiver(post_save, sender=User)
+def update_role_stats_on_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Mantiene el contador de usuarios por rol."""
+    if raw:
+        return
+    if created:
+        increment_stat(ROLE, instance.role_id, 1)
+    elif update_fields is None or 'role' in update_fields:
+        previous = (getattr(instance, '_previous_values', None) or {}).get('role_id')
+        if previous != instance.role_id:
+            increment_stat(ROLE, previous, -1)
+            increment_stat(ROLE, instance.role_id, 1)
+
+
+@receiver(post_delete, sender=User)
+def update_role_stats_on_delete(sender, instance, **kwargs):
+    """Descuenta al usuario eliminado y borra su contador de movimientos."""
+    increment_stat(ROLE, instance.role_id, -1)
+    SystemStat.objects.filter(scope=USER, key=str(instance.pk)).delete()
+
 
-DEFAULT_CATEGORIES = [
-    ("Alimentación", "#f59e0b"),
-    ("Transporte", "#3b82f6"),
-    ("Vivienda", "#10b981"),
-    ("Entretenimiento", "#8b5cf6"),
-    ("Salud", "#ef4444"),
-    ("Educación", "#6366f1"),
-]
+@receiver(post_save, sender=User)
+def revoke_tokens_on_claim_change(sender, instance, created, raw=False, **kwargs):
+    """
+    Revoca los tokens del usuario si cambió algún dato que viaja en ellos.
+    `_tokens_revoked` le indica a quien guardó (p. ej. ProfileView) que debe
+    entregar tokens nuevos.
+    """
+    instance._tokens_revoked = False
+    previous = getattr(instance, '_previous_values', None)
+    if created or raw or not previous:
+        return
+    if any(previous[field] != getattr(instance, field) for field in previous):
+        revoke_user_tokens(instance.pk)
+        instance._tokens_revoked = True
 
 
 @receiver(post_save, sender=User)
-def assign_user_role_and_create_default_categories(sender, instance, created, **kwargs):
-    """Asigna rol de usuario regular y crea categorías por defecto."""
-    if not created:
+def invalidate_user_cache_on_change(sender, instance, created, raw=False, **kwargs):
+    """
+    Invalida las respuestas cacheadas del usuario al editarlo: el dashboard
+    incluye su perfil y los reportes se expresan en su moneda preferida.
+    """
+    if not created and not raw:
+        transaction.on_commit(partial(bump_user_cache_version, instance.pk))
+
+
+@receiver(post_delete, sender=User)
+def revoke_tokens_on_delete(sender, instance, **kwargs):
+    revoke_user_tokens(instance.pk)
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def clear_role_registry(sender, **kwargs):
+    """Vacía el registro de roles en memoria de este proceso."""
+    Role.objects.clear_registry()
+
+
+@receiver(post_delete, sender=Category)
+def delete_category_stats(sender, instance, **kwargs):
+    """Borra el contador de gastos de la categoría eliminada."""
+    SystemStat.objects.filter(scope=CATEGORY, key=str(instance.pk)).delete()
+
+
+@receiver(post_migrate)
+def create_default_categories(sender, **kwargs):
+    """Crea las categorías globales por defecto después de cada migrate."""
+    if sender.name == 'api':
+        ensure_default_categories(force=True)
+
+
+@receiver(pre_save, sender=Movement)
+def remember_previous_movement(sender, instance, raw=False, **kwargs):
+    """Guarda los valores anteriores del movimiento para corregir el rollup al editar."""
+    instance._rollup_previous = None
+    if instance.pk and not raw and not _bulk_movement_writes.get():
+        instance._rollup_previous = (
+            Movement.objects.filter(pk=instance.pk)
+            .values('user_id', 'category_id', 'type', 'currency', 'date', 'amount')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Movement)
+def update_monthly_rollup_on_save(sender, instance, created, raw=False, **kwargs):
+    """Mantiene el rollup mensual y los contadores del sistema al crear o editar un movimiento."""
+    if raw or _bulk_movement_writes.get():
         return
-    
-    # Asignar rol de usuario regular si no tiene uno
-    if not instance.role_id:
-        try:
-            user_role = Role.objects.get(name='user')
-            instance.role = user_role
-            instance.save(update_fields=['role'])
-        except Role.DoesNotExist:
-            pass
-    
-    # Crear categorías por defecto
-    for name, color in DEFAULT_CATEGORIES:
-        Category.objects.get_or_create(
-            name=name,
-            user=None,
-            defaults={"color": color, "is_default": True},
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        apply_movement_delta(
+            previous['user_id'], previous['category_id'], previous['type'], previous['currency'],
+            previous['date'], -previous['amount'], -1,
         )
+        for delta in movement_stat_deltas(
+            previous['user_id'], previous['category_id'], previous['type'], previous['currency'],
+            previous['date'], -previous['amount'], -1,
+        ):
+            increment_stat(*delta)
+    apply_movement_delta(
+        instance.user_id, instance.category_id, instance.type, instance.currency,
+        instance.date, instance.amount, 1,
+    )
+    for delta in movement_stat_deltas(
+        instance.user_id, instance.category_id, instance.type, instance.currency,
+        instance.date, instance.amount, 1,
+    ):
+        increment_stat(*delta)
+
+
+@receiver(post_delete, sender=Movement)
+def update_monthly_rollup_on_delete(sender, instance, **kwargs):
+    """Descuenta del rollup mensual y de los contadores el movimiento eliminado."""
+    if _bulk_movement_writes.get():
+        return
+    amount = -Decimal(str(instance.amount))
+    apply_movement_delta(
+        instance.user_id, instance.category_id, instance.type, instance.currency,
+        instance.date, amount, -1,
+    )
+    for delta in movement_stat_deltas(
+        instance.user_id, instance.category_id, instance.type, instance.currency,
+        instance.date, amount, -1,
+    ):
+        increment_stat(*delta)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_visible_categories(sender, instance, **kwargs):
+    """Invalida las categorías visibles en caché del dueño (o de todos, si es global)."""
+    transaction.on_commit(partial(bump_categories_version, instance.user_id))
+
+
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def invalidate_exchange_rates(sender, **kwargs):
+    """Invalida las tasas en caché al editarlas una a una (p. ej. desde el admin)."""
+    transaction.on_commit(bump_exchange_rates_version)
+
+
+@receiver(post_save, sender=Movement)
+@receiver(post_delete, sender=Movement)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+def invalidate_user_response_cache(sender, instance, **kwargs):
+    """Invalida las respuestas cacheadas del dueño del registro modificado."""
+    if sender is Movement and _bulk_movement_writes.get():
+        return
+    # Tras el commit, para que ninguna petición concurrente cachee datos aún no confirmados.
+    if instance.user_id is None:
+        transaction.on_commit(bump_global_cache_version)
+    else:
+        transaction.on_commit(partial(bump_user_cache_version, instance.user_id))
+        transaction.on_commit(partial(pin_user_to_primary, instance.user_id))
@@ -0,0 +1,164 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Round
+
+from .currency import converted, to_base_currency
+from .models import Category, Movement, Role, SystemStat
+
+
+User = get_user_model()
+
+ROLE = 'role'
+MOVEMENT_TYPE = 'movement_type'
+USER = 'user'
+CATEGORY = 'category'
+
+
+def _key(value):
+	return '' if value is None else str(value)
+
+
+def increment_stat(scope, key, count=0, total=0):
+	"""
+	Suma `count` y `total` al contador `(scope, key)`. Igual que en el rollup
+	mensual, los decrementos nunca crean filas.
+	"""
+	lookup = {'scope': scope, 'key': _key(key)}
+	total = Decimal(str(total))
+	updated = SystemStat.objects.filter(**lookup).update(count=F('count') + count, total=F('total') + total)
+	if updated or count < 0 or total < 0:
+		return
+	try:
+		with transaction.atomic():
+			SystemStat.objects.create(count=count, total=total, **lookup)
+	except IntegrityError:
+		SystemStat.objects.filter(**lookup).update(count=F('count') + count, total=F('total') + total)
+
+
+def movement_stat_deltas(user_id, category_id, movement_type, currency, day, amount, count):
+	"""Contadores afectados por sumar (o restar) un movimiento; los totales van en la moneda base."""
+	amount = to_base_currency(amount, currency, day)
+	yield MOVEMENT_TYPE, movement_type, count, amount
+	yield USER, user_id, count, 0
+	if movement_type == Movement.MovementType.EXPENSE:
+		yield CATEGORY, category_id, count, amount
+
+
+class StatDeltas:
+	"""Acumula cambios de contadores para aplicarlos con un UPDATE por contador."""
+
+	def __init__(self):
+		self._deltas = defaultdict(lambda: [0, Decimal('0')])
+
+	def add(self, scope, key, count, total):
+		delta = self._deltas[(scope, _key(key))]
+		delta[0] += count
+		delta[1] += Decimal(str(total))
+
+	def add_movement(self, user_id, category_id, movement_type, currency, day, amount, count):
+		for delta in movement_stat_deltas(user_id, category_id, movement_type, currency, day, amount, count):
+			self.add(*delta)
+
+	def apply(self):
+		for (scope, key), (count, total) in self._deltas.items():
+			if count or total:
+				increment_stat(scope, key, count, total)
+		self._deltas.clear()
+
+
+def compute_system_stats():
+	"""Calcula todos los contadores desde las tablas de origen."""
+	# Redondeado por movimiento, igual que al mantener los contadores en cada escritura.
+	base_total = Sum(Round(converted('amount', 'currency', 'date', settings.BASE_CURRENCY), 2))
+	stats = {}
+	for role_id, count in User.objects.values_list('role_id').annotate(Count('id')).order_by():
+		stats[(ROLE, _key(role_id))] = (count, Decimal('0'))
+	for movement_type, count, total in Movement.objects.values_list('type').annotate(Count('id'), total=base_total).order_by():
+		stats[(MOVEMENT_TYPE, movement_type)] = (count, total)
+	for user_id, count in Movement.objects.values_list('user_id').annotate(Count('id')).order_by():
+		stats[(USER, _key(user_id))] = (count, Decimal('0'))
+	expenses = Movement.objects.filter(type=Movement.MovementType.EXPENSE)
+	for category_id, count, total in expenses.values_list('category_id').annotate(Count('id'), total=base_total).order_by():
+		stats[(CATEGORY, _key(category_id))] = (count, total)
+	return stats
+
+
+@transaction.atomic
+def rebuild_system_stats():
+	"""Reemplaza los contadores por los valores calculados. Devuelve las filas creadas."""
+	stats = compute_system_stats()
+	SystemStat.objects.all().delete()
+	SystemStat.objects.bulk_create(
+		[SystemStat(scope=scope, key=key, count=count, total=total) for (scope, key), (count, total) in stats.items()],
+		batch_size=1000,
+	)
+	return len(stats)
+
+
+def diff_system_stats():
+	"""Devuelve `(clave, esperado, guardado)` para cada contador que no coincide."""
+	expected = compute_system_stats()
+	stored = {
+		(scope, key): (count, total)
+		for scope, key, count, total in SystemStat.objects.exclude(count=0, total=0).values_list('scope', 'key', 'count', 'total')
+	}
+	zero = (0, Decimal('0'))
+	return [
+		(key, expected.get(key, zero), stored.get(key, zero))
+		for key in sorted(expected.keys() | stored.keys())
+		if expected.get(key, zero) != stored.get(key, zero)
+	]
+
+
+def dashboard_stats(top=10):
+	"""Estadísticas del dashboard de administración leídas de los contadores."""
+	counters = {
+		(scope, key): (count, total)
+		for scope, key, count, total in SystemStat.objects.filter(scope__in=[ROLE, MOVEMENT_TYPE])
+		.values_list('scope', 'key', 'count', 'total')
+	}
+	role_names = {str(role.id): role.name for role in Role.objects.registry().values()}
+	users_by_role = defaultdict(int)
+	for (scope, key), (count, _) in counters.items():
+		if scope == ROLE:
+			users_by_role[role_names.get(key)] += count
+
+	income_count, total_income = counters.get((MOVEMENT_TYPE, Movement.MovementType.INCOME), (0, Decimal('0')))
+	expense_count, total_expense = counters.get((MOVEMENT_TYPE, Movement.MovementType.EXPENSE), (0, Decimal('0')))
+
+	top_user_counts = list(
+		SystemStat.objects.filter(scope=USER, count__gt=0).order_by('-count', 'key').values_list('key', 'count')[:top]
+	)
+	users = User.objects.in_bulk([int(key) for key, _ in top_user_counts])
+	top_users = [
+		{'id': user.id, 'username': user.username, 'email': user.email, 'movement_count': count}
+		for user, count in ((users.get(int(key)), count) for key, count in top_user_counts)
+		if user is not None
+	]
+
+	top_category_totals = list(
+		SystemStat.objects.filter(scope=CATEGORY, total__gt=0).order_by('-total', 'key').values_list('key', 'total')[:top]
+	)
+	categories = Category.objects.in_bulk([int(key) for key, _ in top_category_totals])
+	top_categories = [
+		{'category__name': category.name, 'category__color': category.color, 'total': total}
+		for category, total in ((categories.get(int(key)), total) for key, total in top_category_totals)
+		if category is not None
+	]
+
+	return {
+		'total_users': sum(users_by_role.values()),
+		'admin_users': users_by_role['admin'],
+		'regular_users': users_by_role['user'],
+		'total_movements': income_count + expense_count,
+		'total_income': float(total_income),
+		'total_expense': float(total_expense),
+		'total_balance': float(total_income - total_expense),
+		'top_users': top_users,
+		'top_categories': top_categories,
+	}
@@ -1,3 +1,1062 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import re
+import threading
+import time
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .async_views import AsyncAdminUserDetailView, AsyncReportsSummaryView
+from .authentication import CURRENCY_CLAIM, add_user_claims
+from .benchmarks import EndpointBenchmark, benchmark_fixtures, endpoint_cases, uncovered_url_names
+from .concurrency import arun_concurrently, run_concurrently
+from .currency import known_currencies
+from .exports import parquet_available
+from .imports import MovementImporter, iter_csv_rows, iter_ofx_rows
+from .instrumentation import QueryBudgetExceeded, query_budget_for, reset_metrics
+from .models import Budget, Category, DailyRollup, ExchangeRate, Movement, MonthlyRollup, Role, User
+from .provisioning import UserBulkCreator
+from .reports import bucket_start, split_report_range
+from .rollups import diff_rollups
+from .routers import REPLICA_ALIAS
+from .seeding import SEED_ADMIN, SEED_PASSWORD, DatasetSeeder
+from .serializers import MovementValuesSerializer
+from .stats import dashboard_stats, diff_system_stats
+from .views import AdminUsersView, CategoryViewSet, MovementViewSet
+
+
+@override_settings(QUERY_BUDGETS='raise')
+class APITestCase(TestCase):
+	"""
+	Base con los roles del sistema y helpers para crear datos de prueba. Las
+	peticiones fallan si superan el `query_budget` de su vista.
+	"""
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.admin_role, _ = Role.objects.get_or_create(name='admin', defaults={'description': 'Administrador'})
+		cls.user_role, _ = Role.objects.get_or_create(name='user', defaults={'description': 'Usuario'})
+
+	def setUp(self):
+		# La caché no se revierte con la transacción de cada test y los ids se reutilizan.
+		cache.clear()
+
+	def create_user(self, username, role=None, **extra):
+		user = User.objects.create_user(username=username, email=f'{username}@example.com', password=None, **extra)
+		if role is not None:
+			user.role = role
+			user.save(update_fields=['role'])
+		return user
+
+	def create_movements(self, user, category, amounts, movement_type='EXPENSE', day=date(2024, 1, 15)):
+		for amount in amounts:
+			Movement.objects.create(user=user, category=category, amount=amount, type=movement_type, date=day)
+
+	def client_for(self, user):
+		client = APIClient()
+		client.force_authenticate(user)
+		return client
+
+	def assertAggregatesConsistent(self):
+		"""Los rollups y los contadores del sistema cuadran con la tabla de movimientos."""
+		self.assertEqual(diff_rollups(MonthlyRollup), [])
+		self.assertEqual(diff_rollups(DailyRollup), [])
+		self.assertEqual(diff_system_stats(), [])
+
+	def assertRoutesWithinQueryBudgets(self, fixtures):
+		"""Ejecuta los casos de todas las rutas de api/urls.py (ver api.benchmarks) contra sus presupuestos."""
+		cases = endpoint_cases(fixtures)
+		self.assertEqual(uncovered_url_names(cases), [])
+		benchmark = EndpointBenchmark(fixtures, password=SEED_PASSWORD)
+		for case in cases:
+			with self.subTest(case.name):
+				self.assertIsNotNone(query_budget_for(resolve(case.url()).func, case.method), 'La vista no declara query_budget.')
+				response, _, _ = benchmark.send(case)  # QueryBudgetExceeded si se pasa
+				self.assertLess(response.status_code, 400)
+
+
+class AdminUsersViewTests(APITestCase):
+	def setUp(self):
+		super().setUp()
+		self.admin = self.create_user('admin', role=self.admin_role)
+		self.category = Category.objects.filter(user__isnull=True).first()
+		self.client = self.client_for(User.objects.get(pk=self.admin.pk))
+		self.url = reverse('admin-users')
+
+	def add_users(self, count, prefix='user'):
+		for i in range(count):
+			user = self.create_user(f'{prefix}{i}')
+			self.create_movements(user, self.category, [10, 20], 'EXPENSE')
+			self.create_movements(user, self.category, [100], 'INCOME')
+
+	def count_queries(self):
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(self.url)
+		self.assertEqual(response.status_code, 200)
+		return len(ctx.captured_queries)
+
+	def test_query_count_does_not_grow_with_users(self):
+		self.add_users(2, prefix='few')
+		self.client.get(self.url)  # carga el registro de roles
+		few = self.count_queries()
+		self.add_users(20, prefix='many')
+		many = self.count_queries()
+		self.assertEqual(few, many)
+		self.assertLessEqual(many, 3)
+
+	def test_totals_are_aggregated_per_user(self):
+		self.add_users(1)
+		response = self.client.get(self.url, {'search': 'user0'})
+		self.assertEqual(response.data['count'], 1)
+		row = response.data['results'][0]
+		self.assertEqual(row['total_movements'], 3)
+		self.assertEqual(row['total_income'], 100.0)
+		self.assertEqual(row['total_expense'], 30.0)
+		self.assertEqual(row['balance'], 70.0)
+
+	def test_sorting_and_pagination(self):
+		self.add_users(3)
+		extra = User.objects.get(username='user1')
+		self.create_movements(extra, self.category, [500], 'INCOME')
+
+		response = self.client.get(self.url, {'ordering': '-balance', 'page_size': 2})
+		self.assertEqual(response.data['count'], 4)
+		self.assertEqual(len(response.data['results']), 2)
+		self.assertEqual(response.data['results'][0]['username'], 'user1')
+		self.assertIsNotNone(response.data['next'])
+
+	def test_requires_admin(self):
+		regular = self.create_user('regular')
+		response = self.client_for(regular).get(self.url)
+		self.assertEqual(response.status_code, 403)
+
+
+class SummaryRollupTests(APITestCase):
+	def setUp(self):
+		super().setUp()
+		self.user = self.create_user('ana')
+		self.food, self.home = Category.objects.filter(user__isnull=True)[:2]
+		for amount, movement_type, category, day in (
+			(100, 'INCOME', self.home, date(2024, 1, 1)),
+			(10, 'EXPENSE', self.food, date(2024, 1, 15)),
+			(20, 'EXPENSE', self.home, date(2024, 1, 31)),
+			(30, 'EXPENSE', self.food, date(2024, 2, 10)),
+			(200, 'INCOME', self.home, date(2024, 2, 29)),
+			(40, 'EXPENSE', self.food, date(2024, 3, 5)),
+		):
+			Movement.objects.create(user=self.user, category=category, amount=amount, type=movement_type, date=day)
+		self.client = self.client_for(self.user)
+
+	def raw_summary(self, start, end):
+		qs = Movement.objects.filter(user=self.user)
+		if start:
+			qs = qs.filter(date__gte=start)
+		if end:
+			qs = qs.filter(date__lte=end)
+		monthly = qs.annotate(month=TruncMonth('date')).values('month', 'type').annotate(total=Sum('amount')).order_by('month', 'type')
+		categories = qs.filter(type='EXPENSE').values('category__name').annotate(total=Sum('amount'))
+		return [(row['month'], row['type'], row['total']) for row in monthly], {row['category__name']: row['total'] for row in categories}
+
+	def assertSummaryMatchesMovements(self):
+		for start, end in (
+			(None, None), (date(2024, 1, 1), date(2024, 2, 29)), (date(2024, 1, 15), date(2024, 3, 4)),
+			(date(2024, 1, 10), date(2024, 1, 31)), (date(2024, 2, 1), None), (None, date(2024, 2, 10)),
+		):
+			params = {name: str(value) for name, value in (('start', start), ('end', end)) if value}
+			with self.subTest(**params):
+				summary = self.client.get(reverse('reports-summary'), params).data
+				monthly, categories = self.raw_summary(start, end)
+				self.assertEqual([(row['month'], row['type'], row['total']) for row in summary['monthly']], monthly)
+				self.assertEqual({row['category__name']: row['total'] for row in summary['category_breakdown']}, categories)
+		self.assertAggregatesConsistent()
+
+	def test_split_report_range(self):
+		self.assertEqual(split_report_range(date(2024, 1, 1), date(2024, 2, 29)), ((date(2024, 1, 1), date(2024, 3, 1)), []))
+		self.assertEqual(
+			split_report_range(date(2024, 1, 15), date(2024, 3, 4)),
+			((date(2024, 2, 1), date(2024, 3, 1)), [(date(2024, 1, 15), date(2024, 1, 31)), (date(2024, 3, 1), date(2024, 3, 4))]),
+		)
+		self.assertEqual(split_report_range(date(2024, 1, 10), date(2024, 1, 31)), (None, [(date(2024, 1, 10), date(2024, 1, 31))]))
+		self.assertEqual(split_report_range(None, date(2024, 2, 10)), ((None, date(2024, 2, 1)), [(date(2024, 2, 1), date(2024, 2, 10))]))
+		self.assertEqual(split_report_range(date(2024, 2, 1), None), ((date(2024, 2, 1), None), []))
+
+	def test_summary_matches_movements(self):
+		self.assertSummaryMatchesMovements()
+
+	def test_updates_and_deletes_keep_the_rollups_in_sync(self):
+		movement = Movement.objects.get(user=self.user, amount=10)
+		with self.captureOnCommitCallbacks(execute=True):
+			response = self.client.patch(reverse('movement-detail', args=[movement.id]), {
+				'amount': '15.00', 'date': '2024-03-20', 'type': 'INCOME', 'category': self.home.id,
+			})
+		self.assertEqual(response.status_code, 200)
+		self.assertSummaryMatchesMovements()
+
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.delete(reverse('movement-detail', args=[Movement.objects.get(user=self.user, amount=30).id]))
+		self.assertSummaryMatchesMovements()
+
+
+class ResponseCacheTests(APITestCase):
+	def setUp(self):
+		super().setUp()
+		self.user = self.create_user('ana')
+		self.category = Category.objects.filter(user__isnull=True).first()
+		self.create_movements(self.user, self.category, [10])
+		self.client = self.client_for(self.user)
+		self.url = reverse('reports-summary')
+
+	def etag(self):
+		response = self.client.get(self.url)
+		self.assertEqual(response.status_code, 200)
+		return response['ETag']
+
+	def assertStale(self, etag):
+		response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 200)
+		self.assertNotEqual(response['ETag'], etag)
+		return response
+
+	def test_matching_etag_gets_304_without_queries(self):
+		etag = self.etag()
+		with self.assertNumQueries(0):
+			response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 304)
+		self.assertEqual(response['ETag'], etag)
+
+	def test_writes_of_the_user_change_the_etag(self):
+		etag = self.etag()
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.post(reverse('movement-list'), {'amount': '5.00', 'type': 'EXPENSE', 'date': '2024-01-20', 'category': self.category.id})
+		self.assertEqual(self.assertStale(etag).data['expense'], 15)
+
+		etag = self.etag()
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.post(reverse('category-list'), {'name': 'Mascotas', 'color': '#f97316'})
+		etag = self.assertStale(etag)['ETag']
+
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.post(reverse('budget-list'), {'month': '2024-01', 'max_amount': '50.00', 'category': self.category.id})
+		self.assertStale(etag)
+
+	def test_other_users_writes_keep_the_etag(self):
+		etag = self.etag()
+		with self.captureOnCommitCallbacks(execute=True):
+			self.create_movements(self.create_user('otro'), self.category, [99])
+		self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+	def test_global_category_changes_invalidate_every_user(self):
+		etag = self.etag()
+		with self.captureOnCommitCallbacks(execute=True):
+			self.category.name = 'Comida y bebida'
+			self.category.save()
+		self.assertStale(etag)
+
+
+class BudgetStatusTests(APITestCase):
+	def test_default_month_follows_the_calendar(self):
+		user = self.create_user('ana')
+		category = Category.objects.filter(user__isnull=True).first()
+		Budget.objects.create(user=user, category=category, month='2024-01', max_amount=100)
+		Budget.objects.create(user=user, category=category, month='2024-02', max_amount=50)
+		self.create_movements(user, category, [30])
+		client = self.client_for(user)
+		url = reverse('budget-status')
+
+		with patch('django.utils.timezone.localdate', return_value=date(2024, 1, 31)):
+			response = client.get(url)
+			self.assertEqual([(row['month'], row['spent']) for row in response.data], [('2024-01', 30)])
+			etag = response['ETag']
+			self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+		with patch('django.utils.timezone.localdate', return_value=date(2024, 2, 1)):
+			response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual([(row['month'], row['spent']) for row in response.data], [('2024-02', 0)])
+
+
+class MovementBulkTests(APITestCase):
+	def setUp(self):
+		super().setUp()
+		self.user = self.create_user('ana')
+		self.category = Category.objects.filter(user__isnull=True).first()
+		self.create_movements(self.user, self.category, [10, 20])
+		self.first, self.second = Movement.objects.filter(user=self.user).order_by('id')
+		self.client = self.client_for(self.user)
+		self.url = reverse('movement-bulk')
+
+	def row(self, **extra):
+		return {'amount': '5.00', 'type': 'EXPENSE', 'date': '2024-02-01', 'category': self.category.id, **extra}
+
+	def post(self, payload, partial=False):
+		url = f'{self.url}?partial=1' if partial else self.url
+		return self.client.post(url, payload, format='json')
+
+	# El presupuesto de bulk cubre un lote de un día; este toca tres.
+	@override_settings(QUERY_BUDGETS='off')
+	def test_create_update_and_delete(self):
+		response = self.post({
+			'create': [self.row(), self.row(type='INCOME', amount='100.00')],
+			'update': [{'id': self.first.id, 'amount': '15.00', 'date': '2024-03-10', 'type': 'INCOME'}],
+			'delete': [self.second.id],
+		})
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual((response.data['created'], response.data['updated'], response.data['deleted']), (2, 1, 1))
+		self.first.refresh_from_db()
+		self.assertEqual((self.first.amount, self.first.type, self.first.date), (15, 'INCOME', date(2024, 3, 10)))
+		self.assertFalse(Movement.objects.filter(pk=self.second.pk).exists())
+		self.assertEqual(Movement.objects.filter(user=self.user).count(), 3)
+		self.assertAggregatesConsistent()
+
+	def test_a_list_creates_every_row(self):
+		response = self.post([self.row(), self.row()])
+		self.assertEqual(response.data['created'], 2)
+		self.assertAggregatesConsistent()
+
+	def test_invalid_row_cancels_the_whole_batch(self):
+		other = self.create_user('otro')
+		foreign = Movement.objects.create(user=other, category=self.category, amount=1, type='EXPENSE', date=date(2024, 1, 1))
+		response = self.post({'create': [self.row(), self.row(amount='x')], 'delete': [self.first.id, foreign.id]})
+		self.assertEqual(response.status_code, 400)
+		self.assertEqual([(error['operation'], error['index']) for error in response.data['errors']], [('create', 1), ('delete', 1)])
+		self.assertEqual(Movement.objects.filter(user=self.user).count(), 2)
+		self.assertAggregatesConsistent()
+
+	def test_partial_mode_writes_the_valid_rows(self):
+		response = self.post({'create': [self.row(), self.row(category=0)], 'delete': [self.first.id]}, partial=True)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual((response.data['created'], response.data['deleted']), (1, 1))
+		self.assertEqual(response.data['errors'][0]['operation'], 'create')
+		self.assertAggregatesConsistent()
+
+	def test_repeated_delete_ids_are_rejected(self):
+		response = self.post({'delete': [self.first.id, self.first.id]}, partial=True)
+		self.assertEqual(response.data['deleted'], 1)
+		self.assertEqual(response.data['errors'], [{'operation': 'delete', 'index': 1, 'errors': {'id': ['Movimiento repetido en el lote.']}}])
+		self.assertAggregatesConsistent()
+
+
+class MovementImportTests(APITestCase):
+	OFX = (
+		'OFXHEADER:100\nDATA:OFXSGML\n<OFX><BANKTRANLIST>\n'
+		'<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240105120000<TRNAMT>-45.10<NAME>Supermercado<MEMO>Tarjeta</STMTTRN>\n'
+		'<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240131<TRNAMT>1500.00<NAME>Salario</STMTTRN>\n'
+		'</BANKTRANLIST></OFX>\n'
+	)
+
+	def setUp(self):
+		super().setUp()
+		self.user = self.create_user('ana')
+		self.category = Category.objects.filter(user__isnull=True).first()
+
+	def importer(self, **options):
+		return MovementImporter(self.user, default_category=options.pop('default_category', self.category.name), **options)
+
+	# El presupuesto de import cubre un lote de un día; el archivo trae varios.
+	@override_settings(QUERY_BUDGETS='off')
+	def test_csv_with_decimal_comma_and_rejected_rows(self):
+		content = (
+			'Fecha;Concepto;Importe;Tipo;Categoría\n'
+			f'15/01/2024;Mercado;-1.234,56;;{self.category.name}\n'
+			f'16/01/2024;Salario;2.000,00;ingreso;{self.category.name}\n'
+			'17/01/2024;Error;12,x;gasto;\n'
+			f'32/01/2024;Fecha mala;10,00;gasto;{self.category.name}\n'
+			'18/01/2024;Otra;10,00;gasto;Inexistente\n'
+		)
+		upload = SimpleUploadedFile('extracto.csv', content.encode('utf-8'), content_type='text/csv')
+		response = self.client_for(self.user).post(reverse('movement-import-statement'), {'file': upload, 'decimal_comma': 'true'})
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual((response.data['read'], response.data['imported'], response.data['rejected']), (5, 2, 3))
+		self.assertEqual([reject['line'] for reject in response.data['rejects']], [4, 5, 6])
+		self.assertIn('Monto inválido', response.data['rejects'][0]['reason'])
+		self.assertIn('Fecha inválida', response.data['rejects'][1]['reason'])
+		self.assertIn('Categoría desconocida', response.data['rejects'][2]['reason'])
+		self.assertEqual(
+			list(Movement.objects.filter(user=self.user).order_by('date').values_list('amount', 'type', 'description')),
+			[(Decimal('1234.56'), 'EXPENSE', 'Mercado'), (Decimal('2000.00'), 'INCOME', 'Salario')],
+		)
+		self.assertAggregatesConsistent()
+
+	def test_non_finite_amounts_are_rejected(self):
+		content = 'fecha,valor\n2024-01-10,-5\n2024-01-10,nan\n2024-01-10,Infinity\n2024-01-10,sNaN\n'
+		upload = SimpleUploadedFile('extracto.csv', content.encode('utf-8'), content_type='text/csv')
+		response = self.client_for(self.user).post(reverse('movement-import-statement'), {'file': upload, 'default_category': self.category.name})
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual((response.data['imported'], response.data['rejected']), (1, 3))
+		self.assertEqual([reject['line'] for reject in response.data['rejects']], [3, 4, 5])
+		self.assertTrue(all('Monto inválido' in reject['reason'] for reject in response.data['rejects']))
+
+	def test_csv_requires_amount_and_date_columns(self):
+		rows = iter_csv_rows(io.BytesIO(b'descripcion,valor\nCafe,3\n'))
+		with self.assertRaisesRegex(ValueError, 'columnas de monto y fecha'):
+			self.importer().run(rows)
+
+	def test_ofx_transactions_across_chunks(self):
+		rows = list(iter_ofx_rows(io.BytesIO(self.OFX.encode('latin-1')), chunk_size=16))
+		self.assertEqual(rows, [
+			(1, {'date': '20240105', 'amount': '-45.10', 'description': 'Supermercado - Tarjeta'}),
+			(2, {'date': '20240131', 'amount': '1500.00', 'description': 'Salario'}),
+		])
+		summary = self.importer().run(iter(rows))
+		self.assertEqual(summary['imported'], 2)
+		self.assertEqual(sorted(Movement.objects.filter(user=self.user).values_list('type', 'amount')), [
+			('EXPENSE', Decimal('45.10')), ('INCOME', Decimal('1500.00')),
+		])
+
+	def test_batches_keep_rollups_and_stats_in_sync(self):
+		rows = ((line, {'date': f'2024-0{line}-10', 'amount': str(-10 * line)}) for line in range(1, 8))
+		progress = []
+		summary = self.importer(batch_size=3, on_progress=lambda *counts: progress.append(counts)).run(rows)
+		self.assertEqual(summary['imported'], 7)
+		self.assertEqual(progress, [(3, 3, 0), (6, 6, 0), (7, 7, 0)])
+		self.assertAggregatesConsistent()
+
+
+@patch.object(MovementViewSet, 'stream_chunk_size', 2)
+class ExportTests(APITestCase):
+	HEADER = ['id', 'date', 'type', 'amount', 'currency', 'category', 'description']
+
+	def setUp(self):
+		super().setUp()
+		self.user = self.create_user('ana')
+		self.category = Category.objects.filter(user__isnull=True).first()
+		for amount, day, description in ((10, date(2024, 1, 5), 'Café'), (20, date(2024, 1, 20), 'Cena, "amigos"'), (30, date(2024, 2, 1), 'Taxi')):
+			Movement.objects.create(user=self.user, category=self.category, amount=amount, type='EXPENSE', date=day, description=description)
+		other = self.create_user('otro')
+		Movement.objects.create(user=other, category=self.category, amount=99, type='EXPENSE', date=date(2024, 1, 10), description='Ajeno')
+		self.client = self.client_for(self.user)
+
+	def download(self, url, content_type, filename):
+		response = self.client.get(url)
+		self.assertEqual(response.status_code, 200)
+		self.assertTrue(response.streaming)
+		self.assertEqual(response['Content-Type'], content_type)
+		self.assertEqual(response['Content-Disposition'], f'attachment; filename="{filename}"')
+		return b''.join(response.streaming_content)
+
+	def test_movements_csv(self):
+		content = self.download(reverse('movement-export', args=['csv']), 'text/csv; charset=utf-8', 'movimientos.csv')
+		rows = list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))
+		self.assertEqual(rows[0], self.HEADER)
+		self.assertEqual([row[1:] for row in rows[1:]], [
+			['2024-02-01', 'EXPENSE', '30.00', 'USD', self.category.name, 'Taxi'],
+			['2024-01-20', 'EXPENSE', '20.00', 'USD', self.category.name, 'Cena, "amigos"'],
+			['2024-01-05', 'EXPENSE', '10.00', 'USD', self.category.name, 'Café'],
+		])
+
+	def test_csv_neutralizes_formulas_in_text_cells(self):
+		category = Category.objects.create(user=self.user, name='@SUM(A1:A9)')
+		Movement.objects.create(user=self.user, category=category, amount=5, type='EXPENSE', date=date(2024, 3, 1), description='=HYPERLINK("http://x")')
+		Movement.objects.create(user=self.user, category=category, amount=6, type='EXPENSE', date=date(2024, 3, 2), description='-2+3')
+		content = self.download(reverse('movement-export', args=['csv']), 'text/csv; charset=utf-8', 'movimientos.csv')
+		rows = list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))
+		self.assertEqual([row[3:] for row in rows[1:3]], [
+			['6.00', 'USD', "'@SUM(A1:A9)", "'-2+3"],
+			['5.00', 'USD', "'@SUM(A1:A9)", '\'=HYPERLINK("http://x")'],
+		])
+		self.assertEqual(rows[3][6], 'Taxi')
+
+	def test_movements_xlsx(self):
+		content = self.download(
+			reverse('movement-export', args=['xlsx']),
+			'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'movimientos.xlsx',
+		)
+		with zipfile.ZipFile(io.BytesIO(content)) as archive:
+			self.assertIn('xl/workbook.xml', archive.namelist())
+			sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+		rows = re.findall(r'<row>(.*?)</row>', sheet)
+		self.assertEqual(len(rows), 4)
+		self.assertEqual(re.findall(r'<t xml:space="preserve">(.*?)</t>', rows[0]), self.HEADER)
+		self.assertIn('<t xml:space="preserve">Cena, "amigos"</t>', sheet)
+		self.assertIn(f'<c s="1"><v>{(date(2024, 2, 1) - date(1899, 12, 30)).days}</v></c>', rows[1])
+		self.assertNotIn('Ajeno', sheet)
+
+	@skipUnless(parquet_available(), 'requiere pyarrow')
+	def test_movements_parquet(self):
+		import pyarrow.parquet as pq
+
+		content = self.download(reverse('movement-export', args=['parquet']), 'application/vnd.apache.parquet', 'movimientos.parquet')
+		table = pq.read_table(io.BytesIO(content))
+		self.assertEqual(table.column_names, self.HEADER)
+		self.assertEqual(table.column('amount').to_pylist(), [Decimal('30.00'), Decimal('20.00'), Decimal('10.00')])
+		self.assertEqual(table.column('date').to_pylist()[-1], date(2024, 1, 5))
+
+	def test_report_csv(self):
+		content = self.download(reverse('reports-export', args=['csv']) + '?start=2024-01-01&end=2024-01-31', 'text/csv; charset=utf-8', 'reporte.csv')
+		header, *rows = csv.reader(io.StringIO(content.decode('utf-8-sig')))
+		self.assertEqual(header, ['month', 'type', 'category', 'currency', 'total', 'count'])
+		self.assertEqual([(*row[:4], Decimal(row[4]), row[5]) for row in rows], [
+			('2024-01-01', 'EXPENSE', self.category.name, 'USD', 30, '2'),
+		])
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserProvisioningTests(APITestCase):
+	def rows(self):
+		return enumerate([
+			{'username': 'ana', 'email': 'ana@example.com', 'password': 'clave-ana-1'},
+			{'username': 'beto', 'email': 'beto@example.com', 'password': 'clave-beto-1'},
+			{'username': 'carla', 'email': 'carla@example.com'},
+			{'username': 'ana', 'email': 'otra@example.com'},
+		], start=2)
+
+	def test_passwords_are_hashed_in_parallel_in_order(self):
+		summary = UserBulkCreator(hash_workers=4).run(self.rows())
+		self.assertEqual((summary['created'], summary['skipped']), (3, 1))
+		self.assertTrue(User.objects.get(username='ana').check_password('clave-ana-1'))
+		self.assertTrue(User.objects.get(username='beto').check_password('clave-beto-1'))
+		self.assertFalse(User.objects.get(username='carla').has_usable_password())
+		self.assertEqual(User.objects.get(username='beto').role, self.user_role)
+
+	def test_passwords_can_be_skipped(self):
+		UserBulkCreator(keep_passwords=False).run(self.rows())
+		self.assertFalse(any(user.has_usable_password() for user in User.objects.all()))
+
+
+class RoleRegistryTests(APITestCase):
+	def setUp(self):
+		super().setUp()
+		self.admin = self.create_user('admin', role=self.admin_role)
+		self.client = APIClient()
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+
+	def role_queries(self, url):
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(url)
+		self.assertEqual(response.status_code, 200)
+		return [query['sql'] for query in ctx.captured_queries if Role._meta.db_table in query['sql']]
+
+	def test_admin_requests_do_not_query_roles(self):
+		self.client.get(reverse('auth-profile'))  # carga el registro de roles
+		self.assertEqual(self.role_queries(reverse('auth-profile')), [])
+		self.assertEqual(self.role_queries(reverse('admin-users')), [])
+
+	def test_registry_is_cleared_when_a_role_changes(self):
+		self.assertTrue(User.objects.get(pk=self.admin.pk).is_admin)
+		self.admin_role.name = 'user-legacy'
+		self.admin_role.save()
+		self.assertFalse(User.objects.get(pk=self.admin.pk).is_admin)
+
+
+@override_settings(JWT_STATELESS_READS=True)
+class StatelessReadAuthenticationTests(APITestCase):
+	def setUp(self):
+		super().setUp()
+		self.user = self.create_user('ana', role=self.user_role)
+		cache.clear()  # asignar el rol al crear el usuario revoca sus tokens anteriores
+		self.category = Category.objects.filter(user__isnull=True).first()
+		self.create_movements(self.user, self.category, [10])
+		self.client = self.client_with_token(timezone.now() - timedelta(minutes=5))
+
+	def client_with_token(self, issued_at):
+		token = AccessToken.for_user(self.user)
+		token.set_iat(at_time=issued_at)
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {add_user_claims(token, self.user)}')
+		return client
+
+	def test_reads_do_not_load_the_user(self):
+		self.client.get(reverse('movement-list'))  # carga el registro de roles
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(reverse('movement-list'))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(len(response.data['results']), 1)
+		self.assertEqual(len(ctx.captured_queries), 1)
+
+	def test_writes_still_load_the_user(self):
+		response = self.client.post(reverse('movement-list'), {
+			'amount': '5.00', 'type': 'EXPENSE', 'date': '2024-02-01', 'category': self.category.id,
+		}, format='json')
+		self.assertEqual(response.status_code, 201)
+
+	def test_changing_claimed_fields_revokes_previous_tokens(self):
+		self.user.preferred_currency = 'EUR'
+		self.user.save()
+		self.assertEqual(self.client.get(reverse('movement-list')).status_code, 401)
+		fresh = self.client_with_token(timezone.now())
+		self.assertEqual(fresh.get(reverse('movement-list')).status_code, 200)
+
+	def test_profile_update_returns_tokens_for_the_new_claims(self):
+		response = self.client.put(reverse('auth-profile'), {'preferred_currency': 'EUR'}, format='json')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(self.client.get(reverse('movement-list')).status_code, 401)
+
+		client = APIClient()
+		client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+		self.assertEqual(AccessToken(response.data['access'])[CURRENCY_CLAIM], 'EUR')
+		self.assertEqual(client.get(reverse('movement-list')).status_code, 200)
+		refreshed = APIClient().post(reverse('token_refresh'), {'refresh': response.data['refresh']}, format='json')
+		self.assertEqual(refreshed.status_code, 200)
+
+	def test_profile_update_without_claim_changes_keeps_the_tokens(self):
+		response = self.client.put(reverse('auth-profile'), {'first_name': 'Ana'}, format='json')
+		self.assertEqual(response.status_code, 200)
+		self.assertNotIn('access', response.data)
+		self.assertEqual(self.client.get(reverse('movement-list')).status_code, 200)
+
+	def test_refresh_loads_the_user_once_with_current_claims(self):
+		refresh = str(RefreshToken.for_user(self.user))
+		User.objects.filter(pk=self.user.pk).update(preferred_currency='EUR')
+		with CaptureQueriesContext(connection) as ctx:
+			response = APIClient().post(reverse('token_refresh'), {'refresh': refresh}, format='json')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(len(ctx.captured_queries), 1)
+		self.assertEqual(AccessToken(response.data['access'])[CURRENCY_CLAIM], 'EUR')
+
+		User.objects.filter(pk=self.user.pk).update(is_active=False)
+		response = APIClient().post(reverse('token_refresh'), {'refresh': refresh}, format='json')
+		self.assertEqual(response.status_code, 401)
+
+
+
+class TimeSeriesTests(APITestCase):
+	def setUp(self):
+		super().setUp()
+		self.user = self.create_user('ana')
+		self.category = Category.objects.filter(user__isnull=True).first()
+		self.today = timezone.localdate()
+		self.create_movements(self.user, self.category, [500], 'INCOME', day=date(2023, 12, 20))
+		self.create_movements(self.user, self.category, [100, 50], 'INCOME', day=date(2024, 1, 10))
+		self.create_movements(self.user, self.category, [30], 'EXPENSE', day=date(2024, 2, 5))
+		self.create_movements(self.user, self.category, [20], 'EXPENSE', day=self.today)
+		self.client = self.client_for(self.user)
+
+	def test_buckets_and_running_balance(self):
+		response = self.client.get(reverse('reports-timeseries'), {'granularity': 'month', 'start': '2024-01-01'})
+		self.assertEqual(response.status_code, 200)
+		data = response.data
+		self.assertEqual(data['periods'][:2], [date(2024, 1, 1), date(2024, 2, 1)])
+		self.assertEqual(data['periods'][-1], self.today.replace(day=1))
+		self.assertEqual(data['opening_balance'], 500)
+		self.assertEqual(data['net'][:2], [150, -30])
+		self.assertEqual(data['balance'][:2], [650, 620])
+		self.assertEqual(data['balance'][-1], 600)
+
+	def test_closed_buckets_come_from_the_daily_rollup(self):
+		with CaptureQueriesContext(connection) as ctx:
+			self.client.get(reverse('reports-timeseries'), {'granularity': 'week', 'start': '2024-01-01'})
+		sql = [query['sql'] for query in ctx.captured_queries]
+		raw = [query for query in sql if f'FROM "{Movement._meta.db_table}"' in query or f'FROM `{Movement._meta.db_table}`' in query]
+		self.assertEqual(len(raw), 1)
+		self.assertIn(str(bucket_start(self.today, 'week')), raw[0])
+
+	def test_etag_changes_when_the_day_changes(self):
+		url = reverse('reports-timeseries')
+		etag = self.client.get(url, {'granularity': 'day'})['ETag']
+		self.assertEqual(self.client.get(url, {'granularity': 'day'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+		with patch('django.utils.timezone.localdate', return_value=self.today + timedelta(days=1)):
+			response = self.client.get(url, {'granularity': 'day'}, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data['periods'][-1], self.today + timedelta(days=1))
+
+	def test_category_series(self):
+		response = self.client.get(reverse('reports-timeseries'), {
+			'granularity': 'year', 'start': '2024-01-01', 'group_by': 'category',
+		})
+		series = response.data['series']
+		self.assertEqual([item['label'] for item in series], [self.category.name])
+		self.assertEqual(sum(series[0]['values']), 50)
+
+
+
+class MovementSearchTests(APITestCase):
+	def setUp(self):
+		super().setUp()
+		self.user = self.create_user('ana')
+		category = Category.objects.filter(user__isnull=True).first()
+		for day, description in (
+			(date(2021, 3, 1), 'Netflix mensual'),
+			(date(2023, 3, 1), 'Suscripción netflix'),
+			(date(2024, 3, 1), 'Netflix netflix, plan familiar'),
+			(date(2024, 4, 1), 'Cena con amigos'),
+		):
+			Movement.objects.create(user=self.user, category=category, amount=10, type='EXPENSE', date=day, description=description)
+		other = self.create_user('otro')
+		Movement.objects.create(user=other, category=category, amount=10, type='EXPENSE', date=date(2024, 1, 1), description='Netflix')
+		self.client = self.client_for(self.user)
+
+	def search(self, **params):
+		response = self.client.get(reverse('movement-list'), params)
+		self.assertEqual(response.status_code, 200)
+		return [row['description'] for row in response.data['results']]
+
+	def test_prefix_and_accent_insensitive_matching(self):
+		self.assertEqual(len(self.search(q='netf')), 3)
+		self.assertEqual(self.search(q='suscripcion NET'), ['Suscripción netflix'])
+		self.assertEqual(self.search(q='netflix cena'), [])
+
+	def test_relevance_ordering(self):
+		results = self.search(q='netflix', ordering='relevance')
+		self.assertEqual(results[0], 'Netflix netflix, plan familiar')
+		self.assertEqual(results[1:], ['Suscripción netflix', 'Netflix mensual'])
+
+
+class MovementFieldsTests(APITestCase):
+	def setUp(self):
+		super().setUp()
+		self.user = self.create_user('ana')
+		category = Category.objects.filter(user__isnull=True).first()
+		self.create_movements(self.user, category, [10, 20, 30])
+		self.client = self.client_for(self.user)
+
+	def test_values_path_matches_the_serializer(self):
+		response = self.client.get(reverse('movement-list'), {'limit': 2})
+		first = response.data['results'][0]
+		detail = self.client.get(reverse('movement-detail', args=[first['id']])).data
+		self.assertEqual(first, dict(detail))
+		following = self.client.get(response.data['next']).data['results']
+		self.assertEqual(len(following), 1)
+
+	@patch.object(MovementViewSet, 'stream_chunk_size', 2)
+	def test_ndjson_stream(self):
+		self.create_movements(self.create_user('otro'), Category.objects.filter(user__isnull=True).first(), [99])
+		response = self.client.get(reverse('movement-list'), {'stream': 'ndjson'})
+		self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+		lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+		rows = [json.loads(line) for line in lines]
+		self.assertEqual(sorted(row['amount'] for row in rows), ['10.00', '20.00', '30.00'])
+		self.assertEqual(rows[0], dict(self.client.get(reverse('movement-detail', args=[rows[0]['id']])).data))
+
+	def test_sparse_fieldsets(self):
+		rows = self.client.get(reverse('movement-list'), {'fields': 'id,amount'}).data['results']
+		self.assertEqual(rows[0].keys(), {'id', 'amount'})
+		movement_id = rows[0]['id']
+		detail = self.client.get(reverse('movement-detail', args=[movement_id]), {'fields': 'amount,category_name'}).data
+		self.assertEqual(detail.keys(), {'amount', 'category_name'})
+		response = self.client.get(reverse('movement-list'), {'fields': 'id,saldo'})
+		self.assertEqual(response.status_code, 400)
+
+
+class DashboardTests(APITestCase):
+	def setUp(self):
+		super().setUp()
+		self.user = self.create_user('ana')
+		self.category = Category.objects.filter(user__isnull=True).first()
+		today = timezone.localdate()
+		self.create_movements(self.user, self.category, [10, 20, 30], 'EXPENSE', day=today)
+		Budget.objects.create(user=self.user, category=self.category, month=today.strftime('%Y-%m'), max_amount=100)
+		self.client = self.client_for(self.user)
+
+	def test_one_request_returns_every_section(self):
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(reverse('dashboard'), {'limit': 2})
+		self.assertEqual(response.status_code, 200)
+		data = response.data
+		self.assertEqual(list(data), ['profile', 'summary', 'categories', 'movements', 'budgets'])
+		self.assertEqual(data['profile']['username'], 'ana')
+		self.assertEqual(data['summary']['expense'], 60)
+		self.assertEqual(len(data['movements']['results']), 2)
+		self.assertIn('cursor=', data['movements']['next'])
+		self.assertEqual(data['budgets'][0]['spent'], 60)
+		self.assertLessEqual(len(ctx.captured_queries), 7)
+
+		with self.assertNumQueries(0):
+			self.client.get(reverse('dashboard'), {'limit': 2})
+
+	def test_budgets_follow_the_current_month(self):
+		etag = self.client.get(reverse('dashboard'), {'fields': 'budgets'})['ETag']
+		next_month = (timezone.localdate().replace(day=1) + timedelta(days=31)).replace(day=1)
+		with patch('django.utils.timezone.localdate', return_value=next_month):
+			response = self.client.get(reverse('dashboard'), {'fields': 'budgets'}, HTTP_IF_NONE_MATCH=etag)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data['budgets'], [])
+
+	def test_field_selection(self):
+		response = self.client.get(reverse('dashboard'), {'fields': 'budgets,summary'})
+		self.assertEqual(list(response.data), ['summary', 'budgets'])
+		response = self.client.get(reverse('dashboard'), {'fields': 'summary,saldo'})
+		self.assertEqual(response.status_code, 400)
+
+
+@override_settings(BASE_CURRENCY='USD')
+class MulticurrencyTests(APITestCase):
+	def setUp(self):
+		super().setUp()
+		ExchangeRate.objects.create(currency='EUR', date=date(2024, 1, 1), rate=Decimal('1.10'))
+		ExchangeRate.objects.create(currency='EUR', date=date(2024, 2, 1), rate=Decimal('1.20'))
+		self.user = self.create_user('ana', preferred_currency='EUR')
+		self.category = Category.objects.filter(user__isnull=True).first()
+		for amount, currency, movement_type, day in (
+			(100, 'EUR', 'INCOME', date(2024, 1, 10)),
+			(55, 'USD', 'EXPENSE', date(2024, 1, 20)),  # 50 EUR a 1.10
+			(120, 'USD', 'EXPENSE', date(2024, 2, 10)),  # 100 EUR a 1.20
+		):
+			Movement.objects.create(
+				user=self.user, category=self.category, amount=amount,
+				currency=currency, type=movement_type, date=day,
+			)
+		self.client = self.client_for(self.user)
+
+	def test_reports_convert_with_the_rate_of_each_day(self):
+		summary = self.client.get(reverse('reports-summary')).data
+		self.assertEqual(summary['income'], 100)
+		self.assertEqual(summary['expense'], 150)
+		self.assertEqual([row['total'] for row in summary['monthly'] if row['type'] == 'EXPENSE'], [50, 100])
+
+		series = self.client.get(reverse('reports-timeseries'), {'granularity': 'month', 'start': '2024-02-01'}).data
+		self.assertEqual(series['opening_balance'], 50)
+		self.assertEqual(series['net'][0], -100)
+
+	def test_movement_currency_defaults_to_preferred_and_needs_rates(self):
+		payload = {'amount': '10.00', 'type': 'EXPENSE', 'date': '2024-03-01', 'category': self.category.id}
+		response = self.client.post(reverse('movement-list'), payload)
+		self.assertEqual(response.data['currency'], 'EUR')
+		response = self.client.post(reverse('movement-list'), {**payload, 'currency': 'usd'})
+		self.assertEqual(response.data['currency'], 'USD')
+		response = self.client.post(reverse('movement-list'), {**payload, 'currency': 'JPY'})
+		self.assertEqual(response.status_code, 400)
+
+	def test_currencies_without_rates_are_not_dropped(self):
+		user = self.create_user('kenji', preferred_currency='JPY')
+		for amount, currency in ((1000, 'JPY'), (10, 'USD'), (20, 'GBP')):
+			Movement.objects.create(user=user, category=self.category, amount=amount, currency=currency, type='EXPENSE', date=date(2024, 1, 5))
+		self.assertEqual(self.client_for(user).get(reverse('reports-summary')).data['expense'], 1030)
+		self.assertAggregatesConsistent()
+
+	def test_known_currencies_reads_one_row_per_currency(self):
+		with CaptureQueriesContext(connection) as ctx:
+			self.assertEqual(known_currencies(), {'EUR', 'USD'})
+		self.assertNotIn('ORDER BY', ctx.captured_queries[-1]['sql'])
+
+	def test_system_totals_are_kept_in_base_currency(self):
+		stats = dashboard_stats()
+		self.assertEqual(stats['total_income'], 110)
+		self.assertEqual(stats['total_expense'], 175)
+
+
+class SeedingAndBenchmarkTests(APITestCase):
+	def test_seeded_data_is_consistent_and_every_route_is_benchmarked(self):
+		DatasetSeeder(500, users=4, months=6, log=lambda message: None).run()
+		self.assertEqual(Movement.objects.count(), 500)
+		self.assertEqual(User.objects.filter(username__startswith='seed_').count(), 5)
+		self.assertTrue(Budget.objects.exists())
+		self.assertEqual(diff_rollups(MonthlyRollup), [])
+
+		fixtures = benchmark_fixtures('seed_0', SEED_ADMIN)
+		cases = endpoint_cases(fixtures)
+		self.assertEqual(uncovered_url_names(cases), [])
+		for case in cases:
+			if 'ordering' in case.params and case.url_name == 'admin-users':
+				self.assertIn(case.params['ordering'].lstrip('-'), AdminUsersView.ordering_fields, case.name)
+
+		selected = [case for case in cases if case.name in ('GET reports-summary', 'DELETE movement-detail')]
+		results = EndpointBenchmark(fixtures, iterations=2).run(selected)
+		self.assertEqual(results['GET reports-summary']['status'], 200)
+		self.assertEqual(results['DELETE movement-detail']['status'], 204)
+		self.assertGreater(results['GET reports-summary']['queries'], 0)
+		self.assertEqual(Movement.objects.count(), 500)  # la escritura se revirtió
+
+
+class AsyncViewsTests(APITestCase):
+	"""
+	Las variantes async solo se enrutan con ASYNC_VIEWS (ASGI), así que aquí se
+	llaman directamente y se comparan con las síncronas servidas por las URLs.
+	"""
+
+	def setUp(self):
+		super().setUp()
+		self.admin = self.create_user('admin', role=self.admin_role)
+		self.user = self.create_user('ana')
+		category = Category.objects.filter(user__isnull=True).first()
+		self.create_movements(self.user, category, [10, 20])
+		self.create_movements(self.user, category, [500], 'INCOME', day=date(2024, 2, 1))
+
+	def call_async(self, view, user, path, **kwargs):
+		request = APIRequestFactory().get(path)
+		force_authenticate(request, user)
+		cache.clear()  # ambas variantes comparten la caché de respuestas
+		return async_to_sync(view.as_view())(request, **kwargs)
+
+	def test_summary_matches_the_sync_view(self):
+		url = reverse('reports-summary')
+		response = self.call_async(AsyncReportsSummaryView, self.user, url)
+		self.assertEqual(response.status_code, 200)
+		cache.clear()
+		self.assertEqual(response.data, self.client_for(self.user).get(url).data)
+
+	def test_user_detail_matches_the_sync_view(self):
+		url = reverse('admin-user-detail', args=[self.user.pk])
+		response = self.call_async(AsyncAdminUserDetailView, self.admin, url, user_id=self.user.pk)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.data, self.client_for(self.admin).get(url).data)
+
+	def test_user_detail_not_found_and_forbidden(self):
+		missing = reverse('admin-user-detail', args=[0])
+		self.assertEqual(self.call_async(AsyncAdminUserDetailView, self.admin, missing, user_id=0).status_code, 404)
+		url = reverse('admin-user-detail', args=[self.user.pk])
+		self.assertEqual(self.call_async(AsyncAdminUserDetailView, self.user, url, user_id=self.user.pk).status_code, 403)
+
+
+# Sin consultas a la base: dentro de la transacción de un TestCase el pool se
+# desactiva, así que se fuerza para probar el camino concurrente.
+@patch('api.concurrency._can_run_concurrently', return_value=True)
+class RunConcurrentlyTests(TestCase):
+	def queries(self):
+		def slow():
+			time.sleep(0.05)
+			return 'lento'
+
+		return {'slow': slow, 'fast': lambda: 'rápido', 'thread': threading.get_ident}
+
+	def test_results_keep_the_order_of_the_queries(self, _):
+		results = run_concurrently(self.queries())
+		self.assertEqual(list(results), ['slow', 'fast', 'thread'])
+		self.assertEqual((results['slow'], results['fast']), ('lento', 'rápido'))
+		self.assertNotEqual(results['thread'], threading.get_ident())
+
+	def test_async_results_keep_the_order_of_the_queries(self, _):
+		results = async_to_sync(arun_concurrently)(self.queries())
+		self.assertEqual(list(results), ['slow', 'fast', 'thread'])
+		self.assertEqual(results['slow'], 'lento')
+
+	def test_exceptions_are_propagated(self, _):
+		def failing():
+			raise ValueError('falló')
+
+		queries = {**self.queries(), 'failing': failing}
+		with self.assertRaisesRegex(ValueError, 'falló'):
+			run_concurrently(queries)
+		with self.assertRaisesRegex(ValueError, 'falló'):
+			async_to_sync(arun_concurrently)(queries)
+
+
+class RequestMetricsTests(APITestCase):
+	def setUp(self):
+		super().setUp()
+		reset_metrics()
+		self.admin = self.create_user('admin', role=self.admin_role)
+		self.user = self.create_user('ana')
+		self.create_movements(self.user, Category.objects.filter(user__isnull=True).first(), [10, 20])
+
+	def test_disabled_middleware_adds_nothing(self):
+		response = self.client_for(self.user).get(reverse('reports-summary'))
+		self.assertNotIn('Server-Timing', response)
+
+	@override_settings(REQUEST_METRICS=True)
+	def test_server_timing_and_per_view_histograms(self):
+		response = self.client_for(self.user).get(reverse('reports-summary'))
+		self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ consultas", serialize;dur=[\d.]+, app;dur=.*total;dur=')
+
+		metrics = self.client_for(self.admin).get(reverse('admin-metrics')).data
+		summary = metrics['views']['reports-summary']
+		self.assertEqual(summary['requests'], 1)
+		self.assertGreater(summary['queries']['sum'], 0)
+		self.assertEqual(summary['latency_ms']['buckets']['+Inf'], 1)
+		self.assertTrue(all(query['call_site'].startswith('api/') for query in summary['slowest_queries']))
+
+	@override_settings(REQUEST_METRICS=True)
+	def test_serialization_is_timed_apart_from_the_view(self):
+		def slow_row(serializer, row):
+			time.sleep(0.05)
+			return {}
+
+		with patch.object(MovementValuesSerializer, 'to_representation', slow_row):
+			response = self.client_for(self.user).get(reverse('movement-list'))
+		timing = dict(re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing']))
+		self.assertGreaterEqual(float(timing['serialize']), 100)
+		self.assertLess(float(timing['app']), 100)
+
+		metrics = self.client_for(self.admin).get(reverse('admin-metrics')).data
+		self.assertGreaterEqual(metrics['views']['movement-list']['serialize_ms']['sum'], 100)
+
+
+class QueryBudgetTests(APITestCase):
+	def test_every_route_stays_within_its_query_budget(self):
+		DatasetSeeder(600, users=3, months=6, log=lambda message: None).run()
+		for username in ('seed_0', 'seed_1'):
+			self.assertRoutesWithinQueryBudgets(benchmark_fixtures(username, SEED_ADMIN, 'seed_0'))
+
+	def test_exceeding_the_budget_fails_with_the_queries(self):
+		client = self.client_for(self.create_user('ana'))
+		with patch.object(CategoryViewSet, 'query_budget', {'list': 0}):
+			with self.assertRaisesRegex(QueryBudgetExceeded, r'hizo 1 consultas SQL; su presupuesto es 0:\n  1\. SELECT .*\[api/categories\.py'):
+				client.get(reverse('category-list'))
+
+
+@override_settings(REPORT_QUERY_WORKERS=1, REPLICA_LAG_WINDOW=60)
+class ReplicaRoutingTests(TransactionTestCase):
+	"""
+	La réplica es un segundo alias sobre la misma base de pruebas: basta para
+	comprobar a qué conexión va cada consulta.
+	"""
+
+	@classmethod
+	def setUpClass(cls):
+		# El alias se registra aquí y no en settings, así que tampoco puede
+		# declararse antes en `databases`: el runner no sabría crearlo.
+		connections.settings[REPLICA_ALIAS] = connections.settings[DEFAULT_DB_ALIAS]
+		cls.databases = {DEFAULT_DB_ALIAS, REPLICA_ALIAS}
+		cls.addClassCleanup(cls.remove_replica)
+		super().setUpClass()
+
+	@classmethod
+	def remove_replica(cls):
+		connections[REPLICA_ALIAS].close()
+		del connections[REPLICA_ALIAS]
+		del connections.settings[REPLICA_ALIAS]
+
+	def setUp(self):
+		cache.clear()
+		Role.objects.clear_registry()
+		admin_role = Role.objects.create(name='admin')
+		Role.objects.create(name='user')
+		self.user = User.objects.create_user(username='ana', password=None)
+		self.admin = User.objects.create_user(username='admin', password=None, role=admin_role)
+		self.category = Category.objects.create(name='Comida', user=self.user)
+		cache.clear()  # crear la categoría fija al usuario a la base principal
+
+	def get(self, user, url):
+		client = APIClient()
+		client.force_authenticate(user)
+		with CaptureQueriesContext(connection) as primary, CaptureQueriesContext(connections[REPLICA_ALIAS]) as replica:
+			response = client.get(url)
+		self.assertEqual(response.status_code, 200)
+		return response, len(primary.captured_queries), len(replica.captured_queries)
+
+	def test_analytics_views_read_from_replica(self):
+		for user, url in (
+			(self.user, reverse('reports-summary')),
+			(self.admin, reverse('admin-dashboard')),
+			(self.admin, reverse('admin-users')),
+			(self.admin, reverse('admin-user-detail', args=[self.user.id])),
+		):
+			_, primary, replica = self.get(user, url)
+			self.assertEqual(primary, 0, url)
+			self.assertGreater(replica, 0, url)
+
+		_, primary, replica = self.get(self.user, reverse('movement-list'))
+		self.assertEqual(replica, 0)
+
+	def test_recent_write_pins_user_to_primary(self):
+		client = APIClient()
+		client.force_authenticate(self.user)
+		response = client.post(reverse('movement-list'), {
+			'amount': '25.00', 'type': 'EXPENSE', 'date': str(date.today()), 'category': self.category.id,
+		}, format='json')
+		self.assertEqual(response.status_code, 201)
+
+		response, primary, replica = self.get(self.user, reverse('reports-summary'))
+		self.assertEqual(replica, 0)
+		self.assertEqual(response.data['expense'], 25)
+		_, primary, replica = self.get(self.admin, reverse('admin-user-detail', args=[self.user.id]))
+		self.assertEqual(replica, 0)
+
+		cache.clear()  # vence la ventana de retraso
+		_, primary, replica = self.get(self.user, reverse('reports-summary'))
+		self.assertEqual(primary, 0)
@@ -1,23 +1,36 @@
-from django.urls import path
+from django.conf import settings
+from django.urls import path, re_path
 from rest_framework import routers
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from .async_views import AsyncAdminUserDetailView, AsyncReportsSummaryView
 from .views import (
+	APIRootView,
 	AdminDashboardView,
 	AdminUserDetailView,
 	AdminUsersView,
 	BudgetViewSet,
 	CategoryViewSet,
+	DashboardView,
 	MovementViewSet,
 	PasswordResetConfirmView,
 	PasswordResetRequestView,
 	ProfileView,
 	RegisterView,
+	ReportsExportView,
 	ReportsSummaryView,
+	ReportsTimeSeriesView,
+	RequestMetricsView,
 	RoleViewSet,
+	TokenObtainPairView,
+	TokenRefreshView,
 )
 
+# Bajo ASGI se sirven las variantes async de los reportes más pesados.
+SummaryView = AsyncReportsSummaryView if settings.ASYNC_VIEWS else ReportsSummaryView
+UserDetailView = AsyncAdminUserDetailView if settings.ASYNC_VIEWS else AdminUserDetailView
+
 router = routers.DefaultRouter()
+router.APIRootView = APIRootView
 router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'movements', MovementViewSet, basename='movement')
 router.register(r'budgets', BudgetViewSet, basename='budget')
@@ -30,8 +43,12 @@ urlpatterns = [
 	path('auth/password-reset/confirm/', PasswordResetConfirmView.as_view(), name='password-reset-confirm'),
 	path('auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
 	path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-	path('reports/summary/', ReportsSummaryView.as_view(), name='reports-summary'),
+	path('dashboard/', DashboardView.as_view(), name='dashboard'),
+	path('reports/summary/', SummaryView.as_view(), name='reports-summary'),
+	path('reports/timeseries/', ReportsTimeSeriesView.as_view(), name='reports-timeseries'),
+	re_path(r'^reports/export/(?P<file_format>csv|xlsx|parquet)/$', ReportsExportView.as_view(), name='reports-export'),
 	path('admin/dashboard/', AdminDashboardView.as_view(), name='admin-dashboard'),
 	path('admin/users/', AdminUsersView.as_view(), name='admin-users'),
-	path('admin/users/<int:user_id>/', AdminUserDetailView.as_view(), name='admin-user-detail'),
+	path('admin/users/<int:user_id>/', UserDetailView.as_view(), name='admin-user-detail'),
+	path('admin/metrics/', RequestMetricsView.as_view(), name='admin-metrics'),
 ] + router.urls
@@ -1,33 +1,87 @@
+import json
 import random
 from datetime import timedelta
+from decimal import Decimal
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Exists, OuterRef, Q, Sum
-from django.db.models.functions import TruncMonth
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
-from rest_framework import permissions, status, viewsets
+from rest_framework import permissions, routers, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
-
+from rest_framework_simplejwt import views as jwt_views
+
+from .authentication import StatelessReadJWTAuthentication
+from .bulk import MovementBulkWriter, parse_bulk_payload
+from .caching import versioned_user_cache
+from .categories import visible_categories
+from .currency import converted
+from .dashboard import load_dashboard, parse_dashboard_sections
+from .exports import (
+	MOVEMENT_EXPORT_COLUMNS,
+	REPORT_EXPORT_COLUMNS,
+	export_response,
+	iter_movement_chunks,
+	parquet_available,
+	report_rows,
+)
+from .imports import DEFAULT_COLUMNS, MovementImporter, guess_format, import_rows_for_format
+from .instrumentation import metrics_snapshot, reset_metrics
 from .models import Budget, Category, Movement, PasswordResetCode, Role
+from .pagination import AdminUsersPagination, MovementCursorPagination
 from .permissions import IsAdmin
+from .reports import (
+	budget_status,
+	movement_time_series,
+	parse_budget_months,
+	parse_report_date,
+	parse_time_series_params,
+	summarize_movements,
+	user_detail,
+)
+from .routers import analytics_reads
+from .search import rank_movements, search_movements
 from .serializers import (
 	BudgetSerializer,
 	CategorySerializer,
+	ClaimsTokenObtainPairSerializer,
 	MovementSerializer,
+	MovementValuesSerializer,
 	RegisterSerializer,
 	RoleSerializer,
 	UserSerializer,
+	parse_movement_fields,
 )
+from .stats import dashboard_stats
 
 
 User = get_user_model()
 
 
+# Vistas de DRF y simplejwt con su presupuesto de consultas (ver QueryBudgetMiddleware).
+class APIRootView(routers.APIRootView):
+	query_budget = 1
+
+
+class TokenObtainPairView(jwt_views.TokenObtainPairView):
+	query_budget = 1
+
+
+class TokenRefreshView(jwt_views.TokenRefreshView):
+	query_budget = 1
+
+
 class RegisterView(APIView):
 	permission_classes = [permissions.AllowAny]
+	query_budget = 4
 
 	def post(self, request):
 		serializer = RegisterSerializer(data=request.data)
@@ -38,33 +92,57 @@ class RegisterView(APIView):
 
 class ProfileView(APIView):
 	permission_classes = [permissions.IsAuthenticated]
+	query_budget = {'get': 1, 'put': 3}
 
 	def get(self, request):
 		return Response(UserSerializer(request.user).data)
 
 	def put(self, request):
+		"""
+		Cambiar la moneda preferida revoca los tokens del usuario (viaja en sus
+		claims), así que la respuesta incluye un par `access`/`refresh` nuevo
+		para que la sesión que hizo el cambio siga activa.
+		"""
 		serializer = UserSerializer(request.user, data=request.data, partial=True)
 		serializer.is_valid(raise_exception=True)
-		serializer.save()
-		return Response(serializer.data)
+		user = serializer.save()
+		data = serializer.data
+		if getattr(user, '_tokens_revoked', False):
+			refresh = ClaimsTokenObtainPairSerializer.get_token(user)
+			data = {**data, 'access': str(refresh.access_token), 'refresh': str(refresh)}
+		return Response(data)
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
 	serializer_class = CategorySerializer
 	permission_classes = [permissions.IsAuthenticated]
+	query_budget = {'list': 2, 'retrieve': 2, 'create': 2, 'update': 3, 'partial_update': 3, 'destroy': 10}
 
 	def get_queryset(self):
-		user = self.request.user
-		user_has_category = Category.objects.filter(user=user, name=OuterRef('name'))
-		return (
-			Category.objects.filter(Q(user=user) | (Q(user__isnull=True) & ~Exists(user_has_category)))
-			.order_by('name')
-		)
+		visible_ids = [category.id for category in visible_categories(self.request.user.pk)]
+		return Category.objects.filter(id__in=visible_ids).order_by('name')
+
+	@versioned_user_cache('categories')
+	def list(self, request, *args, **kwargs):
+		return Response(self.get_serializer(visible_categories(request.user.pk), many=True).data)
 
 
 class MovementViewSet(viewsets.ModelViewSet):
 	serializer_class = MovementSerializer
+	authentication_classes = [StatelessReadJWTAuthentication]
 	permission_classes = [permissions.IsAuthenticated]
+	pagination_class = MovementCursorPagination
+	stream_chunk_size = 2000
+	max_bulk_rows = 10000
+	# Las escrituras incluyen los rollups y contadores de las señales en el peor
+	# caso: cada fila nueva es UPDATE + INSERT y los importes en otra moneda leen
+	# la tasa del día (en caché después). bulk e import aplican un UPDATE por día
+	# y categoría distintos: el presupuesto es para un lote de un solo día. En
+	# export solo cuenta hasta devolver la respuesta: el resto es streaming.
+	query_budget = {
+		'list': 3, 'retrieve': 2, 'create': 14, 'update': 21, 'partial_update': 21, 'destroy': 9,
+		'export': 1, 'bulk': 14, 'import_statement': 15,
+	}
 
 	def get_queryset(self):
 		qs = Movement.objects.filter(user=self.request.user).select_related('category')
@@ -81,19 +159,122 @@ class MovementViewSet(viewsets.ModelViewSet):
 			qs = qs.filter(category_id=category)
 		if mtype:
 			qs = qs.filter(type=mtype)
+		query = self.request.query_params.get('q', '').strip()
+		if query:
+			qs = search_movements(qs, query, user_id=self.request.user.pk)
 		return qs
 
+	def get_serializer(self, *args, **kwargs):
+		if self.request.method == 'GET':
+			kwargs.setdefault('fields', parse_movement_fields(self.request.query_params))
+		return super().get_serializer(*args, **kwargs)
+
+	def list(self, request, *args, **kwargs):
+		"""
+		Listado paginado por cursor. `?fields=id,amount,date` limita los campos.
+		Las filas se arman desde `.values_list()` (ver MovementValuesSerializer).
+		"""
+		serializer = MovementValuesSerializer(parse_movement_fields(request.query_params))
+		if request.query_params.get('stream') == 'ndjson':
+			return self.stream_ndjson(self.filter_queryset(self.get_queryset()), serializer)
+		query = request.query_params.get('q', '').strip()
+		if query and request.query_params.get('ordering') == 'relevance':
+			return self.ranked_search(request, query)
+		rows = self.filter_queryset(self.get_queryset()).values_list('date', 'id', *serializer.columns)
+		page = self.paginate_queryset(rows)
+		return self.get_paginated_response(serializer.many(row[2:] for row in page))
+
+	def ranked_search(self, request, query):
+		"""Los resultados más relevantes de `?q=`, en una sola página (sin cursor)."""
+		limit = self.paginator.get_page_size(request)
+		rows = rank_movements(self.get_queryset(), query, request.user.pk, limit)
+		return Response({'next': None, 'results': self.get_serializer(rows, many=True).data})
+
+	def stream_ndjson(self, queryset, serializer):
+		"""Envía los movimientos como NDJSON a medida que se leen de la base de datos."""
+		def rows():
+			for chunk in iter_movement_chunks(queryset, serializer.columns, chunk_size=self.stream_chunk_size):
+				yield ''.join(
+					json.dumps(serializer.to_representation(row), cls=JSONEncoder) + '\n'
+					for row in chunk
+				)
+
+		return StreamingHttpResponse(rows(), content_type='application/x-ndjson')
+
+	@action(detail=False, methods=['get'], url_path=r'export/(?P<file_format>csv|xlsx|parquet)')
+	def export(self, request, file_format):
+		"""Descarga el historial filtrado como CSV, XLSX o Parquet, generado en streaming."""
+		if file_format == 'parquet' and not parquet_available():
+			return Response({'detail': 'La exportación a Parquet requiere instalar pyarrow.'}, status=status.HTTP_400_BAD_REQUEST)
+		fields = [field for _, _, field in MOVEMENT_EXPORT_COLUMNS]
+		chunks = iter_movement_chunks(self.get_queryset(), fields, chunk_size=self.stream_chunk_size)
+		return export_response(file_format, MOVEMENT_EXPORT_COLUMNS, chunks, 'movimientos')
+
+	@action(detail=False, methods=['post'], url_path='bulk')
+	def bulk(self, request):
+		"""Crea, edita y elimina movimientos en bloque dentro de una sola transacción."""
+		create_rows, update_rows, delete_ids = parse_bulk_payload(request.data)
+		total = len(create_rows) + len(update_rows) + len(delete_ids)
+		if total > self.max_bulk_rows:
+			return Response(
+				{'detail': f'Máximo {self.max_bulk_rows} filas por petición.'},
+				status=status.HTTP_400_BAD_REQUEST,
+			)
+
+		allow_partial = request.query_params.get('partial', '').lower() in ('1', 'true')
+		result = MovementBulkWriter(request.user).run(create_rows, update_rows, delete_ids, allow_partial=allow_partial)
+		if result['errors'] and not allow_partial:
+			return Response(result, status=status.HTTP_400_BAD_REQUEST)
+		return Response(result, status=status.HTTP_200_OK)
+
+	@action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+	def import_statement(self, request):
+		"""Importa un extracto bancario CSV u OFX subido en el campo `file`."""
+		upload = request.FILES.get('file')
+		if upload is None:
+			return Response({'file': 'Adjunta un archivo CSV u OFX.'}, status=status.HTTP_400_BAD_REQUEST)
+
+		params = request.data
+		columns = {
+			field: params[f'column_{field}']
+			for field in DEFAULT_COLUMNS
+			if params.get(f'column_{field}')
+		}
+		try:
+			importer = MovementImporter(
+				request.user,
+				columns=columns,
+				date_format=params.get('date_format') or None,
+				decimal_comma=params.get('decimal_comma', '').lower() in ('1', 'true'),
+				default_category=params.get('default_category') or None,
+			)
+			file_format = params.get('format') or guess_format(upload.name)
+			rows = import_rows_for_format(upload.file, file_format, delimiter=params.get('delimiter') or None)
+			summary = importer.run(rows)
+		except ValueError as exc:
+			return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+		return Response(summary, status=status.HTTP_200_OK)
+
 
 class BudgetViewSet(viewsets.ModelViewSet):
 	serializer_class = BudgetSerializer
 	permission_classes = [permissions.IsAuthenticated]
+	query_budget = {'list': 2, 'retrieve': 2, 'create': 2, 'update': 3, 'partial_update': 3, 'destroy': 3, 'status': 3}
 
 	def get_queryset(self):
 		return Budget.objects.filter(user=self.request.user).select_related('category')
 
+	@action(detail=False, methods=['get'], url_path='status')
+	@versioned_user_cache('budget-status', vary_on=lambda request: parse_budget_months(request.query_params))
+	def status(self, request):
+		"""Compara cada presupuesto con lo gastado en su categoría y mes."""
+		months = parse_budget_months(request.query_params)
+		return Response(budget_status(request.user, months))
+
 
 class PasswordResetRequestView(APIView):
 	permission_classes = [permissions.AllowAny]
+	query_budget = 2
 
 	def post(self, request):
 		email = request.data.get('email')
@@ -111,6 +292,7 @@ class PasswordResetRequestView(APIView):
 
 class PasswordResetConfirmView(APIView):
 	permission_classes = [permissions.AllowAny]
+	query_budget = 5
 
 	def post(self, request):
 		email = request.data.get('email')
@@ -136,45 +318,83 @@ class PasswordResetConfirmView(APIView):
 
 
 class ReportsSummaryView(APIView):
+	authentication_classes = [StatelessReadJWTAuthentication]
 	permission_classes = [permissions.IsAuthenticated]
+	query_budget = 5
 
+	@analytics_reads
+	@versioned_user_cache('reports-summary')
 	def get(self, request):
-		user = request.user
-		start = request.query_params.get('start')
-		end = request.query_params.get('end')
-		qs = Movement.objects.filter(user=user)
-		if start:
-			qs = qs.filter(date__gte=start)
-		if end:
-			qs = qs.filter(date__lte=end)
+		start = parse_report_date(request.query_params, 'start')
+		end = parse_report_date(request.query_params, 'end')
+		return Response(summarize_movements(request.user, start, end))
 
-		totals = qs.values('type').annotate(total=Sum('amount'))
-		income = next((t['total'] for t in totals if t['type'] == Movement.MovementType.INCOME), 0)
-		expense = next((t['total'] for t in totals if t['type'] == Movement.MovementType.EXPENSE), 0)
 
-		category_breakdown = list(
-			qs.filter(type=Movement.MovementType.EXPENSE)
-			.values('category__name', 'category__color')
-			.annotate(total=Sum('amount'))
-			.order_by('-total')
-		)
+class ReportsTimeSeriesView(APIView):
+	"""Serie temporal por día, semana, mes o año, por tipo o por categoría, con saldo acumulado."""
+	authentication_classes = [StatelessReadJWTAuthentication]
+	permission_classes = [permissions.IsAuthenticated]
+	query_budget = 5
 
-		monthly = list(
-			qs.annotate(month=TruncMonth('date'))
-			.values('month', 'type')
-			.annotate(total=Sum('amount'))
-			.order_by('month')
-		)
+	# Sin `end` la serie llega hasta hoy: las fechas resueltas van en la clave.
+	@analytics_reads
+	@versioned_user_cache('reports-timeseries', vary_on=lambda request: parse_time_series_params(request.query_params)[1:3])
+	def get(self, request):
+		granularity, start, end, group_by, movement_type = parse_time_series_params(request.query_params)
+		return Response(movement_time_series(request.user, granularity, start, end, group_by, movement_type))
 
-		return Response(
-			{
-				'income': income or 0,
-				'expense': expense or 0,
-				'balance': (income or 0) - (expense or 0),
-				'category_breakdown': category_breakdown,
-				'monthly': monthly,
+
+class ReportsExportView(APIView):
+	"""Descarga los totales por mes, tipo y categoría como CSV, XLSX o Parquet."""
+	permission_classes = [permissions.IsAuthenticated]
+	query_budget = 2
+
+	@analytics_reads
+	def get(self, request, file_format):
+		if file_format == 'parquet' and not parquet_available():
+			return Response({'detail': 'La exportación a Parquet requiere instalar pyarrow.'}, status=status.HTTP_400_BAD_REQUEST)
+		start = parse_report_date(request.query_params, 'start')
+		end = parse_report_date(request.query_params, 'end')
+		chunks = report_rows(request.user, start, end)
+		return export_response(file_format, REPORT_EXPORT_COLUMNS, chunks, 'reporte')
+
+
+class DashboardView(APIView):
+	"""
+	Todo lo que necesita la pantalla inicial en una sola petición: perfil,
+	resumen, categorías visibles, primera página de movimientos y presupuestos
+	del mes en curso. `?fields=` limita las secciones y `?limit=` el número de
+	movimientos; `movements.next` continúa en /api/movements/.
+	"""
+	permission_classes = [permissions.IsAuthenticated]
+	pagination_class = MovementCursorPagination
+	query_budget = 8
+
+	# Los presupuestos son los del mes en curso: el mes va en la clave.
+	@analytics_reads
+	@versioned_user_cache('dashboard', vary_on=lambda request: timezone.localdate().replace(day=1))
+	def get(self, request):
+		sections = parse_dashboard_sections(request.query_params)
+		paginator = self.pagination_class()
+		limit = paginator.get_page_size(request)
+		data = load_dashboard(request.user, sections, limit)
+
+		if 'profile' in sections:
+			data['profile'] = UserSerializer(request.user).data
+		if 'categories' in sections:
+			data['categories'] = CategorySerializer(data['categories'], many=True).data
+		if 'movements' in sections:
+			rows = data['movements']
+			data['movements'] = {
+				'next': self.movements_link(request, paginator, rows[limit - 1], limit) if len(rows) > limit else None,
+				'results': MovementSerializer(rows[:limit], many=True).data,
 			}
-		)
+		return Response({name: data[name] for name in sections})
+
+	def movements_link(self, request, paginator, last_row, limit):
+		url = request.build_absolute_uri(reverse('movement-list'))
+		url = replace_query_param(url, paginator.page_size_query_param, limit)
+		return replace_query_param(url, paginator.cursor_query_param, paginator.encode_cursor(last_row.date, last_row.id))
 
 
 class RoleViewSet(viewsets.ReadOnlyModelViewSet):
@@ -182,43 +402,79 @@ class RoleViewSet(viewsets.ReadOnlyModelViewSet):
 	queryset = Role.objects.all()
 	serializer_class = RoleSerializer
 	permission_classes = [permissions.IsAuthenticated]
+	query_budget = 2
 
 
 class AdminUsersView(APIView):
 	"""Vista para que administradores vean todos los usuarios del sistema."""
 	permission_classes = [IsAdmin]
+	pagination_class = AdminUsersPagination
+	query_budget = 3
+	ordering_fields = (
+		'username', 'email', 'registered_at',
+		'total_movements', 'total_income', 'total_expense', 'balance',
+	)
+	search_fields = ('username', 'email', 'first_name', 'last_name')
 
+	def get_queryset(self):
+		"""Usuarios con sus totales, en la moneda base, calculados en una sola consulta agregada."""
+		zero = Value(Decimal('0'), output_field=DecimalField(max_digits=14, decimal_places=2))
+		amount = converted('movements__amount', 'movements__currency', 'movements__date', settings.BASE_CURRENCY)
+		return (
+			User.objects
+			.annotate(
+				total_movements=Count('movements'),
+				total_income=Coalesce(Sum(amount, filter=Q(movements__type='INCOME')), zero),
+				total_expense=Coalesce(Sum(amount, filter=Q(movements__type='EXPENSE')), zero),
+			)
+			.annotate(balance=F('total_income') - F('total_expense'))
+		)
+
+	def filter_queryset(self, request, queryset):
+		search = request.query_params.get('search', '').strip()
+		if search:
+			condition = Q()
+			for field in self.search_fields:
+				condition |= Q(**{f'{field}__icontains': search})
+			queryset = queryset.filter(condition)
+
+		ordering = request.query_params.get('ordering', 'username')
+		if ordering.lstrip('-') not in self.ordering_fields:
+			ordering = 'username'
+		return queryset.order_by(ordering, 'id')
+
+	@analytics_reads
 	def get(self, request):
-		"""Obtiene lista de todos los usuarios con resumen de datos."""
-		users = User.objects.prefetch_related('role', 'movements', 'categories').all()
-		
-		users_data = []
-		for user in users:
-			movements = user.movements.all()
-			income = movements.filter(type='INCOME').aggregate(Sum('amount'))['amount__sum'] or 0
-			expense = movements.filter(type='EXPENSE').aggregate(Sum('amount'))['amount__sum'] or 0
-			
-			users_data.append({
+		"""Obtiene la lista paginada de usuarios con resumen de datos."""
+		paginator = self.pagination_class()
+		users = paginator.paginate_queryset(self.filter_queryset(request, self.get_queryset()), request, view=self)
+
+		users_data = [
+			{
 				'id': user.id,
 				'username': user.username,
 				'email': user.email,
 				'first_name': user.first_name,
 				'last_name': user.last_name,
-				'role': user.role.get_name_display(),
+				'role': user.cached_role.get_name_display() if user.role_id else None,
 				'registered_at': user.registered_at,
-				'total_movements': movements.count(),
-				'total_income': float(income),
-				'total_expense': float(expense),
-				'balance': float(income - expense),
-			})
-		
-		return Response(users_data)
+				'total_movements': user.total_movements,
+				'total_income': float(user.total_income),
+				'total_expense': float(user.total_expense),
+				'balance': float(user.balance),
+			}
+			for user in users
+		]
+
+		return paginator.get_paginated_response(users_data)
 
 
 class AdminUserDetailView(APIView):
 	"""Vista para ver detalles completos de un usuario específico (solo admin)."""
 	permission_classes = [IsAdmin]
+	query_budget = 8
 
+	@analytics_reads(user_kwarg='user_id')
 	def get(self, request, user_id):
 		"""Obtiene detalles completos de un usuario."""
 		try:
@@ -229,84 +485,28 @@ class AdminUserDetailView(APIView):
 				status=status.HTTP_404_NOT_FOUND
 			)
 
-		movements = user.movements.all()
-		income = movements.filter(type='INCOME').aggregate(Sum('amount'))['amount__sum'] or 0
-		expense = movements.filter(type='EXPENSE').aggregate(Sum('amount'))['amount__sum'] or 0
-
-		category_breakdown = list(
-			movements.filter(type='EXPENSE')
-			.values('category__name', 'category__color')
-			.annotate(total=Sum('amount'))
-			.order_by('-total')
-		)
-
-		monthly = list(
-			movements.annotate(month=TruncMonth('date'))
-			.values('month', 'type')
-			.annotate(total=Sum('amount'))
-			.order_by('month')
-		)
-
-		user_detail = {
-			'id': user.id,
-			'username': user.username,
-			'email': user.email,
-			'first_name': user.first_name,
-			'last_name': user.last_name,
-			'preferred_currency': user.preferred_currency,
-			'role': user.role.get_name_display(),
-			'registered_at': user.registered_at,
-			'statistics': {
-				'total_movements': movements.count(),
-				'total_income': float(income),
-				'total_expense': float(expense),
-				'balance': float(income - expense),
-				'total_categories': user.categories.count(),
-				'total_budgets': user.budgets.count(),
-			},
-			'category_breakdown': category_breakdown,
-			'monthly': monthly,
-		}
-
-		return Response(user_detail)
+		return Response(user_detail(user))
 
 
 class AdminDashboardView(APIView):
 	"""Vista para el dashboard administrativo con estadísticas generales."""
 	permission_classes = [IsAdmin]
+	query_budget = 6
 
+	@analytics_reads
 	def get(self, request):
-		"""Obtiene estadísticas generales del sistema."""
-		total_users = User.objects.count()
-		admin_users = User.objects.filter(role__name='admin').count()
-		regular_users = User.objects.filter(role__name='user').count()
-
-		all_movements = Movement.objects.all()
-		total_income = all_movements.filter(type='INCOME').aggregate(Sum('amount'))['amount__sum'] or 0
-		total_expense = all_movements.filter(type='EXPENSE').aggregate(Sum('amount'))['amount__sum'] or 0
-
-		top_users_by_activity = list(
-			User.objects.annotate(movement_count=Sum(1))
-			.values('id', 'username', 'email')
-			.order_by('-movement_count')[:10]
-		)
+		"""Obtiene estadísticas generales del sistema desde los contadores incrementales."""
+		return Response(dashboard_stats())
 
-		top_categories = list(
-			all_movements.filter(type='EXPENSE')
-			.values('category__name', 'category__color')
-			.annotate(total=Sum('amount'))
-			.order_by('-total')[:10]
-		)
 
-		return Response({
-			'total_users': total_users,
-			'admin_users': admin_users,
-			'regular_users': regular_users,
-			'total_movements': all_movements.count(),
-			'total_income': float(total_income),
-			'total_expense': float(total_expense),
-			'total_balance': float(total_income - total_expense),
-			'top_users': top_users_by_activity,
-			'top_categories': top_categories,
-		})
+class RequestMetricsView(APIView):
+	"""Métricas por vista de este proceso (ver RequestMetricsMiddleware). DELETE las reinicia."""
+	permission_classes = [IsAdmin]
+	query_budget = 1
+
+	def get(self, request):
+		return Response({'enabled': settings.REQUEST_METRICS, 'views': metrics_snapshot()})
 
+	def delete(self, request):
+		reset_metrics()
+		return Response(status=status.HTTP_204_NO_CONTENT)
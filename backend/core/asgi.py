@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Bajo ASGI, los reportes usan las vistas async (ver api/async_views.py).
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
@@ -40,6 +40,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.RequestMetricsMiddleware',
+    'api.instrumentation.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -74,20 +76,121 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+def _env_int(name, default):
+    value = os.getenv(name, default)
+    return None if value is None or value.lower() == 'none' else int(value)
+
+
+def database_settings(prefix='DB', **defaults):
+    """
+    Conexión MySQL configurada por variables de entorno con el prefijo dado.
+
+    Las conexiones son persistentes (CONN_MAX_AGE) con comprobación de salud
+    antes de reutilizarlas. Django no trae pool para MySQL: con
+    `<prefijo>_POOL_SIZE` > 0 se usa el backend de django-db-connection-pool
+    (dependencia opcional), que gestiona él mismo la vida de las conexiones.
+    """
+    def env(name, default=None):
+        return os.getenv(f'{prefix}_{name}', defaults.get(name, default))
+
+    database = {
         'ENGINE': 'django.db.backends.mysql',
-        'NAME': os.getenv('DB_NAME', 'control_gastos'),
-        'USER': os.getenv('DB_USER', 'root'),
-        'PASSWORD': os.getenv('DB_PASSWORD', ''),
-        'HOST': os.getenv('DB_HOST', 'localhost'),
-        'PORT': os.getenv('DB_PORT', '3306'),
+        'NAME': env('NAME', 'control_gastos'),
+        'USER': env('USER', 'root'),
+        'PASSWORD': env('PASSWORD', ''),
+        'HOST': env('HOST', 'localhost'),
+        'PORT': env('PORT', '3306'),
+        'CONN_MAX_AGE': _env_int(f'{prefix}_CONN_MAX_AGE', defaults.get('CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': env('CONN_HEALTH_CHECKS', 'True').lower() == 'true',
         'OPTIONS': {
             'charset': 'utf8mb4',
+            'connect_timeout': int(env('CONNECT_TIMEOUT', '5')),
+            'read_timeout': int(env('READ_TIMEOUT', '30')),
+            'write_timeout': int(env('WRITE_TIMEOUT', '30')),
         },
     }
+    pool_size = int(env('POOL_SIZE', '0'))
+    if pool_size > 0:
+        database['ENGINE'] = 'dj_db_conn_pool.backends.mysql'
+        database['CONN_MAX_AGE'] = 0
+        database['POOL_OPTIONS'] = {
+            'POOL_SIZE': pool_size,
+            'MAX_OVERFLOW': int(env('POOL_MAX_OVERFLOW', '10')),
+            'RECYCLE': int(env('POOL_RECYCLE', '1800')),
+            'TIMEOUT': int(env('POOL_TIMEOUT', '10')),
+            'PRE_PING': env('CONN_HEALTH_CHECKS', 'True').lower() == 'true',
+        }
+    return database
+
+
+DATABASES = {
+    'default': database_settings('DB'),
 }
 
+# Réplica de lectura para reportes y administración (ver api/routers.py).
+# Sin DB_REPLICA_HOST todo se lee de 'default'.
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = database_settings(
+        'DB_REPLICA',
+        NAME=DATABASES['default']['NAME'],
+        USER=DATABASES['default']['USER'],
+        PASSWORD=DATABASES['default']['PASSWORD'],
+        PORT=DATABASES['default']['PORT'],
+    )
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['api.routers.ReplicaRouter']
+
+# Segundos que las lecturas analíticas de un usuario siguen yendo a la base
+# principal tras una escritura suya. Debe superar el retraso habitual de la
+# réplica: lo leído de ella también se guarda en la caché de respuestas.
+REPLICA_LAG_WINDOW = int(os.getenv('DB_REPLICA_LAG_WINDOW', '5'))
+
+
+# Cache
+# Sin REDIS_URL se usa la caché local en memoria del proceso.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'control-gastos',
+        }
+    }
+
+# Segundos que se guardan las respuestas cacheadas por usuario (reportes, categorías).
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', '300'))
+
+# Hilos para ejecutar en paralelo los agregados independientes de los reportes
+# (cada uno usa su propia conexión a la base de datos). 1 los ejecuta en serie.
+REPORT_QUERY_WORKERS = int(os.getenv('REPORT_QUERY_WORKERS', '4'))
+
+# Sirve las variantes async de los reportes; core/asgi.py lo activa por defecto.
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "False").lower() == "true"
+
+# Moneda de referencia de la tabla de tasas (ExchangeRate) y de los totales del
+# panel de administración.
+BASE_CURRENCY = os.getenv('BASE_CURRENCY', 'USD').upper()
+
+# Instrumentación por petición (api/instrumentation.py): consultas SQL, tiempos
+# en la cabecera Server-Timing y histogramas por vista en /api/admin/metrics/.
+# Desactivada no añade ningún coste. Las métricas viven en la memoria de cada
+# proceso. Se registran como lentas las peticiones que superan SLOW_MS.
+REQUEST_METRICS = os.getenv("REQUEST_METRICS", "False").lower() == "true"
+REQUEST_METRICS_SLOW_QUERIES = int(os.getenv('REQUEST_METRICS_SLOW_QUERIES', '5'))
+REQUEST_METRICS_SLOW_MS = int(os.getenv('REQUEST_METRICS_SLOW_MS', '500'))
+
+# Presupuestos de consultas SQL por vista (`query_budget`): 'log' avisa al
+# superarlos, 'raise' falla (los tests lo activan) y 'off' no los comprueba.
+QUERY_BUDGETS = os.getenv("QUERY_BUDGETS", "log" if DEBUG else "off").lower()
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -127,7 +230,7 @@ STATIC_URL = 'static/'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.JWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -142,6 +245,8 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+CORS_EXPOSE_HEADERS = ['ETag']
+
 CSRF_TRUSTED_ORIGINS = [
     origin.strip()
     for origin in os.getenv("CSRF_TRUSTED_ORIGINS", "http://localhost:5173").split(",")
@@ -155,7 +260,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'api.User'
 
+AUTHENTICATION_BACKENDS = ['api.authentication.RoleModelBackend']
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'TOKEN_OBTAIN_SERIALIZER': 'api.serializers.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'api.serializers.ClaimsTokenRefreshSerializer',
 }
+
+# Lecturas autenticadas solo con los claims del token, sin consultar el usuario.
+# La revocación vive en la caché: con varios procesos requiere REDIS_URL.
+JWT_STATELESS_READS = os.getenv("JWT_STATELESS_READS", "False").lower() == "true"
@@ -1,5 +1,5 @@
 import { createContext, useContext, useEffect, useState } from 'react'
-import { loginRequest, registerRequest, fetchProfile, setAuthToken } from '../services/api'
+import { loginRequest, registerRequest, fetchProfile, updateProfile as updateProfileRequest, setAuthToken } from '../services/api'
 
 const AuthContext = createContext()
 
@@ -40,6 +40,18 @@ export const AuthProvider = ({ children }) => {
     return login({ username: payload.username, password: payload.password })
   }
 
+  const updateProfile = async (payload) => {
+    const { access, refresh: _refresh, ...profile } = await updateProfileRequest(payload)
+    if (access) {
+      // Los tokens anteriores quedaron revocados: sin guardar el nuevo se cerraría la sesión.
+      localStorage.setItem('accessToken', access)
+      setAuthToken(access)
+      setToken(access)
+    }
+    setUser(profile)
+    return profile
+  }
+
   const logout = () => {
     setUser(null)
     setToken(null)
@@ -48,7 +60,7 @@ export const AuthProvider = ({ children }) => {
   }
 
   return (
-    <AuthContext.Provider value={{ token, user, loading, error, login, register, logout }}>
+    <AuthContext.Provider value={{ token, user, loading, error, login, register, logout, updateProfile }}>
       {children}
     </AuthContext.Provider>
   )
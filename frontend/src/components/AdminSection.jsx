@@ -9,8 +9,9 @@ const fetchAdminData = async (token) => {
   return response.json()
 }
 
-const fetchAllUsers = async (token) => {
-  const response = await fetch('http://localhost:8000/api/admin/users/', {
+// Una página de usuarios ({ count, next, results }); `url` es el enlace `next` de la anterior.
+const fetchUsersPage = async (token, url = 'http://localhost:8000/api/admin/users/') => {
+  const response = await fetch(url, {
     headers: { Authorization: `Bearer ${token}` },
   })
   if (!response.ok) throw new Error('Error al obtener usuarios')
@@ -21,6 +22,9 @@ const AdminSection = () => {
   const { token, user } = useAuth()
   const [stats, setStats] = useState(null)
   const [users, setUsers] = useState([])
+  const [usersCount, setUsersCount] = useState(0)
+  const [usersNext, setUsersNext] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState(null)
   const [selectedUser, setSelectedUser] = useState(null)
@@ -33,10 +37,12 @@ const AdminSection = () => {
       try {
         const [dashData, usersData] = await Promise.all([
           fetchAdminData(token),
-          fetchAllUsers(token),
+          fetchUsersPage(token),
         ])
         setStats(dashData)
-        setUsers(usersData)
+        setUsers(usersData.results)
+        setUsersCount(usersData.count)
+        setUsersNext(usersData.next)
       } catch (err) {
         setError('Error cargando datos administrativos')
       } finally {
@@ -46,6 +52,20 @@ const AdminSection = () => {
     loadData()
   }, [token, user])
 
+  const loadMoreUsers = async () => {
+    if (!usersNext) return
+    setLoadingMore(true)
+    try {
+      const usersData = await fetchUsersPage(token, usersNext)
+      setUsers((prev) => [...prev, ...usersData.results])
+      setUsersNext(usersData.next)
+    } catch (err) {
+      setError('Error al obtener usuarios')
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   if (!user?.is_admin) {
     return (
       <div className="section">
@@ -119,6 +139,12 @@ const AdminSection = () => {
               </div>
             ))}
           </div>
+          <p className="stat-label">Mostrando {users.length} de {usersCount}</p>
+          {usersNext && (
+            <button className="secondary" type="button" onClick={loadMoreUsers} disabled={loadingMore}>
+              {loadingMore ? 'Cargando...' : 'Cargar más usuarios'}
+            </button>
+          )}
         </div>
 
         {selectedUser && (
@@ -86,7 +86,7 @@ const MovementForm = ({ categories, onSubmit, loading }) => {
   )
 }
 
-const MovementsList = ({ movements }) => (
+const MovementsList = ({ movements, onLoadMore, loading }) => (
   <div className="panel">
     <div className="panel-header">Movimientos recientes</div>
     <div className="table">
@@ -112,17 +112,22 @@ const MovementsList = ({ movements }) => (
         </div>
       ))}
     </div>
+    {onLoadMore && (
+      <button className="secondary" type="button" onClick={onLoadMore} disabled={loading}>
+        {loading ? 'Cargando...' : 'Cargar más'}
+      </button>
+    )}
   </div>
 )
 
-const MovementsSection = ({ movements, categories, onSubmit, loading }) => {
+const MovementsSection = ({ movements, categories, onSubmit, onLoadMore, loading }) => {
   return (
     <div className="section">
       <h2>Movimientos</h2>
       <div className="grid-2">
         <MovementForm categories={categories} onSubmit={onSubmit} loading={loading} />
       </div>
-      <MovementsList movements={movements} />
+      <MovementsList movements={movements} onLoadMore={onLoadMore} loading={loading} />
     </div>
   )
 }
@@ -3,9 +3,8 @@ import { useAuth } from '../auth/AuthContext'
 import {
   createCategory,
   createMovement,
-  fetchCategories,
-  fetchMovements,
-  fetchSummary,
+  fetchDashboard,
+  fetchPage,
 } from '../services/api'
 import Sidebar from '../components/Sidebar'
 import DashboardSection from '../components/DashboardSection'
@@ -18,6 +17,7 @@ const DashboardPage = () => {
   const { user } = useAuth()
   const [summary, setSummary] = useState({})
   const [movements, setMovements] = useState([])
+  const [movementsNext, setMovementsNext] = useState(null)
   const [categories, setCategories] = useState([])
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState(null)
@@ -27,14 +27,11 @@ const DashboardPage = () => {
     setLoading(true)
     setError(null)
     try {
-      const [s, m, c] = await Promise.all([
-        fetchSummary(),
-        fetchMovements({ limit: 10 }),
-        fetchCategories(),
-      ])
-      setSummary(s)
-      setMovements(m)
-      setCategories(c)
+      const data = await fetchDashboard({ fields: 'summary,movements,categories', limit: 10 })
+      setSummary(data.summary)
+      setMovements(data.movements.results)
+      setMovementsNext(data.movements.next)
+      setCategories(data.categories)
     } catch (err) {
       setError('Error cargando datos')
     } finally {
@@ -53,6 +50,20 @@ const DashboardPage = () => {
     setLoading(false)
   }
 
+  const handleMoreMovements = async () => {
+    if (!movementsNext) return
+    setLoading(true)
+    try {
+      const data = await fetchPage(movementsNext)
+      setMovements((prev) => [...prev, ...data.results])
+      setMovementsNext(data.next)
+    } catch (err) {
+      setError('Error cargando movimientos')
+    } finally {
+      setLoading(false)
+    }
+  }
+
   const handleCategory = async (payload) => {
     setLoading(true)
     await createCategory(payload)
@@ -67,7 +78,15 @@ const DashboardPage = () => {
       case 'statistics':
         return <StatisticsSection summary={summary} />
       case 'movements':
-        return <MovementsSection movements={movements} categories={categories} onSubmit={handleMovement} loading={loading} />
+        return (
+          <MovementsSection
+            movements={movements}
+            categories={categories}
+            onSubmit={handleMovement}
+            onLoadMore={movementsNext ? handleMoreMovements : null}
+            loading={loading}
+          />
+        )
       case 'categories':
         return <CategoriesSection onSubmit={handleCategory} loading={loading} />
       case 'admin':
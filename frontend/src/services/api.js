@@ -34,11 +34,28 @@ export const fetchProfile = async () => {
   return data
 }
 
+// Si cambia un dato que viaja en el token (p. ej. la moneda), la respuesta trae un `access` nuevo.
+export const updateProfile = async (payload) => {
+  const { data } = await api.put('auth/profile/', payload)
+  return data
+}
+
+// Perfil, resumen, categorías, últimos movimientos y presupuestos del mes en una sola petición.
+export const fetchDashboard = async (params = {}) => {
+  const { data } = await api.get('dashboard/', { params })
+  return data
+}
+
 export const fetchSummary = async (params = {}) => {
   const { data } = await api.get('reports/summary/', { params })
   return data
 }
 
+export const fetchTimeSeries = async (params = {}) => {
+  const { data } = await api.get('reports/timeseries/', { params })
+  return data
+}
+
 export const fetchCategories = async () => {
   const { data } = await api.get('categories/')
   return data
@@ -49,16 +66,28 @@ export const createCategory = async (payload) => {
   return data
 }
 
+// Paginado por cursor: devuelve { next, results }; `next` se pasa a fetchPage.
 export const fetchMovements = async (params = {}) => {
   const { data } = await api.get('movements/', { params })
   return data
 }
 
+// Siguiente página de un listado paginado a partir de su enlace `next`.
+export const fetchPage = async (url) => {
+  const { data } = await api.get(url)
+  return data
+}
+
 export const createMovement = async (payload) => {
   const { data } = await api.post('movements/', payload)
   return data
 }
 
+export const bulkMovements = async (payload, { partial = false } = {}) => {
+  const { data } = await api.post('movements/bulk/', payload, { params: partial ? { partial: true } : {} })
+  return data
+}
+
 export const deleteMovement = async (id) => {
   await api.delete(`movements/${id}/`)
 }
@@ -73,4 +102,9 @@ export const createBudget = async (payload) => {
   return data
 }
 
+export const fetchBudgetStatus = async (params = {}) => {
+  const { data } = await api.get('budgets/status/', { params })
+  return data
+}
+
 export default api